@@ -0,0 +1,79 @@
+"""
+Benchmark for the relationship graph layout and drawing helpers.
+
+Builds a clustered random graph and reports:
+
+    cold        iterations and seconds until a full layout converges
+    warm        the same after adding one relationship (incremental update)
+    cull        viewport query on the SpatialGrid, zoomed in on one cluster
+    bundle      bundling every edge at a zoomed-out cell size
+
+    python benchmarks/graph_layout.py --nodes 10000 --edges 50000
+    python benchmarks/graph_layout.py --python # Without NumPy
+"""
+import argparse
+import random
+import time
+
+from storyteller.core.graph_layout import (
+    IDEAL_EDGE_LENGTH, ForceLayout, SpatialGrid, bundle_edges, numpy_available
+)
+
+
+def clustered_graph(nodes, edges, cluster_size=100, seed=3):
+    rng = random.Random(seed)
+    sources, targets = [], []
+    for _ in range(edges):
+        a = rng.randrange(nodes)
+        if rng.random() < 0.9:
+            b = (a // cluster_size) * cluster_size + rng.randrange(cluster_size)
+        else:
+            b = rng.randrange(nodes)
+        if b == a or b >= nodes:
+            b = (a + 1) % nodes
+        sources.append(a)
+        targets.append(b)
+    return [f"char_{i}" for i in range(nodes)], sources, targets
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--nodes', type=int, default=10000)
+    parser.add_argument('--edges', type=int, default=50000)
+    parser.add_argument('--python', action='store_true', help="Use the pure-Python backend")
+    args = parser.parse_args()
+
+    node_ids, sources, targets = clustered_graph(args.nodes, args.edges)
+    layout = ForceLayout(use_numpy=not args.python)
+    backend = 'numpy' if layout.use_numpy else 'python'
+    if not numpy_available and not args.python:
+        print("numpy is not installed; using the pure-Python backend")
+
+    layout.set_graph(node_ids, sources, targets)
+    iterations, seconds = timed(layout.run)
+    print(f"cold    {backend:<7}{iterations:>5} iterations {seconds:8.2f} s "
+          f"({seconds / max(iterations, 1) * 1000:.1f} ms/iteration)")
+
+    moving = layout.set_graph(node_ids + ['newcomer'], sources + [args.nodes], targets + [0])
+    iterations, seconds = timed(layout.run)
+    print(f"warm    {backend:<7}{iterations:>5} iterations {seconds:8.2f} s ({moving} nodes moved)")
+
+    positions = layout.positions()
+    grid, build = timed(SpatialGrid, positions)
+    x, y = positions[0], positions[1]
+    half = IDEAL_EDGE_LENGTH * 20
+    visible, query = timed(grid.query, x - half, y - half, x + half, y + half)
+    print(f"cull    grid build {build * 1000:.1f} ms, query {query * 1000:.2f} ms ({len(visible)} visible)")
+
+    strokes, seconds = timed(bundle_edges, positions, sources, targets, IDEAL_EDGE_LENGTH * 16)
+    print(f"bundle  {len(sources)} edges -> {len(strokes)} strokes in {seconds * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+GUI startup benchmark: time to first paint and time to interactive.
+
+Each mode runs in a fresh interpreter (cold imports) on the offscreen Qt
+platform:
+
+    lazy   dock shells only; visible views build on show, others in idle time
+    eager  every view built before the window is shown (the old behaviour)
+
+Time to interactive is measured when the event loop first goes idle after the
+first paint, i.e. when the window could first react to input.
+`--simulated-view-ms` adds a busy-wait to each view build, standing in for
+heavy views such as the visualization.
+
+    python benchmarks/gui_startup.py --runs 5 --simulated-view-ms 40
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+def measure(mode, simulated_view_ms):
+    start = time.perf_counter()
+    from PyQt6.QtCore import QTimer
+    from PyQt6.QtWidgets import QApplication
+    from storyteller.gui import view_registry
+    from storyteller.gui.main_window import MainWindow
+
+    if simulated_view_ms:
+        build = view_registry.ViewRegistry.ensure_built
+
+        def slow_build(self, name):
+            if not self.is_built(name):
+                deadline = time.perf_counter() + simulated_view_ms / 1000
+                while time.perf_counter() < deadline:
+                    pass
+            return build(self, name)
+        view_registry.ViewRegistry.ensure_built = slow_build
+
+    app = QApplication([])
+    result = {}
+    window = MainWindow()
+    if mode == 'eager':
+        window.views.build_all()
+
+    def interactive():
+        result['interactive_ms'] = (time.perf_counter() - start) * 1000
+        app.quit()
+
+    def first_paint():
+        result['first_paint_ms'] = (time.perf_counter() - start) * 1000
+        QTimer.singleShot(0, interactive)
+
+    window.on_first_paint = first_paint
+    window.show()
+    app.exec()
+    result['views_built_at_interactive'] = len(window.views.views)
+    return result
+
+
+def main(args):
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    print(f"{'mode':<8}{'first paint ms':>16}{'interactive ms':>16}{'views built':>13}")
+    for mode in ('eager', 'lazy'):
+        runs = []
+        for _ in range(args.runs):
+            output = subprocess.run(
+                [sys.executable, __file__, '--child', mode, '--simulated-view-ms', str(args.simulated_view_ms)],
+                env=env, capture_output=True, text=True, check=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+        paint = statistics.median(r['first_paint_ms'] for r in runs)
+        interactive = statistics.median(r['interactive_ms'] for r in runs)
+        print(f"{mode:<8}{paint:>16.1f}{interactive:>16.1f}{runs[0]['views_built_at_interactive']:>13}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time to first paint / interactive for lazy vs eager views.")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--simulated-view-ms', type=float, default=0.0)
+    parser.add_argument('--child', choices=['lazy', 'eager'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(measure(args.child, args.simulated_view_ms)))
+    else:
+        main(args)
@@ -0,0 +1,72 @@
+"""
+Memory benchmark for version history.
+
+Commits a series of single-character edits to a project and reports the bytes
+each new version costs, measured with tracemalloc, for:
+
+    copy        a full dict copy of every character row per version
+    persistent  storyteller.core.history.VersionStore (structurally shared)
+
+    python benchmarks/history_memory.py --characters 100000 --edits 1000
+"""
+import argparse
+import gc
+import random
+import tracemalloc
+
+from storyteller.core.history import PersistentMap, ProjectState, VersionStore
+
+
+def base_rows(count):
+    return {f"char_{i}": {'character_id': f"char_{i}", 'name': f"Name {i}", 'background': ''}
+            for i in range(count)}
+
+
+def edits(count, characters):
+    rng = random.Random(11)
+    for step in range(count):
+        character_id = f"char_{rng.randrange(characters)}"
+        yield character_id, {'character_id': character_id, 'name': f"Renamed {step}", 'background': ''}
+
+
+def run_copy(rows, args):
+    versions = [rows]
+    for character_id, row in edits(args.edits, args.characters):
+        current = dict(versions[-1])
+        current[character_id] = row
+        versions.append(current)
+    return versions
+
+
+def run_persistent(rows, args):
+    history = VersionStore(ProjectState(characters=PersistentMap(rows)))
+    for _, row in edits(args.edits, args.characters):
+        history.commit(history.state().set_character(row))
+    return history
+
+
+def measure(run, args):
+    rows = base_rows(args.characters)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = run(rows, args)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del result
+    return used
+
+
+def main(args):
+    print(f"{'history':<12}{'bytes/version':>16}{'total MiB':>12}")
+    for name, run in (('copy', run_copy), ('persistent', run_persistent)):
+        used = measure(run, args)
+        print(f"{name:<12}{used / args.edits:>16.0f}{used / 2 ** 20:>12.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bytes per version for full copies vs structural sharing.")
+    parser.add_argument('--characters', type=int, default=100_000)
+    parser.add_argument('--edits', type=int, default=1_000)
+    main(parser.parse_args())
@@ -0,0 +1,63 @@
+"""
+Throughput benchmark for the streaming importer.
+
+Writes a synthetic relationships CSV (with a small share of invalid rows),
+imports it in chunks and reports rows per second. With --trace-memory it
+also reports peak traced memory (tracing slows the import down noticeably):
+
+    python benchmarks/import_throughput.py --rows 1000000 --chunk-size 50000
+"""
+import argparse
+import csv
+import random
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+from storyteller.core.data_store import DataStore
+from storyteller.data.importer import StreamingImporter
+
+TYPES = ['friend', 'rival', 'sibling', 'mentor', 'enemy', 'ally', 'spouse']
+
+
+def write_csv(path, rows, characters, bad_ratio):
+    rng = random.Random(7)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['char1_id', 'char2_id', 'relationship_type', 'relationship_quality'])
+        for _ in range(rows):
+            quality = 'n/a' if rng.random() < bad_ratio else f"{rng.random() * 2 - 1:.3f}"
+            writer.writerow([f"char_{rng.randrange(characters)}", f"char_{rng.randrange(characters)}",
+                             rng.choice(TYPES), quality])
+
+
+def main(args):
+    store = DataStore()
+    store.append_rows('characters', {'character_id': [f"char_{i}" for i in range(args.characters)]})
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'relationships.csv'
+        write_csv(path, args.rows, args.characters, args.bad_ratio)
+        if args.trace_memory:
+            tracemalloc.start()
+        report = StreamingImporter(store, chunk_size=args.chunk_size).import_file('relationships', path)
+        if args.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    print(f"rows read      {report.rows_read}")
+    print(f"rows imported  {report.rows_imported}")
+    print(f"rows rejected  {report.rows_rejected}")
+    print(f"chunks         {report.chunks}")
+    print(f"seconds        {report.seconds:.2f}")
+    print(f"rows/second    {report.rows_per_second:,.0f}")
+    if args.trace_memory:
+        print(f"peak MiB       {peak / 2 ** 20:.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Streaming import throughput.")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--characters', type=int, default=10_000)
+    parser.add_argument('--chunk-size', type=int, default=50_000)
+    parser.add_argument('--bad-ratio', type=float, default=0.01)
+    parser.add_argument('--trace-memory', action='store_true')
+    main(parser.parse_args())
@@ -0,0 +1,91 @@
+"""
+Memory benchmark for the data models.
+
+Builds the same relationships in four representations and reports the bytes
+each record costs, measured with tracemalloc:
+
+    dict        one plain dict per row
+    dataclass   one regular (non-slotted) dataclass instance per row
+    slotted     storyteller.data.models.Relationship (__slots__, interned enums)
+    columnar    a DataStore Table (array-backed numerics, interned enums)
+
+    python benchmarks/model_memory.py --rows 200000
+"""
+import argparse
+import gc
+import random
+import tracemalloc
+from dataclasses import dataclass
+
+from storyteller.core.data_store import Table
+from storyteller.data.models import Relationship
+
+TYPES = ['friend', 'rival', 'sibling', 'mentor', 'enemy', 'ally', 'spouse']
+STATUSES = ['active', 'strained', 'broken', 'unknown']
+
+
+@dataclass
+class PlainRelationship:
+    char1_id: str
+    char2_id: str
+    relationship_type: str
+    relationship_quality: float
+    shared_history: str
+    current_status: str
+
+
+def raw_rows(count, characters):
+    rng = random.Random(7)
+    for _ in range(count):
+        # str() of a fresh format builds a new string object per row, like a CSV reader would
+        yield {
+            'char1_id': f"char_{rng.randrange(characters)}",
+            'char2_id': f"char_{rng.randrange(characters)}",
+            'relationship_type': ''.join(rng.choice(TYPES)),
+            'relationship_quality': rng.random() * 2 - 1,
+            'shared_history': '',
+            'current_status': ''.join(rng.choice(STATUSES)),
+        }
+
+
+def build_columnar(rows):
+    table = Table.for_model(Relationship)
+    table.extend({name: [row[name] for row in rows] for name in Relationship.SCHEMA})
+    return table
+
+
+BUILDERS = {
+    'dict': lambda rows: [dict(r) for r in rows],
+    'dataclass': lambda rows: [PlainRelationship(**r) for r in rows],
+    'slotted': lambda rows: [Relationship(**r) for r in rows],
+    'columnar': build_columnar,
+}
+
+
+def measure(build, count, characters):
+    """Returns the bytes still allocated once the input rows have been dropped."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    # Rows are generated inside the measurement so strings a representation
+    # keeps alive are counted, and strings it deduplicated are not
+    result = build(list(raw_rows(count, characters)))
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del result
+    return retained
+
+
+def main(args):
+    print(f"{'representation':<16}{'bytes/record':>14}{'total MiB':>12}")
+    for name, build in BUILDERS.items():
+        used = measure(build, args.rows, args.characters)
+        print(f"{name:<16}{used / args.rows:>14.1f}{used / 2 ** 20:>12.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bytes per record for each data model representation.")
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--characters', type=int, default=50_000)
+    main(parser.parse_args())
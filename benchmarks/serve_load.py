@@ -0,0 +1,122 @@
+"""
+Open-loop load test for the headless dialogue server (`storyteller serve`).
+
+Fires POST /dialogue requests at a fixed rate and reports latency percentiles.
+Requests are scheduled on a clock, not after the previous one finishes, so
+slow responses show up as latency instead of silently lowering the rate.
+
+Against a running server:
+    python benchmarks/serve_load.py --port 8765 --qps 50 --duration 30
+
+Self-contained, with an in-process server and a fake model that sleeps:
+    python benchmarks/serve_load.py --fake-latency-ms 40 --qps 200 --distinct 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import Counter
+
+
+async def post_dialogue(host, port, body, client_id):
+    """Sends one request; returns (status, latency seconds)."""
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        data = json.dumps(body).encode()
+        writer.write((f"POST /dialogue HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n"
+                      f"X-Client-Id: {client_id}\r\nContent-Type: application/json\r\n"
+                      f"Content-Length: {len(data)}\r\n\r\n").encode() + data)
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        writer.close()
+        status = int(status_line.split()[1])
+    except (OSError, IndexError, ValueError):
+        status = 0 # Connection failure
+    return status, time.perf_counter() - start
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_load(host, port, qps, duration, distinct, clients, deadline_ms):
+    interval = 1.0 / qps
+    total = int(qps * duration)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    tasks = []
+    for i in range(total):
+        # Sleep until this request's scheduled send time
+        delay = start + i * interval - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        body = {'speaker_id': 'guard', 'situation': f"situation {random.randrange(distinct)}"}
+        if deadline_ms:
+            body['deadline_ms'] = deadline_ms
+        tasks.append(asyncio.ensure_future(post_dialogue(host, port, body, f"client-{i % clients}")))
+    results = await asyncio.gather(*tasks)
+    elapsed = loop.time() - start
+    return results, elapsed
+
+
+def report(results, elapsed, qps):
+    statuses = Counter(status for status, _ in results)
+    latencies = [latency for status, latency in results if status == 200]
+    print(f"Requests:     {len(results)} in {elapsed:.1f}s "
+          f"(target {qps:.0f} QPS, achieved {len(results) / elapsed:.1f} QPS)")
+    print(f"Statuses:     {dict(sorted(statuses.items()))}")
+    if latencies:
+        print(f"Latency p50:  {percentile(latencies, 0.50) * 1000:.1f} ms")
+        print(f"Latency p99:  {percentile(latencies, 0.99) * 1000:.1f} ms")
+        print(f"Latency mean: {statistics.mean(latencies) * 1000:.1f} ms")
+        print(f"Latency max:  {max(latencies) * 1000:.1f} ms")
+
+
+async def main(args):
+    dialogue_server = None
+    host, port = args.host, args.port
+    if args.fake_latency_ms is not None:
+        from storyteller import server
+        from storyteller.core.dialogue_manager import DialogueResponse
+
+        class FakeManager:
+            async def generate_dialogue(self, request, on_token=None):
+                await asyncio.sleep(args.fake_latency_ms / 1000)
+                return DialogueResponse(text="Halt!", speaker_id=request.speaker_id, model='fake')
+
+        dialogue_server = server.DialogueServer(FakeManager(), host='127.0.0.1', port=0,
+                                                max_client_concurrency=args.max_client_concurrency)
+        await dialogue_server.start()
+        host, port = '127.0.0.1', dialogue_server.port
+    try:
+        results, elapsed = await run_load(host, port, args.qps, args.duration,
+                                          args.distinct, args.clients, args.deadline_ms)
+    finally:
+        if dialogue_server is not None:
+            await dialogue_server.close()
+    report(results, elapsed, args.qps)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--qps', type=float, default=20.0, help="Target requests per second.")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds to send for.")
+    parser.add_argument('--distinct', type=int, default=50,
+                        help="Number of distinct requests (fewer means more coalescing).")
+    parser.add_argument('--clients', type=int, default=8, help="Number of client ids to spread load over.")
+    parser.add_argument('--deadline-ms', type=float, default=None, help="Per-request deadline.")
+    parser.add_argument('--fake-latency-ms', type=float, default=None,
+                        help="Run an in-process server whose model takes this long per line.")
+    parser.add_argument('--max-client-concurrency', type=int, default=64,
+                        help="Per-client limit for the in-process server.")
+    asyncio.run(main(parser.parse_args()))
@@ -17,6 +17,7 @@ def install_dependencies():
         subprocess.check_call([python, "-m", "pip", "install", "pyqt6>=6.9.0"])
         subprocess.check_call([python, "-m", "pip", "install", "qt-material>=2.14"])
         subprocess.check_call([python, "-m", "pip", "install", "click>=8.0.0"])
+        subprocess.check_call([python, "-m", "pip", "install", "numpy>=1.26"])
         
         # Install development dependencies
         subprocess.check_call([python, "-m", "pip", "install", "pyinstaller>=6.0.0"])
@@ -0,0 +1,3 @@
+"""
+AI integration layer: Ollama access, prompt templates and query translation.
+"""
@@ -0,0 +1,257 @@
+"""
+Model Router.
+
+Picks the model for each dialogue request in the Model Configuration stage.
+Each candidate model has a cost and rolling statistics from recent runs. The
+cost is the size of its weights, taken from `OllamaIntegration.get_model_info`.
+The statistics are generation latency and the share of lines that passed
+quality assurance.
+
+A request goes to the cheapest model whose QA pass rate meets the request's
+threshold and whose predicted latency fits its deadline. Predicted latency is
+the model's recent p90, stretched by the requests already queued on it. Under
+load this moves requests to smaller, more heavily quantized models. If no
+model fits the deadline, the fastest acceptable one is used.
+"""
+import asyncio
+import atexit
+import contextlib
+import json
+import math
+import re
+import statistics
+import sys
+import time
+import weakref
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+
+from storyteller import config
+from storyteller import paths
+from storyteller.ai.ollama_integration import OllamaError
+from storyteller.metrics import registry as metrics
+
+STATS_FORMAT = 1
+DEFAULT_BITS = 16 # Unquantized (F16) weights
+SIZE_SUFFIXES = {'K': 1e3, 'M': 1e6, 'B': 1e9, 'T': 1e12}
+LATENCY_QUANTILE = 0.9
+MIN_QUALITY_RUNS = 5 # Fewer QA results than this count as meeting any threshold
+REFRESH_SECONDS = 300.0 # How often the installed models are listed again
+
+_routers_to_save = weakref.WeakSet() # Routers whose statistics are saved at exit
+
+
+def _save_routers():
+    for router in list(_routers_to_save):
+        router.save()
+
+
+atexit.register(_save_routers)
+
+
+def parse_parameter_count(info):
+    """Reads the parameter count from /api/show output (0 if unknown)."""
+    count = info.get('model_info', {}).get('general.parameter_count')
+    if count:
+        return int(count)
+    size = str(info.get('details', {}).get('parameter_size', '')).strip().upper()
+    match = re.fullmatch(r'([\d.]+)\s*([KMBT]?)', size)
+    if not match:
+        return 0
+    return int(float(match.group(1)) * SIZE_SUFFIXES.get(match.group(2), 1))
+
+
+def parse_quantization_bits(info):
+    """Bits per weight from the quantization level, e.g. Q4_K_M -> 4, F16 -> 16."""
+    level = str(info.get('details', {}).get('quantization_level', '')).upper()
+    match = re.search(r'\d+', level)
+    return int(match.group()) if match else DEFAULT_BITS
+
+
+class ModelProfile:
+    """A candidate model: its cost and how it behaved recently."""
+
+    def __init__(self, name, window=50, parameters=0, bits=DEFAULT_BITS):
+        self.name = name
+        self.parameters = parameters
+        self.bits = bits
+        self.latencies = deque(maxlen=window) # Seconds per generation
+        self.outcomes = deque(maxlen=window) # 1 if the line passed QA, else 0
+        self.in_flight = 0
+
+    @property
+    def cost(self):
+        """
+        Approximate weight size in bytes, which is what each generated token has
+        to read. Infinite while the size is unknown, so such a model is never
+        taken for the cheapest.
+        """
+        return self.parameters * self.bits / 8 if self.parameters else math.inf
+
+    def latency(self, q=LATENCY_QUANTILE):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def quality(self):
+        """QA pass rate over the window (None until there are results)."""
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else None
+
+    def meets_quality(self, threshold):
+        return len(self.outcomes) < MIN_QUALITY_RUNS or self.quality() >= threshold
+
+    def to_dict(self):
+        return {'latencies': list(self.latencies), 'outcomes': list(self.outcomes)}
+
+
+@dataclass
+class RouteDecision:
+    """The chosen model and why it was chosen."""
+    model: str
+    reason: str # 'cheapest', 'fallback', 'best_quality' or 'default'
+    predicted_seconds: float = None
+
+
+class ModelRouter:
+    """Chooses a model per request from measured latency, QA results and cost."""
+
+    def __init__(self, ollama, models=None, min_quality=None, window=None, parallel=None, stats_path=None):
+        self.ollama = ollama
+        if models is None:
+            models = [m.strip() for m in config.get_setting('Routing', 'models', '').split(',') if m.strip()]
+        self.models = list(models) # Empty means every installed model
+        self.min_quality = float(min_quality if min_quality is not None
+                                 else config.get_setting('Routing', 'min_quality'))
+        self.window = int(window or config.get_setting('Routing', 'window'))
+        self.parallel = max(1, int(parallel or config.get_setting('Routing', 'parallel')))
+        self.stats_path = Path(stats_path) if stats_path else None
+        self.profiles = {}
+        self._refreshed = None
+
+    @classmethod
+    def from_config(cls, ollama):
+        """A router that keeps its statistics across runs in the user data dir."""
+        router = cls(ollama, stats_path=paths.get_model_stats_file_path())
+        router.load()
+        _routers_to_save.add(router)
+        return router
+
+    # --- Candidates ---
+
+    async def refresh(self):
+        """Reads the size and quantization of every candidate model from Ollama."""
+        self._refreshed = time.monotonic()
+        try:
+            names = self.models or await self.ollama.list_available_models()
+        except OllamaError as e:
+            print(f"Warning: Could not list models for routing: {e}", file=sys.stderr)
+            return
+        infos = await asyncio.gather(*(self.ollama.get_model_info(name) for name in names),
+                                     return_exceptions=True)
+        profiles = {}
+        for name, info in zip(names, infos):
+            if isinstance(info, Exception):
+                print(f"Warning: Could not read model info for '{name}': {info}", file=sys.stderr)
+                info = {}
+            profile = self.profiles.get(name) or ModelProfile(name, self.window)
+            profile.parameters = parse_parameter_count(info)
+            profile.bits = parse_quantization_bits(info)
+            profiles[name] = profile
+        self.profiles = profiles
+
+    def _is_stale(self):
+        return self._refreshed is None or time.monotonic() - self._refreshed > REFRESH_SECONDS
+
+    # --- Selection ---
+
+    def predicted_latency(self, profile):
+        """Expected seconds for `profile` right now, or None if nothing is known yet."""
+        base = profile.latency()
+        if base is None:
+            # Scale by cost from the models that have been measured
+            rates = [p.latency() / p.cost for p in self.profiles.values() if p.latencies and p.parameters]
+            if not rates or not profile.parameters:
+                return None
+            base = statistics.median(rates) * profile.cost
+        # Requests already queued on this model run first
+        return base * (1 + profile.in_flight / self.parallel)
+
+    async def choose(self, request, exclude=()):
+        """Returns the RouteDecision for `request`, skipping models in `exclude` if possible."""
+        if self._is_stale():
+            await self.refresh()
+        if not self.profiles:
+            return RouteDecision(self.ollama.model, 'default')
+        candidates = [p for p in self.profiles.values() if p.name not in exclude] or list(self.profiles.values())
+        threshold = request.min_quality if request.min_quality is not None else self.min_quality
+        acceptable = [p for p in candidates if p.meets_quality(threshold)]
+        if not acceptable:
+            best = max(candidates, key=lambda p: (p.quality() or 0.0, -p.cost))
+            return RouteDecision(best.name, 'best_quality', self.predicted_latency(best))
+
+        predictions = {p.name: self.predicted_latency(p) for p in acceptable}
+        deadline = request.deadline_ms / 1000 if request.deadline_ms else None
+        fitting = [p for p in acceptable
+                   if deadline is None or predictions[p.name] is None or predictions[p.name] <= deadline]
+        if fitting:
+            choice = min(fitting, key=lambda p: (p.cost, p.name))
+            return RouteDecision(choice.name, 'cheapest', predictions[choice.name])
+        metrics.increment('model_fallbacks')
+        choice = min(acceptable, key=lambda p: (predictions[p.name], p.cost))
+        return RouteDecision(choice.name, 'fallback', predictions[choice.name])
+
+    # --- Recording ---
+
+    @contextlib.contextmanager
+    def track(self, model):
+        """Counts a generation as in flight and records its latency if it succeeds."""
+        profile = self.profiles.get(model)
+        if profile is None:
+            yield
+            return
+        profile.in_flight += 1
+        start = time.perf_counter()
+        try:
+            yield
+            profile.latencies.append(time.perf_counter() - start)
+        finally:
+            profile.in_flight -= 1
+
+    def record_quality(self, model, passed):
+        profile = self.profiles.get(model)
+        if profile is not None:
+            profile.outcomes.append(1 if passed else 0)
+
+    # --- Persistence ---
+
+    def save(self, path=None):
+        path = Path(path) if path is not None else self.stats_path
+        if path is None or not self.profiles:
+            return
+        try:
+            with open(path, 'w') as stats_file:
+                json.dump({'format': STATS_FORMAT,
+                           'models': {name: p.to_dict() for name, p in self.profiles.items()}},
+                          stats_file, indent=2)
+        except IOError as e:
+            print(f"Error saving model statistics to {path}: {e}", file=sys.stderr)
+
+    def load(self, path=None):
+        """Restores statistics saved by an earlier run."""
+        path = Path(path) if path is not None else self.stats_path
+        if path is None or not path.exists():
+            return
+        try:
+            with open(path) as stats_file:
+                data = json.load(stats_file)
+        except (IOError, ValueError) as e:
+            print(f"Error reading model statistics from {path}: {e}", file=sys.stderr)
+            return
+        if data.get('format') != STATS_FORMAT:
+            return
+        for name, entry in data.get('models', {}).items():
+            profile = self.profiles.setdefault(name, ModelProfile(name, self.window))
+            profile.latencies.extend(entry.get('latencies', []))
+            profile.outcomes.extend(entry.get('outcomes', []))
@@ -0,0 +1,215 @@
+"""
+Ollama Integration Layer.
+
+Thin asynchronous wrapper around the Ollama REST API. Requests are made with
+the standard library in a worker thread so callers never block the event loop
+and no extra HTTP dependency is needed. When the awaiting caller is cancelled
+(e.g. a deadline passes), the request's socket is shut down so the worker
+thread is freed instead of waiting for the generation to finish.
+"""
+import asyncio
+import http.client
+import json
+import socket
+import threading
+import urllib.error
+import urllib.request
+from dataclasses import dataclass, field
+
+from storyteller import config
+
+
+class OllamaError(Exception):
+    """Raised when the Ollama service is unreachable or returns an error."""
+
+
+@dataclass
+class Completion:
+    """A finished completion together with the timing data Ollama reports."""
+    text: str
+    model: str
+    prompt_eval_count: int = 0 # Prompt tokens the server had to evaluate
+    eval_count: int = 0 # Generated tokens
+    eval_seconds: float = 0.0
+    prompt_eval_seconds: float = 0.0
+    context: list = field(default_factory=list) # Encoded conversation state
+
+    @classmethod
+    def from_response(cls, data, text=None):
+        return cls(
+            text=data.get('response', '') if text is None else text,
+            model=data.get('model', ''),
+            prompt_eval_count=data.get('prompt_eval_count', 0),
+            eval_count=data.get('eval_count', 0),
+            eval_seconds=data.get('eval_duration', 0) / 1e9, # Reported in nanoseconds
+            prompt_eval_seconds=data.get('prompt_eval_duration', 0) / 1e9,
+            context=data.get('context') or [],
+        )
+
+    @property
+    def backend_seconds(self):
+        """Time the server spent on this completion, excluding time queued behind others."""
+        return self.prompt_eval_seconds + self.eval_seconds
+
+
+class RequestHandle:
+    """Lets the event loop abort a blocking request running in a worker thread."""
+
+    def __init__(self):
+        self.cancelled = False
+        self._sockets = []
+        self._lock = threading.Lock()
+
+    def attach(self, sock):
+        with self._lock:
+            self._sockets.append(sock)
+            if self.cancelled:
+                self._shutdown(sock)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            for sock in self._sockets:
+                self._shutdown(sock)
+
+    @staticmethod
+    def _shutdown(sock):
+        # Unblocks a recv() in the worker thread; closing is left to its owner
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass # Already closed
+
+    def opener(self):
+        """A urllib opener whose connections register their sockets here."""
+        handle = self
+
+        def connection(base):
+            class Connection(base):
+                def connect(self):
+                    super().connect()
+                    handle.attach(self.sock)
+            return Connection
+
+        class HTTPHandler(urllib.request.HTTPHandler):
+            def http_open(self, req):
+                return self.do_open(connection(http.client.HTTPConnection), req)
+
+        class HTTPSHandler(urllib.request.HTTPSHandler):
+            def https_open(self, req):
+                return self.do_open(connection(http.client.HTTPSConnection), req, context=self._context)
+
+        return urllib.request.build_opener(HTTPHandler, HTTPSHandler)
+
+
+class OllamaIntegration:
+    """Sends prompts to an Ollama server and returns completions."""
+
+    def __init__(self, host=None, model=None, timeout=None, keep_alive=None):
+        self.host = (host or config.get_setting('Ollama', 'host')).rstrip('/')
+        self.model = model or config.get_setting('Ollama', 'model')
+        self.timeout = float(timeout or config.get_setting('Ollama', 'timeout'))
+        # How long the server keeps the model (and its prompt cache) loaded between calls
+        self.keep_alive = keep_alive or config.get_setting('Ollama', 'keep_alive')
+
+    # --- Blocking helpers (run in a worker thread) ---
+
+    def _request(self, path, payload=None, handle=None):
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        request = urllib.request.Request(
+            self.host + path, data=data, headers={'Content-Type': 'application/json'},
+            method='POST' if data is not None else 'GET')
+        open_url = handle.opener().open if handle is not None else urllib.request.urlopen
+        try:
+            return open_url(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            raise OllamaError(f"Ollama returned HTTP {e.code} for {path}: {e.read().decode(errors='replace')}") from e
+        except (urllib.error.URLError, OSError) as e:
+            raise OllamaError(f"Could not reach Ollama at {self.host}: {e}") from e
+
+    def _call(self, path, payload=None, handle=None):
+        with self._request(path, payload, handle) as response:
+            return json.loads(response.read())
+
+    def _build_payload(self, prompt, params, model, system, stream, context=None):
+        payload = {'model': model or self.model, 'prompt': prompt, 'stream': stream}
+        if system:
+            payload['system'] = system
+        if params:
+            payload['options'] = dict(params)
+        if context:
+            payload['context'] = list(context) # Continue the conversation this context encodes
+        if self.keep_alive:
+            payload['keep_alive'] = self.keep_alive
+        return payload
+
+    # --- Public API ---
+
+    async def generate_completion(self, prompt, params=None, model=None, system=None, context=None):
+        """
+        Generates a completion for `prompt` and returns a `Completion`. Pass
+        the `context` of an earlier completion to continue that conversation.
+        """
+        payload = self._build_payload(prompt, params, model, system, stream=False, context=context)
+        handle = RequestHandle()
+        try:
+            data = await asyncio.to_thread(self._call, '/api/generate', payload, handle)
+        except asyncio.CancelledError:
+            handle.cancel()
+            raise
+        return Completion.from_response(data)
+
+    async def stream_completion(self, prompt, params=None, model=None, system=None, context=None):
+        """
+        Streams a completion. Yields text chunks as strings and finally the
+        `Completion` for the whole response.
+        """
+        payload = self._build_payload(prompt, params, model, system, stream=True, context=context)
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        handle = RequestHandle()
+
+        def reader():
+            # Ollama streams newline-delimited JSON objects
+            try:
+                with self._request('/api/generate', payload, handle) as response:
+                    for line in response:
+                        if handle.cancelled:
+                            return
+                        if line.strip():
+                            loop.call_soon_threadsafe(queue.put_nowait, json.loads(line))
+            except Exception as e:
+                if not handle.cancelled:
+                    loop.call_soon_threadsafe(queue.put_nowait, e)
+            if not handle.cancelled:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        loop.run_in_executor(None, reader)
+        parts = []
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item if isinstance(item, OllamaError) else OllamaError(str(item))
+                if item.get('error'):
+                    raise OllamaError(item['error'])
+                chunk = item.get('response', '')
+                if chunk:
+                    parts.append(chunk)
+                    yield chunk
+                if item.get('done'):
+                    yield Completion.from_response(item, text=''.join(parts))
+        finally:
+            # The consumer stopped early (cancelled, deadline, or an error): stop the reader
+            handle.cancel()
+
+    async def list_available_models(self):
+        """Returns the names of locally installed models."""
+        data = await asyncio.to_thread(self._call, '/api/tags')
+        return [entry['name'] for entry in data.get('models', [])]
+
+    async def get_model_info(self, model_name):
+        """Returns the details Ollama reports for a model (family, size, quantization)."""
+        return await asyncio.to_thread(self._call, '/api/show', {'model': model_name})
@@ -0,0 +1,202 @@
+"""
+Prompt Builder.
+
+Lays dialogue prompts out from the most stable content to the least:
+
+    system     instructions and the speaker's identity       (fixed per character)
+    character  personality traits and speech patterns        (fixed per character)
+    scene      listeners and world state                     (changes between scenes)
+    turn       new dialogue lines, situation and instruction (changes every turn)
+
+Every block is rendered deterministically (sorted keys, no timestamps), so
+everything before the turn block is byte-identical from one turn to the next
+and the server can reuse the part of the prompt it has already evaluated.
+
+`SessionStore` goes a step further and keeps one warm Ollama session per
+character and model. The first turn sends the full prompt. Later turns send
+only the new turn block together with the `context` Ollama returned last time,
+so the system, character and scene blocks are not evaluated again. A session
+is only continued while the conversation it holds is still the start of the
+request's history; a turn from another branch starts a fresh session.
+"""
+import hashlib
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+
+from storyteller import config
+
+SYSTEM_TEMPLATE = ("You are {name}. {background} Stay in character and reply with a "
+                   "single line of spoken dialogue only.")
+
+
+def render_value(value):
+    """Renders profile and world-state values the same way every time."""
+    if isinstance(value, dict):
+        return '; '.join(f"{k}={render_value(v)}" for k, v in sorted(value.items(), key=lambda i: str(i[0])))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = sorted(value, key=str) if isinstance(value, (set, frozenset)) else value
+        return ', '.join(render_value(v) for v in items)
+    return str(value)
+
+
+def line_key(entry):
+    return (entry['speaker_id'], entry['text'])
+
+
+@dataclass
+class PromptParts:
+    """A prompt split into its stability layers."""
+    system: str
+    character: str
+    scene: str
+    history: list # Dialogue entries, oldest first
+    situation: str = ''
+    instruction: str = ''
+
+    def prefix(self):
+        """The stable blocks that precede the turn block."""
+        return '\n'.join(block for block in (self.character, self.scene) if block)
+
+    def prefix_key(self):
+        """Identifies the system, character and scene blocks (a session is only reused while these match)."""
+        text = '\x00'.join((self.system, self.character, self.scene))
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def turn(self, history=None):
+        """The per-turn block: dialogue lines (all, or the given ones), situation and instruction."""
+        lines = [f"{entry['speaker_id']}: {entry['text']}"
+                 for entry in (self.history if history is None else history)]
+        if self.situation:
+            lines.append(f"Situation: {self.situation}")
+        lines.append(self.instruction)
+        return '\n'.join(lines)
+
+    def full_prompt(self):
+        return '\n'.join(block for block in (self.prefix(), self.turn()) if block)
+
+
+class PromptBuilder:
+    """Builds `PromptParts` for a dialogue request."""
+
+    def build(self, request, context):
+        speaker = context.speaker
+        system = SYSTEM_TEMPLATE.format(name=speaker.get('name', request.speaker_id),
+                                        background=speaker.get('background', '')).replace('  ', ' ')
+        character = []
+        if speaker.get('personality_traits'):
+            character.append(f"Personality: {render_value(speaker['personality_traits'])}")
+        if speaker.get('speech_patterns'):
+            character.append(f"Speech patterns: {render_value(speaker['speech_patterns'])}")
+        scene = []
+        if context.listeners:
+            scene.append("Speaking to: " + ', '.join(l.get('name', '') for l in context.listeners))
+        if context.world_state:
+            scene.append(f"World state: {render_value(context.world_state)}")
+        return PromptParts(system=system, character='\n'.join(character), scene='\n'.join(scene),
+                           history=list(context.history), situation=request.situation,
+                           instruction=f"Write the next {request.dialogue_type}.")
+
+
+# --- Warm per-character sessions ---
+
+@dataclass
+class PreparedPrompt:
+    """What to send for one turn. `context` is None when starting a fresh session."""
+    prompt: str
+    system: str
+    context: list = None
+    reused_tokens: int = 0 # Context tokens the server does not have to evaluate again
+    session_key: tuple = None
+    session_version: int = 0
+    covered: tuple = () # Keys of the history lines the context holds after this turn
+
+
+@dataclass
+class CharacterSession:
+    prefix_key: str
+    context: list
+    covered: deque = field(default_factory=lambda: deque(maxlen=256)) # Line keys in the context, in order
+    turns: int = 0
+    version: int = 0
+
+
+def continuation(covered, history):
+    """
+    Index in `history` (a window of the latest line keys) where the lines new to
+    a session start, or None if the session's conversation (`covered`) is not
+    the start of that history. The window overlaps the end of `covered` when
+    both come from the same conversation.
+    """
+    if not covered:
+        return None
+    covered = list(covered)
+    for end in range(len(history), 0, -1): # Latest match first
+        if end <= len(covered) and history[:end] == covered[-end:]:
+            return end
+    return None
+
+
+class SessionStore:
+    """
+    Keeps the Ollama `context` of each (character, model) conversation so
+    later turns only send what is new. A session is restarted when its stable
+    blocks change (different scene, world state or profile) or its context
+    grows past `max_context_tokens`.
+    """
+
+    def __init__(self, max_context_tokens=None, capacity=64):
+        if max_context_tokens is None:
+            max_context_tokens = int(config.get_setting('Ollama', 'session_context_tokens'))
+        self.max_context_tokens = max_context_tokens
+        self.capacity = capacity
+        self._sessions = OrderedDict()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def prepare(self, speaker_id, model, parts):
+        """Returns the PreparedPrompt for this turn, continuing a session when possible."""
+        key = (speaker_id, model)
+        session = self._sessions.get(key)
+        prefix_key = parts.prefix_key()
+        history = [line_key(entry) for entry in parts.history]
+        start = None
+        if (session is not None and session.prefix_key == prefix_key
+                and len(session.context) <= self.max_context_tokens):
+            start = continuation(session.covered, history)
+        if start is None:
+            return PreparedPrompt(parts.full_prompt(), parts.system, session_key=key, covered=tuple(history))
+        self._sessions.move_to_end(key)
+        # The system prompt is already part of the session context
+        return PreparedPrompt(parts.turn(parts.history[start:]), '', context=session.context,
+                              reused_tokens=len(session.context), session_key=key,
+                              session_version=session.version,
+                              covered=tuple(session.covered) + tuple(history[start:]))
+
+    def update(self, prepared, parts, completion, text):
+        """Records the context after an accepted turn (rejected drafts never reach a session)."""
+        if not completion.context or prepared.session_key is None:
+            return
+        session = self._sessions.get(prepared.session_key)
+        if prepared.context is None or session is None:
+            session = CharacterSession(parts.prefix_key(), completion.context)
+            self._sessions[prepared.session_key] = session
+            if len(self._sessions) > self.capacity:
+                self._sessions.popitem(last=False)
+        elif session.version != prepared.session_version:
+            return # Another turn for this character finished first; keep its context
+        else:
+            session.context = completion.context
+        session.version += 1
+        session.turns += 1
+        session.covered.clear()
+        session.covered.extend(prepared.covered)
+        session.covered.append((prepared.session_key[0], text))
+
+    def reset(self, speaker_id=None):
+        """Drops all sessions, or only those of one character."""
+        if speaker_id is None:
+            self._sessions.clear()
+        else:
+            for key in [k for k in self._sessions if k[0] == speaker_id]:
+                del self._sessions[key]
@@ -0,0 +1,474 @@
+"""
+Query Engine.
+
+Natural-language access to the DataStore. A question is translated by the LLM
+into a structured query plan only once: filter, join, aggregate, order and
+limit over the DataStore tables. The plan is then executed column-wise
+against the tables.
+
+Before translation, literals in the question (quoted text, numbers and known
+ids, names and enum values) are replaced by parameter slots. "Who are Mira's
+rivals?" and "Who are Tor's rivals?" therefore share one template and one
+cached plan, and only the bound parameters differ. A plan is cached only if
+it uses every slot; one that hard-codes a literal instead (e.g. a limit of 3
+for "the first 3 characters") would give wrong answers to the next question of
+the same shape, so it is translated again each time. Cached plans are
+discarded whenever the DataStore schema changes.
+
+Plan format (JSON, as produced by the translator):
+
+    {"table": "relationships",
+     "join": {"table": "characters", "left": "char2_id", "right": "character_id"},
+     "filters": [{"column": "char1_id", "op": "==", "value": {"param": 0}},
+                 {"column": "relationship_type", "op": "==", "value": "rival"}],
+     "select": ["characters.name"],
+     "aggregate": null, "order_by": null, "limit": null}
+
+Columns of the joined table are written "<table>.<column>". Filter values and
+the limit may be parameter references ({"param": N}).
+"""
+import json
+import operator
+import re
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from itertools import compress
+
+from storyteller.data import models
+from storyteller.metrics import registry as metrics
+
+
+class QueryPlanError(ValueError):
+    """Raised when a translated plan does not fit the DataStore schema."""
+
+
+OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda value, options: value in options,
+    'contains': lambda value, item: item in value, # Tags, or substrings of text
+}
+AGGREGATES = ('count', 'sum', 'mean', 'min', 'max', 'list')
+
+# Literal patterns replaced by parameter slots, before the vocabulary lookup
+_QUOTED = re.compile(r'"([^"]+)"|\'([^\']+)\'')
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])')
+_WORD = re.compile(r"[\w-]+")
+_SLOT = re.compile(r'\{\d+\}')
+# Columns whose values count as literals (ids, names and enum-like values)
+VOCABULARY_KINDS = ('enum',)
+VOCABULARY_COLUMNS = {'characters': ('character_id', 'name')}
+MAX_PHRASE_WORDS = 4
+
+
+@dataclass
+class QueryResult:
+    """Rows (or an aggregate value) returned by a query."""
+    rows: list = field(default_factory=list)
+    value: object = None # Set for aggregates
+    plan: dict = None
+    from_cache: bool = False
+    seconds: float = 0.0
+
+
+# --- Templating ---
+
+class Vocabulary:
+    """Known literal values, used to recognise unquoted literals in questions."""
+
+    def __init__(self, store):
+        self.phrases = {} # lowercased phrase -> (stored value, "table.column")
+        for name, table in sorted(store.tables.items()):
+            columns = list(VOCABULARY_COLUMNS.get(name, ()))
+            columns += [c for c, kind in table.schema.items() if kind in VOCABULARY_KINDS and c not in columns]
+            for column in columns:
+                for value in set(table.column(column)):
+                    if isinstance(value, str) and value and len(value.split()) <= MAX_PHRASE_WORDS:
+                        self.phrases.setdefault(value.lower(), (value, f"{name}.{column}"))
+
+    def templatize(self, text, params):
+        """Replaces known phrases (longest first) in `text` with slots appended to `params`."""
+        words = list(_WORD.finditer(text))
+        pieces, position, i = [], 0, 0
+        while i < len(words):
+            for size in range(min(MAX_PHRASE_WORDS, len(words) - i), 0, -1):
+                start, end = words[i].start(), words[i + size - 1].end()
+                match = self.phrases.get(text[start:end].lower())
+                if match is not None:
+                    pieces += [text[position:start], f"{{{len(params)}}}"]
+                    params.append(match)
+                    position = end
+                    i += size
+                    break
+            else:
+                i += 1
+        pieces.append(text[position:])
+        return ''.join(pieces)
+
+
+def templatize(text, vocabulary=None):
+    """
+    Returns (template, params): `text` normalised, with its literals replaced
+    by {0}, {1}, ... slots. Each param is a (value, source) pair, where source
+    is 'text', 'number' or the "table.column" the value was recognised from.
+    """
+    params = []
+
+    def slot(value, source):
+        params.append((value, source))
+        return f"{{{len(params) - 1}}}"
+
+    def outside_slots(replace, text):
+        # Only the text between existing slots is searched, never the slot digits
+        return ''.join(part if _SLOT.fullmatch(part) else replace(part)
+                       for part in re.split(f"({_SLOT.pattern})", text))
+
+    text = ' '.join(text.strip().split())
+    text = _QUOTED.sub(lambda m: slot(m.group(1) if m.group(1) is not None else m.group(2), 'text'), text)
+    text = outside_slots(lambda part: _NUMBER.sub(
+        lambda m: slot(float(m.group()) if '.' in m.group() else int(m.group()), 'number'), part), text)
+    if vocabulary is not None:
+        text = outside_slots(lambda part: vocabulary.templatize(part, params), text)
+    # Slots are renumbered in order of appearance so equal shapes get equal templates
+    order = [int(s[1:-1]) for s in _SLOT.findall(text)]
+    mapping = {old: new for new, old in enumerate(order)}
+    text = _SLOT.sub(lambda m: f"{{{mapping[int(m.group()[1:-1])]}}}", text)
+    return text.lower().rstrip('?.! '), [params[old] for old in order]
+
+
+# --- Plans ---
+
+def _slots(value):
+    """Indices of the parameters `value` refers to."""
+    if isinstance(value, dict) and 'param' in value:
+        return {value['param']} if isinstance(value['param'], int) else set()
+    if isinstance(value, list):
+        return set().union(*map(_slots, value))
+    return set()
+
+
+def _bind(value, params):
+    if isinstance(value, dict) and 'param' in value:
+        index = value['param']
+        if not isinstance(index, int) or not 0 <= index < len(params):
+            raise QueryPlanError(f"Plan refers to parameter {index!r}, but the question has {len(params)}.")
+        return params[index]
+    if isinstance(value, list):
+        return [_bind(v, params) for v in value]
+    return value
+
+
+def _coerce_operand(kind, op, value):
+    """Converts a bound value to the column's stored type."""
+    if op == 'in':
+        return {models.coerce(kind, v) for v in (value if isinstance(value, (list, tuple, set)) else [value])}
+    if op == 'contains':
+        return models.intern_value(str(value)) if kind == 'tags' else str(value)
+    try:
+        return models.coerce(kind, value)
+    except (TypeError, ValueError):
+        raise QueryPlanError(f"Cannot compare a {kind} column with {value!r}.") from None
+
+
+class QueryPlan:
+    """A validated plan. `execute` binds parameters and runs it column-wise."""
+
+    def __init__(self, data, store):
+        if not isinstance(data, dict):
+            raise QueryPlanError("Plan must be a JSON object.")
+        self.data = data
+        self.table = self._table_name(data.get('table'), store)
+        self.join = None
+        join = data.get('join')
+        if join:
+            other = self._table_name(join.get('table'), store)
+            if other == self.table:
+                raise QueryPlanError("Self-joins are not supported.")
+            self.join = (other, self._column(join.get('left'), store, self.table),
+                         self._column(join.get('right'), store, other))
+        self.filters = []
+        for spec in data.get('filters') or []:
+            op = spec.get('op', '==')
+            if op not in OPERATORS:
+                raise QueryPlanError(f"Unknown filter operator {op!r}.")
+            self.filters.append((self._qualified(spec.get('column'), store), op, spec.get('value')))
+        self.slots = set().union(*(_slots(value) for _, _, value in self.filters))
+        self.select = [self._qualified(c, store) for c in data.get('select') or []]
+        self.aggregate = None
+        aggregate = data.get('aggregate')
+        if aggregate:
+            op = aggregate.get('op')
+            if op not in AGGREGATES:
+                raise QueryPlanError(f"Unknown aggregate {op!r}.")
+            column = aggregate.get('column')
+            group_by = aggregate.get('group_by')
+            self.aggregate = (op, self._qualified(column, store) if column else None,
+                              self._qualified(group_by, store) if group_by else None)
+        order_by = data.get('order_by')
+        self.order_by = None
+        if order_by:
+            self.order_by = (self._qualified(order_by.get('column'), store), bool(order_by.get('descending')))
+        limit = data.get('limit')
+        if limit is not None and not _slots(limit):
+            self._check_limit(limit)
+        self.limit = limit
+        self.slots |= _slots(limit)
+
+    # Validation helpers
+
+    @staticmethod
+    def _check_limit(limit):
+        if isinstance(limit, bool) or not isinstance(limit, int) or limit < 0:
+            raise QueryPlanError(f"Invalid limit {limit!r}.")
+        return limit
+
+    @staticmethod
+    def _table_name(name, store):
+        if name not in store.tables:
+            raise QueryPlanError(f"Unknown table {name!r}. Known tables: {', '.join(sorted(store.tables))}")
+        return name
+
+    @staticmethod
+    def _column(name, store, table):
+        if name not in store.get_table(table).schema:
+            raise QueryPlanError(f"Unknown column {name!r} in table {table!r}.")
+        return name
+
+    def _qualified(self, name, store):
+        """Resolves 'column' or 'table.column' to (table, column)."""
+        if not isinstance(name, str):
+            raise QueryPlanError(f"Invalid column reference {name!r}.")
+        table, _, column = name.rpartition('.')
+        table = table or self.table
+        if table not in (self.table, self.join[0] if self.join else None):
+            raise QueryPlanError(f"Column {name!r} refers to table {table!r}, which is not part of the query.")
+        return table, self._column(column, store, table)
+
+    # Execution
+
+    def _matching_rows(self, store, table_name, params):
+        """Row indices of `table_name` passing the filters on that table."""
+        table = store.get_table(table_name)
+        rows = None
+        for (table_ref, column), op, value in self.filters:
+            if table_ref != table_name:
+                continue
+            operand = _coerce_operand(table.schema[column], op, _bind(value, params))
+            test = OPERATORS[op]
+            values = table.column(column)
+            if rows is None: # First filter scans the whole column
+                rows = list(compress(range(len(values)), [test(v, operand) for v in values]))
+            else:
+                rows = [i for i in rows if test(values[i], operand)]
+        return range(len(table)) if rows is None else rows
+
+    def uses_all(self, params):
+        """Whether every parameter slot of the question appears in the plan."""
+        return self.slots >= set(range(len(params)))
+
+    def execute(self, store, params=()):
+        limit = self._check_limit(_bind(self.limit, params)) if self.limit is not None else None
+        base_rows = self._matching_rows(store, self.table, params)
+        base = store.get_table(self.table)
+        if self.join:
+            other_name, left, right = self.join
+            other = store.get_table(other_name)
+            # Hash join: index the filtered right side by its join key
+            index = defaultdict(list)
+            right_values = other.column(right)
+            for i in self._matching_rows(store, other_name, params):
+                index[right_values[i]].append(i)
+            left_values = base.column(left)
+            pairs = [(i, j) for i in base_rows for j in index.get(left_values[i], ())]
+        else:
+            pairs = [(i, None) for i in base_rows]
+
+        def column_values(ref):
+            table_name, column = ref
+            if table_name == self.table:
+                values = base.column(column)
+                return [values[i] for i, _ in pairs]
+            values = store.get_table(table_name).column(column)
+            return [values[j] for _, j in pairs]
+
+        if self.aggregate:
+            return None, self._aggregate(column_values, len(pairs), limit)
+
+        if self.order_by:
+            keys = column_values(self.order_by[0])
+            order = sorted(range(len(pairs)), key=keys.__getitem__, reverse=self.order_by[1])
+            pairs = [pairs[k] for k in order]
+        if limit is not None:
+            pairs = pairs[:limit]
+
+        select = self.select or [(self.table, c) for c in base.schema]
+        names = [column if table == self.table else f"{table}.{column}" for table, column in select]
+        columns = [column_values(ref) for ref in select]
+        return [dict(zip(names, row)) for row in zip(*columns)] if columns else [], None
+
+    def _aggregate(self, column_values, count, limit):
+        op, column, group_by = self.aggregate
+        values = column_values(column) if column else [1] * count
+        if group_by is None:
+            return _reduce(op, values)
+        groups = defaultdict(list)
+        for key, value in zip(column_values(group_by), values):
+            groups[key].append(value)
+        result = {key: _reduce(op, group) for key, group in groups.items()}
+        if self.order_by: # Ordering an aggregate orders its groups by value
+            result = dict(sorted(result.items(), key=lambda item: item[1], reverse=self.order_by[1]))
+        if limit is not None:
+            result = dict(list(result.items())[:limit])
+        return result
+
+
+def _reduce(op, values):
+    if op == 'count':
+        return len(values)
+    if op == 'list':
+        return list(values)
+    if not values:
+        return None
+    if op == 'sum':
+        return sum(values)
+    if op == 'mean':
+        return sum(values) / len(values)
+    return min(values) if op == 'min' else max(values)
+
+
+# --- Translation ---
+
+PLAN_INSTRUCTIONS = """\
+Translate the question into a JSON query plan over these tables:
+{schema}
+
+Answer with one JSON object and nothing else, using these keys:
+  "table": base table name
+  "join": null or {{"table": other table, "left": base column, "right": other table column}}
+  "filters": list of {{"column": column, "op": one of {ops}, "value": value}}
+  "select": list of columns to return (empty for all base table columns)
+  "aggregate": null or {{"op": one of {aggregates}, "column": column or null, "group_by": column or null}}
+  "order_by": null or {{"column": column, "descending": true/false}}
+  "limit": null, an integer or a parameter
+Columns of the joined table are written "table.column".
+Placeholders like {{0}} in the question are parameters. Use {{"param": 0}} wherever the plan needs
+that value (a filter value or the limit), never the placeholder text or a literal value, so the plan
+works for any value of the same kind.
+{parameters}{scope}
+Question: {question}"""
+
+
+def describe_schema(store, tables=None):
+    return '\n'.join(f"  {name}: {', '.join(f'{c} ({k})' for c, k in table.schema.items())}"
+                     for name, table in sorted(store.tables.items()) if tables is None or name in tables)
+
+
+def parse_plan_text(text):
+    """Extracts the JSON object from an LLM answer (tolerating surrounding prose or code fences)."""
+    start, end = text.find('{'), text.rfind('}')
+    if start < 0 or end < start:
+        raise QueryPlanError(f"No JSON plan in model output: {text[:200]!r}")
+    try:
+        return json.loads(text[start:end + 1])
+    except ValueError as e:
+        raise QueryPlanError(f"Invalid JSON plan: {e}") from e
+
+
+class LLMPlanTranslator:
+    """Asks the LLM (through OllamaIntegration) for a plan."""
+
+    def __init__(self, ollama=None, model=None):
+        if ollama is None:
+            from storyteller.ai.ollama_integration import OllamaIntegration
+            ollama = OllamaIntegration()
+        self.ollama = ollama
+        self.model = model
+
+    async def translate(self, template, params, store, table=None):
+        # Only the kind of each value is shown, so the model cannot copy a literal into the plan
+        parameters = ''.join(f"  {{{i}}}: {source}\n" for i, (_, source) in enumerate(params))
+        prompt = PLAN_INSTRUCTIONS.format(
+            schema=describe_schema(store), ops=', '.join(OPERATORS), aggregates=', '.join(AGGREGATES),
+            parameters=f"Parameters:\n{parameters}" if parameters else '',
+            scope=f'The base table must be "{table}".' if table else '', question=template)
+        completion = await self.ollama.generate_completion(prompt, params={'temperature': 0}, model=self.model)
+        return parse_plan_text(completion.text)
+
+
+# --- Engine ---
+
+class QueryEngine:
+    """Answers natural-language questions over a DataStore, caching compiled plans."""
+
+    def __init__(self, store, translator=None, capacity=256):
+        self.store = store
+        self.translator = translator or LLMPlanTranslator()
+        self.capacity = capacity
+        self._plans = OrderedDict() # (table or None, template, slot sources) -> QueryPlan
+        self._schema = store.schema_fingerprint()
+        self._schema_version = store.schema_version
+        self._vocabulary = None
+        self._vocabulary_version = None
+        self.translations = 0
+
+    def _check_schema(self):
+        if self.store.schema_version == self._schema_version:
+            return
+        self._schema_version = self.store.schema_version
+        fingerprint = self.store.schema_fingerprint()
+        if fingerprint != self._schema:
+            self._schema = fingerprint
+            self._plans.clear()
+
+    def vocabulary(self):
+        """The literal vocabulary, rebuilt only when the data has changed."""
+        if self._vocabulary is None or self._vocabulary_version != self.store.data_version:
+            self._vocabulary = Vocabulary(self.store)
+            self._vocabulary_version = self.store.data_version
+        return self._vocabulary
+
+    def invalidate(self):
+        self._plans.clear()
+
+    async def _run(self, table, query_text):
+        start = time.perf_counter()
+        self._check_schema()
+        template, params = templatize(query_text, self.vocabulary())
+        # Questions of the same shape share a plan only if their slots hold the same kinds of value
+        key = (table, template, tuple(source for _, source in params))
+        plan = self._plans.get(key)
+        cached = plan is not None
+        metrics.record_cache('query_plan', cached)
+        if cached:
+            self._plans.move_to_end(key)
+        else:
+            with metrics.span('query_translation'):
+                data = await self.translator.translate(template, params, self.store, table)
+            self.translations += 1
+            plan = QueryPlan(data, self.store)
+            if table is not None and plan.table != table and (not plan.join or plan.join[0] != table):
+                raise QueryPlanError(f"Plan queries {plan.table!r}, not {table!r}.")
+            if plan.uses_all(params):
+                self._plans[key] = plan
+                if len(self._plans) > self.capacity:
+                    self._plans.popitem(last=False)
+            else:
+                metrics.increment('query_plans_uncached')
+        with metrics.span('query_execution'):
+            rows, value = plan.execute(self.store, [value for value, _ in params])
+        return QueryResult(rows=rows or [], value=value, plan=plan.data, from_cache=cached,
+                           seconds=time.perf_counter() - start)
+
+    async def query_dataframe(self, table_name, query_text):
+        """Answers a question about one table."""
+        self.store.get_table(table_name) # Unknown tables raise KeyError
+        return await self._run(table_name, query_text)
+
+    async def cross_dataframe_query(self, query_text):
+        """Answers a question that may span several tables."""
+        return await self._run(None, query_text)
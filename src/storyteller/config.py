@@ -18,7 +18,38 @@ config = configparser.ConfigParser()
 DEFAULT_SETTINGS = {
     'General': {
         'show_welcome_on_startup': 'true',
-    }
+    },
+    'Appearance': {
+        'theme': 'dark_blue.xml', # Any qt_material theme file name
+        'stylesheet_cache': 'true',
+    },
+    'Layout': {
+        'geometry': '', # Saved by the main window on close
+        'window_state': '',
+        'preload_views': 'true',
+    },
+    'Metrics': {
+        'enabled': 'false',
+    },
+    'Ollama': {
+        'host': 'http://localhost:11434',
+        'model': 'llama3',
+        'timeout': '120',
+        'keep_alive': '30m', # Keeps the model and its prompt cache loaded between turns
+        'session_context_tokens': '3072', # Per-character sessions restart beyond this context size
+    },
+    'Routing': {
+        'enabled': 'false', # Pick a model per request instead of always using [Ollama] model
+        'models': '', # Comma-separated candidates; empty means every installed model
+        'min_quality': '0.8', # Required QA pass rate
+        'window': '50', # Recent runs kept per model
+        'parallel': '1', # Requests Ollama serves at once per model (OLLAMA_NUM_PARALLEL)
+    },
+    'Server': {
+        'host': '127.0.0.1',
+        'port': '8765',
+        'max_client_concurrency': '4',
+    },
 }
 
 def load_config():
@@ -2,3 +2,5 @@
 APP_NAME = "StoryTeller"
 CONFIG_DIR_NAME = APP_NAME # Usually same as APP_NAME
 CONFIG_FILE_NAME = "config.ini"
+METRICS_FILE_NAME = "metrics.json"
+MODEL_STATS_FILE_NAME = "model_stats.json"
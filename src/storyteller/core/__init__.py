@@ -0,0 +1,3 @@
+"""
+Core dialogue logic: the Dialogue Manager and its supporting engines.
+"""
@@ -0,0 +1,94 @@
+"""
+Context Tracker.
+
+Holds the narrative world state used for dialogue generation. Snapshots of the
+state are copy-on-write: forking one is O(1) and only the keys a branch changes
+are stored in that branch.
+"""
+from collections import ChainMap, Counter
+
+# Forks deeper than this are flattened so lookups stay cheap
+MAX_SNAPSHOT_DEPTH = 32
+
+
+class ContextSnapshot:
+    """
+    An immutable-by-convention view of world state plus the dialogue history
+    leading up to it. `fork()` shares all existing data with the parent.
+    """
+    __slots__ = ('world_state', 'history')
+
+    def __init__(self, world_state=None, history=()):
+        if isinstance(world_state, ChainMap):
+            self.world_state = world_state
+        else:
+            self.world_state = ChainMap(dict(world_state or {}))
+        self.history = tuple(history)
+
+    def fork(self):
+        """Returns a child snapshot; writes to it never reach the parent."""
+        world_state = self.world_state
+        if len(world_state.maps) > MAX_SNAPSHOT_DEPTH:
+            world_state = ChainMap(dict(world_state))
+        return ContextSnapshot(world_state.new_child(), self.history)
+
+    def set(self, key, value):
+        """Sets a world state value in this snapshot's own layer."""
+        self.world_state[key] = value
+
+    def with_line(self, entry):
+        """Returns a fork whose history ends with `entry`."""
+        child = self.fork()
+        child.history = self.history + (entry,)
+        return child
+
+    @classmethod
+    def merge(cls, snapshots):
+        """
+        Joins several branches. Later snapshots win on conflicting keys, and
+        history entries shared by several branches appear once.
+        """
+        if len(snapshots) == 1:
+            return snapshots[0].fork()
+        # Layers private to one branch go first (later branches first), then the
+        # layers the branches share with their common ancestors
+        owners = Counter(id(layer) for snapshot in snapshots for layer in snapshot.world_state.maps)
+        maps, shared = [], {}
+        after = {} # shared layer id -> ids of the shared layers it shadows
+        for snapshot in reversed(snapshots):
+            previous = None
+            for layer in snapshot.world_state.maps:
+                if owners[id(layer)] == 1:
+                    maps.append(layer)
+                    continue
+                shared.setdefault(id(layer), layer)
+                after.setdefault(id(layer), set())
+                if previous is not None:
+                    after[previous].add(id(layer))
+                previous = id(layer)
+        maps.extend(cls._child_first(shared, after))
+        history, seen_entries = [], set()
+        for snapshot in snapshots:
+            for entry in snapshot.history:
+                if id(entry) not in seen_entries:
+                    seen_entries.add(id(entry))
+                    history.append(entry)
+        return cls(ChainMap({}, *maps), history)
+
+    @staticmethod
+    def _child_first(layers, after):
+        """Orders shared layers so a fork always comes before its ancestors."""
+        pending = Counter(ancestor for ancestors in after.values() for ancestor in ancestors)
+        ready = [layer_id for layer_id in layers if not pending[layer_id]]
+        ordered = []
+        while ready:
+            layer_id = ready.pop(0)
+            ordered.append(layers[layer_id])
+            for ancestor in after[layer_id]:
+                pending[ancestor] -= 1
+                if not pending[ancestor]:
+                    ready.append(ancestor)
+        return ordered
+
+    def to_dict(self):
+        return dict(self.world_state)
@@ -0,0 +1,117 @@
+"""
+Data Store.
+
+Holds all project tables in memory in columnar form: one column per field,
+with numeric columns in typed `array.array` storage and enum-like strings
+interned. Models in `storyteller.data.models` read rows straight out of these
+columns through zero-copy row views.
+"""
+from storyteller.data import models
+
+
+class Table:
+    """A column-oriented table with a fixed schema of column kinds."""
+
+    def __init__(self, schema, columns=None):
+        self.schema = dict(schema)
+        if columns is None:
+            columns = {name: models.new_column(kind) for name, kind in self.schema.items()}
+        elif set(columns) != set(self.schema):
+            raise ValueError(f"Columns {sorted(columns)} do not match schema {sorted(self.schema)}")
+        self.columns = columns
+
+    @classmethod
+    def for_model(cls, model, records=()):
+        """Creates a table for a model class, optionally filled from records."""
+        return cls(model.SCHEMA, models.records_to_columns(records, model))
+
+    def __len__(self):
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    def column(self, name):
+        """Returns the column storage itself (not a copy)."""
+        return self.columns[name]
+
+    def append(self, row):
+        """Appends one row given as a dict or model instance."""
+        get = row.get if isinstance(row, dict) else (lambda name: getattr(row, name, None))
+        # Coerce every value before touching storage so a bad one leaves no partial row
+        values = {name: models.coerce(kind, get(name)) for name, kind in self.schema.items()}
+        for name, value in values.items():
+            self.columns[name].append(value)
+
+    def extend(self, columns, coerced=False):
+        """
+        Appends many rows given column-wise ({name: values}). Pass
+        `coerced=True` when the values already have their stored types.
+        """
+        count = len(next(iter(columns.values()), ()))
+        prepared = {}
+        for name, kind in self.schema.items():
+            values = columns.get(name)
+            if values is None: # Missing columns get their kind's empty value
+                prepared[name] = [models.coerce(kind, None)] * count
+            elif coerced:
+                prepared[name] = values
+            else:
+                prepared[name] = [models.coerce(kind, v) for v in values]
+        start = len(self)
+        try:
+            for name, values in prepared.items():
+                self.columns[name].extend(values)
+        except (TypeError, ValueError, OverflowError):
+            # Typed storage rejected a value; keep the columns the same length
+            for column in self.columns.values():
+                del column[start:]
+            raise
+
+    def row(self, index):
+        return {name: column[index] for name, column in self.columns.items()}
+
+    def take(self, indices):
+        """Returns a new table holding the given rows, in order."""
+        indices = list(indices)
+        return Table(self.schema, {
+            name: models.new_column(self.schema[name], [column[i] for i in indices])
+            for name, column in self.columns.items()})
+
+    def views(self, model, rows=None):
+        """Yields zero-copy row views for `model`."""
+        return models.iter_views(self.columns, model, rows)
+
+    def schema_fingerprint(self):
+        return tuple(self.schema.items())
+
+
+class DataStore:
+    """Central access to all project tables."""
+
+    def __init__(self):
+        self.tables = {name: Table.for_model(model) for name, model in models.MODELS.items()}
+        self.schema_version = 0 # Bumped whenever a table is replaced or its schema changes
+        self.data_version = 0 # Bumped on every change, including appends
+
+    def get_table(self, name):
+        try:
+            return self.tables[name]
+        except KeyError:
+            raise KeyError(f"Unknown table '{name}'. Known tables: {', '.join(sorted(self.tables))}") from None
+
+    def update_table(self, name, table):
+        """Replaces a table (bumps the schema version if its columns changed)."""
+        previous = self.tables.get(name)
+        if previous is None or previous.schema_fingerprint() != table.schema_fingerprint():
+            self.schema_version += 1
+        self.tables[name] = table
+        self.data_version += 1
+
+    def append_rows(self, name, columns, coerced=False):
+        """Appends column-wise rows to a table."""
+        self.get_table(name).extend(columns, coerced=coerced)
+        self.data_version += 1
+
+    def schema_fingerprint(self):
+        """Describes every table's columns; changes whenever any schema does."""
+        return tuple((name, table.schema_fingerprint()) for name, table in sorted(self.tables.items()))
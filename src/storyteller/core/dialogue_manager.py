@@ -0,0 +1,277 @@
+"""
+Dialogue Manager.
+
+Runs the eight stages of the Dialogue Generation Pipeline for a
+`DialogueRequest` and returns a `DialogueResponse`. Every stage is wrapped in a
+metrics span so `storyteller stats` can show where the time goes.
+"""
+import contextlib
+import json
+import time
+from dataclasses import dataclass, field
+
+from storyteller import config
+from storyteller.ai.model_router import ModelRouter
+from storyteller.ai.ollama_integration import Completion, OllamaError, OllamaIntegration
+from storyteller.ai.prompts import PreparedPrompt, PromptBuilder, SessionStore
+from storyteller.metrics import registry as metrics
+
+
+class DialogueRequestError(ValueError):
+    """Raised when a dialogue request fails input validation."""
+
+
+class DialogueGenerationError(Exception):
+    """Raised when no acceptable dialogue could be generated."""
+
+
+@dataclass
+class DialogueRequest:
+    """What the caller wants said, by whom and to whom."""
+    speaker_id: str
+    listener_ids: tuple = ()
+    situation: str = '' # Free-form description of what the line should address
+    dialogue_type: str = 'line'
+    model: str = None # None means the configured default (or the router's choice)
+    params: dict = field(default_factory=dict)
+    max_chars: int = 600
+    deadline_ms: float = None # Latency budget the model router has to meet
+    min_quality: float = None # Required QA pass rate; None uses [Routing] min_quality
+
+    def cache_key(self):
+        """Returns a hashable key identifying requests that can share one generated line."""
+        # JSON keeps params with list values (e.g. "stop") hashable. The routing
+        # constraints are part of the key: they can select a different model
+        return (self.speaker_id, tuple(self.listener_ids), self.situation, self.dialogue_type,
+                self.model, json.dumps(self.params, sort_keys=True, default=str), self.max_chars,
+                self.deadline_ms, self.min_quality)
+
+
+@dataclass
+class DialogueContext:
+    """Everything gathered in the Data Retrieval stage for one request."""
+    speaker: dict
+    listeners: list
+    world_state: dict
+    history: list
+
+
+@dataclass
+class DialogueResponse:
+    """The approved dialogue line and how it was produced."""
+    text: str
+    speaker_id: str
+    model: str
+    attempts: int = 1
+    tokens: int = 0
+    metadata: dict = field(default_factory=dict)
+
+
+class DialogueManager:
+    """Coordinates the Dialogue Generation Pipeline."""
+
+    def __init__(self, ollama=None, characters=None, world_state=None,
+                 max_retries=2, max_regenerations=2, history_limit=5, use_sessions=True, router=None):
+        self.ollama = ollama or OllamaIntegration()
+        # Picks a model per request (see ai.model_router); enabled through [Routing] enabled = true
+        if router is None and config.get_bool_setting('Routing', 'enabled', False):
+            router = ModelRouter.from_config(self.ollama)
+        self.router = router
+        self.prompt_builder = PromptBuilder()
+        # Warm per-character Ollama sessions (see ai.prompts)
+        self.sessions = SessionStore() if use_sessions else None
+        # Character profiles keyed by id, until the Character Engine exists
+        self.characters = characters if characters is not None else {}
+        self.world_state = world_state if world_state is not None else {}
+        self.max_retries = max_retries
+        self.max_regenerations = max_regenerations
+        self.history_limit = history_limit
+        self.history = []
+        # Bumped whenever world state or history changes what a prompt would contain
+        self.context_version = 0
+        self.prefetcher = None # Optional SpeculativePrefetcher (see core.prefetcher)
+
+    async def generate_dialogue(self, request, on_token=None, snapshot=None, commit=True, on_reset=None):
+        """
+        Generates a line for `request`. If `on_token` is given the completion is
+        streamed and `on_token(chunk)` is called for every text chunk. Before a
+        retry or QA regeneration replaces chunks already streamed, `on_reset()`
+        is called so the caller can discard them. A `ContextSnapshot` replaces
+        the manager's own world state and history. With `commit=False` the line
+        is not added to the history (speculation).
+        """
+        with metrics.span('input_processing'):
+            self._validate_request(request)
+
+        with metrics.span('data_retrieval'):
+            context = self._gather_context(request, snapshot)
+
+        params = dict(request.params)
+        rejected = [] # Routed models whose lines failed QA for this request
+        backend_seconds = 0.0 # Includes drafts rejected by QA
+        for regeneration in range(self.max_regenerations + 1):
+            if regeneration:
+                metrics.increment('regenerations')
+                if on_token is not None and on_reset is not None:
+                    on_reset() # The rejected draft was already streamed
+                # Cool the sampling down a little each time QA rejects a line
+                params['temperature'] = max(0.1, params.get('temperature', 0.8) - 0.2)
+
+            with metrics.span('prompt_building'):
+                parts = self.prompt_builder.build(request, context)
+
+            with metrics.span('model_config'):
+                model, route = await self._choose_model(request, rejected)
+                prepared = self._prepare_prompt(request, model, parts, snapshot)
+
+            with metrics.span('generation'), self._track(model):
+                completion, attempts = await self._generate(
+                    prepared.prompt, prepared.system, params, model, on_token, prepared.context, on_reset)
+            self._record_prompt_tokens(prepared, completion)
+            backend_seconds += completion.backend_seconds
+
+            with metrics.span('post_processing'):
+                text = self.process_completion(completion.text, context)
+
+            with metrics.span('quality_assurance'):
+                passed = self.check_quality(text, request)
+            if route is not None:
+                self.router.record_quality(model, passed)
+            if passed:
+                break
+            rejected.append(model)
+        else:
+            metrics.increment('qa_failures')
+            raise DialogueGenerationError(
+                f"No line for '{request.speaker_id}' passed quality checks after "
+                f"{self.max_regenerations + 1} attempts")
+
+        with metrics.span('finalization'):
+            response = DialogueResponse(
+                text=text, speaker_id=request.speaker_id, model=completion.model or model,
+                attempts=attempts + regeneration, tokens=completion.eval_count,
+                metadata={'prompt_eval_count': completion.prompt_eval_count,
+                          'reused_context_tokens': prepared.reused_tokens,
+                          'backend_seconds': backend_seconds})
+            if route is not None:
+                response.metadata['route'] = route.reason
+            if commit:
+                self.update_dialogue_history(request, response)
+                if self.sessions is not None and snapshot is None:
+                    self.sessions.update(prepared, parts, completion, text)
+        return response
+
+    def update_world_state(self, changes):
+        """Applies world state changes; speculative lines generated before are discarded."""
+        self.world_state.update(changes)
+        self._context_changed()
+
+    def _context_changed(self):
+        self.context_version += 1
+        if self.prefetcher is not None:
+            self.prefetcher.invalidate()
+
+    # --- Pipeline stages ---
+
+    def _validate_request(self, request):
+        if not request.speaker_id:
+            raise DialogueRequestError("A dialogue request needs a speaker.")
+        if self.characters and request.speaker_id not in self.characters:
+            raise DialogueRequestError(f"Unknown speaker '{request.speaker_id}'.")
+        if request.max_chars <= 0:
+            raise DialogueRequestError("max_chars must be positive.")
+
+    def _gather_context(self, request, snapshot=None):
+        speaker = self.characters.get(request.speaker_id, {'name': request.speaker_id})
+        listeners = [self.characters.get(i, {'name': i}) for i in request.listener_ids]
+        world_state = snapshot.world_state if snapshot is not None else self.world_state
+        source = snapshot.history if snapshot is not None else self.history
+        history = [h for h in source if h['speaker_id'] in (request.speaker_id, *request.listener_ids)]
+        return DialogueContext(speaker=speaker, listeners=listeners,
+                               world_state=dict(world_state),
+                               history=history[-self.history_limit:])
+
+    def create_prompt(self, request, context):
+        """Builds the full (prompt, system) pair, as sent when no session can be reused."""
+        parts = self.prompt_builder.build(request, context)
+        return parts.full_prompt(), parts.system
+
+    async def _choose_model(self, request, rejected):
+        """Returns (model, RouteDecision or None). An explicit request.model is never rerouted."""
+        if request.model or self.router is None:
+            return request.model or self.ollama.model, None
+        route = await self.router.choose(request, exclude=rejected)
+        return route.model, route
+
+    def _track(self, model):
+        return self.router.track(model) if self.router is not None else contextlib.nullcontext()
+
+    def _prepare_prompt(self, request, model, parts, snapshot=None):
+        # A snapshot is a branch of its own; sessions follow the manager's history only
+        if self.sessions is None or snapshot is not None:
+            return PreparedPrompt(parts.full_prompt(), parts.system)
+        prepared = self.sessions.prepare(request.speaker_id, model, parts)
+        metrics.record_cache('ollama_session', prepared.context is not None)
+        return prepared
+
+    def _record_prompt_tokens(self, prepared, completion):
+        metrics.increment('prompt_eval_tokens', completion.prompt_eval_count)
+        if prepared.reused_tokens:
+            # Session context the server did not have to evaluate again
+            metrics.increment('prompt_eval_tokens_saved', prepared.reused_tokens)
+
+    async def _generate(self, prompt, system, params, model, on_token, context=None, on_reset=None):
+        """Calls the model, retrying failed calls. Returns (completion, attempts)."""
+        # Only continuing sessions pass a context
+        extra = {'context': context} if context is not None else {}
+        streamed = False # Whether the failed attempt already sent chunks
+        for attempt in range(1, self.max_retries + 2):
+            if streamed and on_reset is not None:
+                on_reset()
+            streamed = False
+            try:
+                start = time.perf_counter()
+                if on_token is None:
+                    completion = await self.ollama.generate_completion(
+                        prompt, params, model=model, system=system, **extra)
+                else:
+                    completion = None
+                    async for item in self.ollama.stream_completion(prompt, params, model=model, system=system,
+                                                                    **extra):
+                        if isinstance(item, Completion):
+                            completion = item
+                        else:
+                            streamed = True
+                            on_token(item)
+                    if completion is None:
+                        raise OllamaError("Stream ended without a final response.")
+                metrics.record_tokens(completion.eval_count,
+                                      completion.eval_seconds or time.perf_counter() - start)
+                return completion, attempt
+            except OllamaError:
+                if attempt > self.max_retries:
+                    raise
+                metrics.increment('retries')
+
+    def process_completion(self, raw, context):
+        """Cleans the raw completion into a single line of dialogue."""
+        text = raw.strip()
+        # Drop a leading "Name:" the model sometimes adds
+        name = context.speaker.get('name', '')
+        if name and text.lower().startswith(name.lower() + ':'):
+            text = text[len(name) + 1:].strip()
+        # Keep only the first paragraph and strip wrapping quotes
+        text = text.split('\n\n')[0].strip()
+        if len(text) >= 2 and text[0] == text[-1] and text[0] in '"\'':
+            text = text[1:-1].strip()
+        return text
+
+    def check_quality(self, text, request):
+        """Returns True if the processed line is acceptable."""
+        return bool(text) and len(text) <= request.max_chars
+
+    def update_dialogue_history(self, request, response):
+        """Appends an approved line to the session history."""
+        self.history.append({'speaker_id': request.speaker_id, 'text': response.text,
+                             'listener_ids': tuple(request.listener_ids), 'model': response.model})
+        self._context_changed()
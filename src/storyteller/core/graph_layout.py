@@ -0,0 +1,538 @@
+"""
+Relationship Graph Layout.
+
+Computes force-directed layouts of the relationship graph off the GUI thread.
+`ForceLayout` runs Fruchterman-Reingold iterations. They are vectorized with
+NumPy when it is installed, and a pure-Python fallback handles small casts.
+Repulsion is approximated with a uniform grid: each node is pushed away by the
+centroids of the occupied cells instead of by every other node. An iteration
+therefore costs O(nodes x cells + edges) instead of O(nodes^2).
+
+`LayoutWorker` runs a ForceLayout in a child process and streams positions
+back every few iterations. When relationships change, the layout is updated
+incrementally. Known nodes keep their positions, new nodes start next to
+their neighbours, and the layout continues from a low temperature instead of
+starting from scratch.
+
+The rest of the module holds Qt-free helpers for drawing large graphs.
+`SpatialGrid` culls nodes to the viewport. `bundle_edges` merges the edges
+between each pair of grid cells into one weighted stroke. `detail_level`
+decides how much to draw at a given zoom.
+"""
+import math
+import multiprocessing
+import queue
+import random
+from array import array
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+# Make numpy optional
+try:
+    import numpy as np # type: ignore
+    numpy_available = True
+except ImportError:
+    np = None
+    numpy_available = False
+
+IDEAL_EDGE_LENGTH = 10.0 # Layout units
+COOLING = 0.95 # Temperature factor per iteration
+MIN_TEMPERATURE = 0.01 * IDEAL_EDGE_LENGTH # The layout counts as converged below this
+WARM_TEMPERATURE = IDEAL_EDGE_LENGTH / 2 # Restart temperature for incremental updates
+GRAVITY = 0.01 # Pull towards the origin, keeps disconnected groups on screen
+MAX_GRID = 32 # Repulsion grid is at most MAX_GRID x MAX_GRID cells
+CHUNK_ROWS = 1024 # Nodes per vectorized repulsion block (bounds temporary memory)
+EPSILON = 1e-9
+
+
+@dataclass
+class RelationshipGraph:
+    """Columnar relationship graph. Edges refer to nodes by index."""
+    node_ids: list = field(default_factory=list)
+    labels: list = field(default_factory=list)
+    sources: array = field(default_factory=lambda: array('i'))
+    targets: array = field(default_factory=lambda: array('i'))
+    types: list = field(default_factory=list)
+    strengths: array = field(default_factory=lambda: array('d')) # relationship_quality, -1 to 1
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    @property
+    def edge_count(self):
+        return len(self.sources)
+
+    def weights(self):
+        """Spring strength per edge: strong relationships (either sign) pull harder."""
+        return array('d', (1.0 + abs(strength) for strength in self.strengths))
+
+    @classmethod
+    def from_store(cls, store):
+        """Builds the graph from the 'characters' and 'relationships' tables."""
+        graph = cls()
+        index = {}
+
+        def node(character_id, label=None):
+            if character_id not in index:
+                index[character_id] = len(graph.node_ids)
+                graph.node_ids.append(character_id)
+                graph.labels.append(label or character_id)
+            return index[character_id]
+
+        characters = store.get_table('characters')
+        for character_id, name in zip(characters.column('character_id'), characters.column('name')):
+            node(character_id, name)
+        relationships = store.get_table('relationships')
+        for char1, char2, kind, quality in zip(relationships.column('char1_id'), relationships.column('char2_id'),
+                                               relationships.column('relationship_type'),
+                                               relationships.column('relationship_quality')):
+            if not char1 or not char2 or char1 == char2:
+                continue
+            graph.sources.append(node(char1))
+            graph.targets.append(node(char2))
+            graph.types.append(kind)
+            graph.strengths.append(quality or 0.0)
+        return graph
+
+
+def _grid_size(count):
+    return max(1, min(MAX_GRID, int(math.sqrt(count / 4))))
+
+
+class ForceLayout:
+    """Incremental force-directed layout of a graph given as index arrays."""
+
+    def __init__(self, use_numpy=None, seed=0):
+        self.use_numpy = numpy_available if use_numpy is None else (use_numpy and numpy_available)
+        self.random = random.Random(seed)
+        self.node_ids = []
+        self.x = self.y = ()
+        self.sources = self.targets = self.weights = ()
+        self._edge_keys = set()
+        self.active = self._active_edges = None # Nodes and edges an incremental update moves
+        self.temperature = 0.0
+        self.iterations = 0
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    @property
+    def converged(self):
+        return self.temperature < MIN_TEMPERATURE
+
+    def set_graph(self, node_ids, sources, targets, weights=None):
+        """
+        Replaces the graph, keeping the positions of nodes that were already
+        laid out. Returns the number of nodes whose position is recomputed.
+        """
+        previous = dict(zip(self.node_ids, zip(self.x, self.y)))
+        previous_edges = self._edge_keys
+        count = len(node_ids)
+        side = IDEAL_EDGE_LENGTH * math.sqrt(max(count, 1))
+        xs, ys = [0.0] * count, [0.0] * count
+        placed = [False] * count
+        for i, node_id in enumerate(node_ids):
+            if node_id in previous:
+                xs[i], ys[i] = previous[node_id]
+                placed[i] = True
+        new_nodes = [i for i in range(count) if not placed[i]]
+
+        # New nodes start next to their placed neighbours (or anywhere, if they have none)
+        neighbours = defaultdict(list)
+        for source, target in zip(sources, targets):
+            neighbours[source].append(target)
+            neighbours[target].append(source)
+        jitter = IDEAL_EDGE_LENGTH / 2
+        for i in new_nodes:
+            anchors = [j for j in neighbours[i] if placed[j]]
+            if anchors:
+                xs[i] = sum(xs[j] for j in anchors) / len(anchors) + self.random.uniform(-jitter, jitter)
+                ys[i] = sum(ys[j] for j in anchors) / len(anchors) + self.random.uniform(-jitter, jitter)
+            else:
+                xs[i] = self.random.uniform(-side / 2, side / 2)
+                ys[i] = self.random.uniform(-side / 2, side / 2)
+            placed[i] = True
+
+        self.node_ids = list(node_ids)
+        self._edge_keys = {(a, b) if a < b else (b, a)
+                           for a, b in ((node_ids[s], node_ids[t]) for s, t in zip(sources, targets))}
+        weights = weights if weights is not None else [1.0] * len(sources)
+        if self.use_numpy:
+            self.x, self.y = np.array(xs), np.array(ys)
+            self.sources = np.asarray(sources, dtype=np.intp)
+            self.targets = np.asarray(targets, dtype=np.intp)
+            self.weights = np.asarray(weights, dtype=float)
+        else:
+            self.x, self.y = array('d', xs), array('d', ys)
+            self.sources, self.targets, self.weights = array('i', sources), array('i', targets), array('d', weights)
+
+        self._set_active(None)
+        if not count:
+            self.temperature = 0.0
+            return 0
+        if len(new_nodes) * 2 >= count:
+            # Mostly new: a full (cold) layout
+            self.temperature = max(side / 10, 2 * WARM_TEMPERATURE)
+            return count
+
+        # Incremental update: only new nodes, the ends of added or removed
+        # edges and their direct neighbours move
+        index = {node_id: i for i, node_id in enumerate(node_ids)}
+        touched = set(new_nodes)
+        for edge in previous_edges ^ self._edge_keys:
+            touched.update(index[node_id] for node_id in edge if node_id in index)
+        if not touched:
+            return 0
+        active = set(touched)
+        for i in touched:
+            active.update(neighbours[i])
+        if len(active) * 2 < count:
+            self._set_active(sorted(active))
+        self.temperature = max(self.temperature, WARM_TEMPERATURE)
+        return len(active) if self.active is not None else count
+
+    def _set_active(self, nodes):
+        """Restricts iterations to `nodes` (and the edges touching them); None moves every node."""
+        if nodes is None:
+            self.active = self._active_edges = None
+            return
+        members = set(nodes)
+        edges = [e for e, (s, t) in enumerate(zip(self.sources, self.targets)) if s in members or t in members]
+        if self.use_numpy:
+            self.active = np.asarray(nodes, dtype=np.intp)
+            self._active_edges = np.asarray(edges, dtype=np.intp)
+        else:
+            self.active, self._active_edges = list(nodes), edges
+
+    def step(self, iterations=1):
+        """Runs up to `iterations` iterations (fewer once converged) and returns how many ran."""
+        ran = 0
+        while ran < iterations and not self.converged:
+            if self.use_numpy:
+                self._step_numpy()
+            else:
+                self._step_python()
+            self.temperature *= COOLING
+            self.iterations += 1
+            ran += 1
+        return ran
+
+    def run(self, max_iterations=1000):
+        """Iterates until converged; returns the number of iterations."""
+        return self.step(max_iterations)
+
+    def positions(self):
+        """Interleaved x, y positions in node order."""
+        if self.use_numpy:
+            flat = array('d')
+            flat.frombytes(np.column_stack((self.x, self.y)).tobytes())
+            return flat
+        flat = array('d', bytes(16 * len(self.x)))
+        flat[0::2] = self.x
+        flat[1::2] = self.y
+        return flat
+
+    def _step_numpy(self):
+        x, y = self.x, self.y
+        count = len(x)
+        rows = self.active if self.active is not None else slice(None)
+        px, py = x[rows], y[rows]
+        k2 = IDEAL_EDGE_LENGTH * IDEAL_EDGE_LENGTH
+        dx = -GRAVITY * px
+        dy = -GRAVITY * py
+
+        # Repulsion from the centroids of occupied grid cells
+        size = _grid_size(count)
+        x0, y0 = x.min(), y.min()
+        cell_w = max(x.max() - x0, EPSILON) / size
+        cell_h = max(y.max() - y0, EPSILON) / size
+        ix = np.minimum(((x - x0) / cell_w).astype(np.intp), size - 1)
+        iy = np.minimum(((y - y0) / cell_h).astype(np.intp), size - 1)
+        cell = iy * size + ix
+        mass = np.bincount(cell, minlength=size * size).astype(float)
+        occupied = np.flatnonzero(mass)
+        m = mass[occupied]
+        cx = np.bincount(cell, weights=x, minlength=size * size)[occupied] / m
+        cy = np.bincount(cell, weights=y, minlength=size * size)[occupied] / m
+        slot = np.zeros(size * size, dtype=np.intp)
+        slot[occupied] = np.arange(len(occupied))
+        own = slot[cell[rows]]
+        for start in range(0, len(px), CHUNK_ROWS):
+            chunk = slice(start, start + CHUNK_ROWS)
+            ddx = px[chunk, None] - cx[None, :]
+            ddy = py[chunk, None] - cy[None, :]
+            force = k2 * m / (ddx * ddx + ddy * ddy + EPSILON)
+            force[np.arange(force.shape[0]), own[chunk]] = 0.0 # Own cell is handled below
+            dx[chunk] += (force * ddx).sum(axis=1)
+            dy[chunk] += (force * ddy).sum(axis=1)
+        # The rest of a node's own cell, as one mass at its centroid
+        others = m[own] - 1
+        ocx = np.where(others > 0, (cx[own] * m[own] - px) / np.maximum(others, 1), px)
+        ocy = np.where(others > 0, (cy[own] * m[own] - py) / np.maximum(others, 1), py)
+        odx, ody = px - ocx, py - ocy
+        force = k2 * others / (odx * odx + ody * ody + EPSILON)
+        dx += force * odx
+        dy += force * ody
+
+        # Attraction along edges (force d^2 / k, scaled by the relationship weight)
+        edges = self._active_edges if self._active_edges is not None else slice(None)
+        sources, targets = self.sources[edges], self.targets[edges]
+        if len(sources):
+            ex = x[sources] - x[targets]
+            ey = y[sources] - y[targets]
+            pull = np.sqrt(ex * ex + ey * ey) * self.weights[edges] / IDEAL_EDGE_LENGTH
+            fx = np.bincount(targets, weights=ex * pull, minlength=count)
+            fx -= np.bincount(sources, weights=ex * pull, minlength=count)
+            fy = np.bincount(targets, weights=ey * pull, minlength=count)
+            fy -= np.bincount(sources, weights=ey * pull, minlength=count)
+            dx += fx[rows]
+            dy += fy[rows]
+
+        # Move each node at most `temperature`
+        length = np.sqrt(dx * dx + dy * dy) + EPSILON
+        scale = np.minimum(length, self.temperature) / length
+        x[rows] = px + dx * scale
+        y[rows] = py + dy * scale
+
+    def _step_python(self):
+        x, y = self.x, self.y
+        count = len(x)
+        rows = self.active if self.active is not None else range(count)
+        k2 = IDEAL_EDGE_LENGTH * IDEAL_EDGE_LENGTH
+        dx = [0.0] * count
+        dy = [0.0] * count
+
+        size = _grid_size(count)
+        x0, y0 = min(x), min(y)
+        cell_w = max(max(x) - x0, EPSILON) / size
+        cell_h = max(max(y) - y0, EPSILON) / size
+        cells = {}
+        cell_of = []
+        for xi, yi in zip(x, y):
+            key = (min(int((yi - y0) / cell_h), size - 1), min(int((xi - x0) / cell_w), size - 1))
+            cell_of.append(key)
+            totals = cells.setdefault(key, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += xi
+            totals[2] += yi
+        centroids = [(key, n, sx / n, sy / n) for key, (n, sx, sy) in cells.items()]
+        for i in rows:
+            xi, yi, own = x[i], y[i], cell_of[i]
+            fx, fy = -GRAVITY * xi, -GRAVITY * yi
+            for key, n, cx, cy in centroids:
+                if key == own:
+                    n -= 1
+                    if not n:
+                        continue
+                    totals = cells[key]
+                    cx, cy = (totals[1] - xi) / n, (totals[2] - yi) / n
+                ddx, ddy = xi - cx, yi - cy
+                force = k2 * n / (ddx * ddx + ddy * ddy + EPSILON)
+                fx += force * ddx
+                fy += force * ddy
+            dx[i] = fx
+            dy[i] = fy
+
+        for e in (self._active_edges if self._active_edges is not None else range(len(self.sources))):
+            source, target = self.sources[e], self.targets[e]
+            ex, ey = x[source] - x[target], y[source] - y[target]
+            pull = math.sqrt(ex * ex + ey * ey) * self.weights[e] / IDEAL_EDGE_LENGTH
+            dx[source] -= ex * pull
+            dy[source] -= ey * pull
+            dx[target] += ex * pull
+            dy[target] += ey * pull
+
+        temperature = self.temperature
+        for i in rows:
+            length = math.sqrt(dx[i] * dx[i] + dy[i] * dy[i]) + EPSILON
+            scale = min(length, temperature) / length
+            x[i] += dx[i] * scale
+            y[i] += dy[i] * scale
+
+
+# --- Layout in a child process ---
+
+@dataclass
+class LayoutFrame:
+    """Positions streamed back by the worker."""
+    version: int # Graph version the positions belong to
+    positions: array # Interleaved x, y in that version's node order
+    iterations: int
+    converged: bool
+
+
+def run_layout_worker(commands, frames, emit_every=5, use_numpy=None):
+    """Worker process entry point: lays out graphs from `commands` and puts LayoutFrames on `frames`."""
+    layout = ForceLayout(use_numpy)
+    version = None
+    while True:
+        idle = version is None or layout.converged
+        try:
+            command = commands.get(block=idle)
+        except queue.Empty:
+            command = None
+        # Apply everything that queued up before iterating again
+        new_version = False
+        while command is not None:
+            if command[0] == 'stop':
+                return
+            _, version, node_ids, sources, targets, weights = command
+            layout.set_graph(node_ids, sources, targets, weights)
+            new_version = True
+            try:
+                command = commands.get_nowait()
+            except queue.Empty:
+                command = None
+        # Every version gets at least one frame, even if nothing had to move,
+        # so the view knows its graph is laid out
+        if version is not None and (new_version or not layout.converged):
+            if not layout.converged:
+                layout.step(emit_every)
+            frames.put(LayoutFrame(version, layout.positions(), layout.iterations, layout.converged))
+
+
+class LayoutWorker:
+    """Runs a ForceLayout in a child process and hands back its newest frame."""
+
+    def __init__(self, emit_every=5, use_numpy=None):
+        self.emit_every = emit_every
+        self.use_numpy = use_numpy
+        # Never fork a process that has Qt loaded
+        self._context = multiprocessing.get_context('spawn')
+        self._process = None
+        self._commands = self._frames = None
+        self.version = 0
+
+    @property
+    def running(self):
+        return self._process is not None and self._process.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._commands = self._context.Queue()
+        self._frames = self._context.Queue()
+        self._process = self._context.Process(
+            target=run_layout_worker, args=(self._commands, self._frames, self.emit_every, self.use_numpy),
+            name='storyteller-layout', daemon=True)
+        self._process.start()
+
+    def set_graph(self, node_ids, sources, targets, weights=None):
+        """Sends a new or changed graph (laid out incrementally) and returns its version."""
+        self.start()
+        self.version += 1
+        self._commands.put(('graph', self.version, list(node_ids), array('i', sources), array('i', targets),
+                            array('d', weights) if weights is not None else None))
+        return self.version
+
+    def poll(self):
+        """Returns the newest frame for the current graph version, or None."""
+        latest = None
+        while self._frames is not None:
+            try:
+                frame = self._frames.get_nowait()
+            except queue.Empty:
+                break
+            if frame.version == self.version:
+                latest = frame
+        return latest
+
+    def stop(self, timeout=1.0):
+        if self._process is None:
+            return
+        if self._process.is_alive():
+            self._commands.put(('stop',))
+            self._process.join(timeout)
+            if self._process.is_alive():
+                self._process.terminate()
+        for channel in (self._commands, self._frames):
+            channel.cancel_join_thread()
+            channel.close()
+        self._process = self._commands = self._frames = None
+
+
+# --- Drawing helpers ---
+
+LABEL_MIN_SCALE = 2.0 # Pixels per layout unit from which labels are drawn
+MAX_LABELS = 300
+MAX_CIRCLES = 2000 # More visible nodes than this are drawn as points
+POINT_SCALE = 0.5 # Below this zoom nodes are drawn as points
+MAX_UNBUNDLED_EDGES = 3000
+BUNDLE_PIXELS = 24 # On-screen size of an edge bundling cell
+
+
+class SpatialGrid:
+    """Buckets node positions by grid cell for viewport queries."""
+
+    def __init__(self, positions, cell_size=IDEAL_EDGE_LENGTH * 4):
+        self.positions = positions
+        self.cell_size = cell_size
+        self.cells = defaultdict(list)
+        xs, ys = positions[0::2], positions[1::2]
+        self.bounds = (min(xs), min(ys), max(xs), max(ys)) if len(xs) else (0.0, 0.0, 0.0, 0.0)
+        for i, (x, y) in enumerate(zip(xs, ys)):
+            self.cells[(math.floor(x / cell_size), math.floor(y / cell_size))].append(i)
+
+    def query(self, left, top, right, bottom):
+        """Indices of the nodes inside the rectangle."""
+        b_left, b_top, b_right, b_bottom = self.bounds
+        left, top, right, bottom = max(left, b_left), max(top, b_top), min(right, b_right), min(bottom, b_bottom)
+        if left > right or top > bottom:
+            return []
+        positions = self.positions
+        size = self.cell_size
+        found = []
+        for cx in range(math.floor(left / size), math.floor(right / size) + 1):
+            for cy in range(math.floor(top / size), math.floor(bottom / size) + 1):
+                for i in self.cells.get((cx, cy), ()):
+                    x, y = positions[2 * i], positions[2 * i + 1]
+                    if left <= x <= right and top <= y <= bottom:
+                        found.append(i)
+        return found
+
+
+def bundle_edges(positions, sources, targets, cell_size, edges=None):
+    """
+    Merges edges whose endpoints fall into the same pair of grid cells into
+    one stroke between the centroids of the two cells. Only the edge indices
+    in `edges` are used (all when None), and edges inside a single cell are
+    dropped. Returns a list of (x1, y1, x2, y2, count) tuples.
+    """
+    cell_of = []
+    totals = {}
+    for x, y in zip(positions[0::2], positions[1::2]):
+        key = (math.floor(x / cell_size), math.floor(y / cell_size))
+        cell_of.append(key)
+        entry = totals.setdefault(key, [0.0, 0.0, 0])
+        entry[0] += x
+        entry[1] += y
+        entry[2] += 1
+    counts = defaultdict(int)
+    for e in (range(len(sources)) if edges is None else edges):
+        a, b = cell_of[sources[e]], cell_of[targets[e]]
+        if a != b:
+            counts[(a, b) if a < b else (b, a)] += 1
+    centroid = {key: (sx / n, sy / n) for key, (sx, sy, n) in totals.items()}
+    return [(*centroid[a], *centroid[b], count) for (a, b), count in counts.items()]
+
+
+@dataclass
+class DetailLevel:
+    """What to draw at one zoom level."""
+    node_radius: float # Pixels; 0 draws single points
+    labels: bool
+    bundle_cell: float # Layout units per bundling cell; 0 draws every edge
+
+
+def detail_level(scale, visible_nodes, visible_edges):
+    """Chooses the level of detail for `scale` pixels per layout unit and the visible counts."""
+    if scale < POINT_SCALE or visible_nodes > MAX_CIRCLES:
+        radius = 0.0
+    else:
+        radius = min(6.0, max(2.0, 0.15 * IDEAL_EDGE_LENGTH * scale))
+    labels = scale >= LABEL_MIN_SCALE and visible_nodes <= MAX_LABELS
+    bundle_cell = 0.0
+    if visible_edges > MAX_UNBUNDLED_EDGES:
+        # Powers of two, so bundles can be reused while zooming within a step
+        bundle_cell = 2.0 ** math.ceil(math.log2(BUNDLE_PIXELS / scale))
+    return DetailLevel(radius, labels, bundle_cell)
@@ -0,0 +1,466 @@
+"""
+Version History.
+
+Keeps every version of the project's character rows, relationships and world
+state without copying them. Each version is a set of persistent maps (hash
+array mapped tries): changing one key creates O(log n) new trie nodes and
+shares everything else with the previous version. Because unchanged subtrees
+are the same objects, diffing two versions skips them by identity and only
+walks the parts that actually differ.
+
+Versions form a graph, so narrative states can branch and be merged back with a
+three-way merge. Undo/redo moves a branch pointer along its history.
+"""
+import time
+from itertools import count
+
+_BITS = 5
+_MASK = (1 << _BITS) - 1
+_MAX_SHIFT = 64 # Hashes are truncated to 64 bits; deeper keys go in collision nodes
+
+MISSING = type('Missing', (), {'__repr__': lambda self: 'MISSING', '__slots__': ()})()
+
+
+def _hash(key):
+    return hash(key) & 0xFFFFFFFFFFFFFFFF
+
+
+# --- Trie nodes (never modified once built) ---
+
+class _Node:
+    """Bitmap-indexed node. Entries are (key, value) tuples or child nodes."""
+    __slots__ = ('bitmap', 'entries')
+
+    def __init__(self, bitmap, entries):
+        self.bitmap = bitmap
+        self.entries = entries
+
+
+class _Collision:
+    """Keys whose full 64-bit hashes are equal."""
+    __slots__ = ('entries',)
+
+    def __init__(self, entries):
+        self.entries = entries
+
+
+_EMPTY = _Node(0, ())
+
+
+def _index(bitmap, bit):
+    return (bitmap & (bit - 1)).bit_count()
+
+
+def _items(entry):
+    if type(entry) is tuple:
+        yield entry
+    elif type(entry) is _Collision:
+        yield from entry.entries
+    else:
+        for child in entry.entries:
+            yield from _items(child)
+
+
+def _merge_leaves(shift, first, second):
+    if shift >= _MAX_SHIFT:
+        return _Collision((first, second))
+    h1, h2 = _hash(first[0]), _hash(second[0])
+    i1, i2 = (h1 >> shift) & _MASK, (h2 >> shift) & _MASK
+    if i1 == i2:
+        return _Node(1 << i1, (_merge_leaves(shift + _BITS, first, second),))
+    entries = (first, second) if i1 < i2 else (second, first)
+    return _Node((1 << i1) | (1 << i2), entries)
+
+
+def _get(node, h, key):
+    shift = 0
+    while True:
+        if type(node) is _Collision:
+            for k, v in node.entries:
+                if k == key:
+                    return v
+            return MISSING
+        bit = 1 << ((h >> shift) & _MASK)
+        if not node.bitmap & bit:
+            return MISSING
+        entry = node.entries[_index(node.bitmap, bit)]
+        if type(entry) is tuple:
+            return entry[1] if entry[0] == key else MISSING
+        node = entry
+        shift += _BITS
+
+
+def _assoc(node, shift, h, key, value):
+    """Returns (new node, whether a key was added). Returns `node` itself if nothing changed."""
+    if type(node) is _Collision:
+        for i, (k, v) in enumerate(node.entries):
+            if k == key:
+                if v is value:
+                    return node, False
+                return _Collision(node.entries[:i] + ((key, value),) + node.entries[i + 1:]), False
+        return _Collision(node.entries + ((key, value),)), True
+    bit = 1 << ((h >> shift) & _MASK)
+    pos = _index(node.bitmap, bit)
+    if not node.bitmap & bit:
+        return _Node(node.bitmap | bit, node.entries[:pos] + ((key, value),) + node.entries[pos:]), True
+    entry = node.entries[pos]
+    if type(entry) is tuple:
+        if entry[0] == key:
+            if entry[1] is value:
+                return node, False
+            new_entry, added = (key, value), False
+        else:
+            new_entry, added = _merge_leaves(shift + _BITS, entry, (key, value)), True
+    else:
+        new_entry, added = _assoc(entry, shift + _BITS, h, key, value)
+        if new_entry is entry:
+            return node, False
+    return _Node(node.bitmap, node.entries[:pos] + (new_entry,) + node.entries[pos + 1:]), added
+
+
+def _dissoc(node, shift, h, key):
+    """Returns the node without `key`: the same node if absent, None if it became empty."""
+    if type(node) is _Collision:
+        entries = tuple(e for e in node.entries if e[0] != key)
+        if len(entries) == len(node.entries):
+            return node
+        return entries[0] if len(entries) == 1 else _Collision(entries)
+    bit = 1 << ((h >> shift) & _MASK)
+    if not node.bitmap & bit:
+        return node
+    pos = _index(node.bitmap, bit)
+    entry = node.entries[pos]
+    if type(entry) is tuple:
+        if entry[0] != key:
+            return node
+        new_entry = None
+    else:
+        new_entry = _dissoc(entry, shift + _BITS, h, key)
+        if new_entry is entry:
+            return node
+    if new_entry is None:
+        if node.bitmap == bit:
+            return None
+        return _Node(node.bitmap & ~bit, node.entries[:pos] + node.entries[pos + 1:])
+    # A child left holding a single pair is pulled up, keeping the trie canonical
+    if type(new_entry) is _Node and len(new_entry.entries) == 1 and type(new_entry.entries[0]) is tuple:
+        new_entry = new_entry.entries[0]
+    return _Node(node.bitmap, node.entries[:pos] + (new_entry,) + node.entries[pos + 1:])
+
+
+def _diff(old, new, changes):
+    if old is new:
+        return
+    if type(old) is _Node and type(new) is _Node:
+        bitmap = old.bitmap | new.bitmap
+        while bitmap:
+            bit = bitmap & -bitmap
+            bitmap ^= bit
+            a = old.entries[_index(old.bitmap, bit)] if old.bitmap & bit else None
+            b = new.entries[_index(new.bitmap, bit)] if new.bitmap & bit else None
+            if a is b:
+                continue
+            if type(a) is _Node and type(b) is _Node:
+                _diff(a, b, changes)
+            else:
+                _diff_items(_items(a) if a is not None else (), _items(b) if b is not None else (), changes)
+        return
+    _diff_items(_items(old), _items(new), changes)
+
+
+def _diff_items(old_items, new_items, changes):
+    old_items = dict(old_items)
+    for key, value in new_items:
+        previous = old_items.pop(key, MISSING)
+        if previous is not value and previous != value:
+            changes.append((key, previous, value))
+    changes.extend((key, value, MISSING) for key, value in old_items.items())
+
+
+class PersistentMap:
+    """
+    An immutable mapping. `set`, `delete` and `update` return new maps that
+    share structure with this one. Stored values should be treated as
+    read-only, since versions share them.
+    """
+    __slots__ = ('_root', '_size')
+
+    def __init__(self, items=None):
+        self._root, self._size = _EMPTY, 0
+        if items:
+            filled = self.update(items)
+            self._root, self._size = filled._root, filled._size
+
+    @classmethod
+    def _make(cls, root, size):
+        new = object.__new__(cls)
+        new._root, new._size = root, size
+        return new
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return (key for key, _ in _items(self._root))
+
+    def __contains__(self, key):
+        return _get(self._root, _hash(key), key) is not MISSING
+
+    def __getitem__(self, key):
+        value = _get(self._root, _hash(key), key)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __eq__(self, other):
+        if not isinstance(other, PersistentMap):
+            return NotImplemented
+        return self._size == other._size and not self.diff(other)
+
+    def __repr__(self):
+        return f"PersistentMap({self.to_dict()!r})"
+
+    def get(self, key, default=None):
+        value = _get(self._root, _hash(key), key)
+        return default if value is MISSING else value
+
+    def items(self):
+        return _items(self._root)
+
+    def set(self, key, value):
+        root, added = _assoc(self._root, 0, _hash(key), key, value)
+        return self if root is self._root else PersistentMap._make(root, self._size + added)
+
+    def delete(self, key):
+        root = _dissoc(self._root, 0, _hash(key), key)
+        if root is self._root:
+            return self
+        return PersistentMap._make(root or _EMPTY, self._size - 1)
+
+    def update(self, items):
+        """Returns a map with all (key, value) pairs from a mapping or iterable applied."""
+        if hasattr(items, 'items'):
+            items = items.items()
+        root, size = self._root, self._size
+        for key, value in items:
+            root, added = _assoc(root, 0, _hash(key), key, value)
+            size += added
+        return self if root is self._root else PersistentMap._make(root, size)
+
+    def diff(self, other):
+        """Returns [(key, value here, value in other)], with MISSING for absent keys."""
+        changes = []
+        _diff(self._root, other._root, changes)
+        return changes
+
+    def to_dict(self):
+        return dict(_items(self._root))
+
+
+# --- Project versions ---
+
+SECTIONS = ('characters', 'relationships', 'world_state')
+
+
+class MergeConflict(Exception):
+    """Raised when both sides of a merge changed the same key differently."""
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts # [(section, key, base, ours, theirs)]
+        keys = ', '.join(f"{section}:{key}" for section, key, *_ in conflicts[:5])
+        more = f" (+{len(conflicts) - 5} more)" if len(conflicts) > 5 else ''
+        super().__init__(f"Merge conflict on {keys}{more}")
+
+
+def relationship_key(row):
+    return (row['char1_id'], row['char2_id'])
+
+
+class ProjectState:
+    """One immutable version of characters, relationships and world state."""
+    __slots__ = SECTIONS
+
+    def __init__(self, characters=None, relationships=None, world_state=None):
+        self.characters = characters if characters is not None else PersistentMap()
+        self.relationships = relationships if relationships is not None else PersistentMap()
+        self.world_state = world_state if world_state is not None else PersistentMap()
+
+    @classmethod
+    def from_store(cls, store, world_state=None):
+        """Builds a state from DataStore tables and a world state dict."""
+        characters = store.get_table('characters')
+        relationships = store.get_table('relationships')
+        return cls(
+            PersistentMap((row['character_id'], row) for row in map(characters.row, range(len(characters)))),
+            PersistentMap((relationship_key(row), row)
+                          for row in map(relationships.row, range(len(relationships)))),
+            PersistentMap(world_state or {}))
+
+    def _replace(self, **sections):
+        values = {name: getattr(self, name) for name in SECTIONS}
+        values.update(sections)
+        return ProjectState(**values)
+
+    def set_character(self, row):
+        return self._replace(characters=self.characters.set(row['character_id'], row))
+
+    def remove_character(self, character_id):
+        return self._replace(characters=self.characters.delete(character_id))
+
+    def set_relationship(self, row):
+        return self._replace(relationships=self.relationships.set(relationship_key(row), row))
+
+    def remove_relationship(self, char1_id, char2_id):
+        return self._replace(relationships=self.relationships.delete((char1_id, char2_id)))
+
+    def update_world_state(self, changes):
+        return self._replace(world_state=self.world_state.update(changes))
+
+    def diff(self, other):
+        """Returns {section: [(key, old, new)]} for sections that differ."""
+        changes = {}
+        for name in SECTIONS:
+            section = getattr(self, name).diff(getattr(other, name))
+            if section:
+                changes[name] = section
+        return changes
+
+
+class Version:
+    __slots__ = ('version_id', 'parents', 'state', 'message', 'timestamp')
+
+    def __init__(self, version_id, parents, state, message):
+        self.version_id = version_id
+        self.parents = parents
+        self.state = state
+        self.message = message
+        self.timestamp = time.time()
+
+    def __repr__(self):
+        return f"Version({self.version_id}, {self.message!r})"
+
+
+class VersionStore:
+    """Commits, branches, merges and undo/redo over ProjectStates."""
+
+    def __init__(self, state=None, branch='main'):
+        self._ids = count()
+        root = Version(next(self._ids), (), state or ProjectState(), 'initial')
+        self.versions = {root.version_id: root}
+        self.branches = {branch: root.version_id}
+        self.current_branch = branch
+        self._redo = {branch: []}
+
+    def _branch(self, branch):
+        branch = branch or self.current_branch
+        if branch not in self.branches:
+            raise KeyError(f"Unknown branch '{branch}'. Known branches: {', '.join(sorted(self.branches))}")
+        return branch
+
+    def head(self, branch=None):
+        return self.versions[self.branches[self._branch(branch)]]
+
+    def state(self, version_id=None):
+        """Returns the state at a version (the current head by default) in O(1)."""
+        return self.head().state if version_id is None else self.versions[version_id].state
+
+    def commit(self, state, message='', branch=None, parents=None):
+        """Records `state` as the new head of a branch. Returns the Version."""
+        branch = self._branch(branch)
+        version = Version(next(self._ids), parents or (self.branches[branch],), state, message)
+        self.versions[version.version_id] = version
+        self.branches[branch] = version.version_id
+        self._redo[branch] = []
+        return version
+
+    def create_branch(self, name, from_version=None):
+        if name in self.branches:
+            raise ValueError(f"Branch '{name}' already exists.")
+        self.branches[name] = self.head().version_id if from_version is None else from_version
+        self._redo[name] = []
+        return name
+
+    def switch(self, branch):
+        self.current_branch = self._branch(branch)
+        return self.head()
+
+    def log(self, branch=None):
+        """Yields versions from a branch head back to the initial one (first parents)."""
+        version = self.head(branch)
+        while True:
+            yield version
+            if not version.parents:
+                return
+            version = self.versions[version.parents[0]]
+
+    def diff(self, old_id, new_id):
+        return self.versions[old_id].state.diff(self.versions[new_id].state)
+
+    def undo(self, branch=None):
+        """Moves the branch head back to its parent. Returns the new head."""
+        branch = self._branch(branch)
+        version = self.head(branch)
+        if not version.parents:
+            raise IndexError("Nothing to undo.")
+        self._redo[branch].append(version.version_id)
+        self.branches[branch] = version.parents[0]
+        return self.head(branch)
+
+    def redo(self, branch=None):
+        branch = self._branch(branch)
+        if not self._redo[branch]:
+            raise IndexError("Nothing to redo.")
+        self.branches[branch] = self._redo[branch].pop()
+        return self.head(branch)
+
+    def merge_base(self, first_id, second_id):
+        """Nearest common ancestor of two versions."""
+        ancestors = set()
+        pending = [first_id]
+        while pending:
+            version_id = pending.pop()
+            if version_id not in ancestors:
+                ancestors.add(version_id)
+                pending.extend(self.versions[version_id].parents)
+        queue = [second_id]
+        seen = set()
+        for version_id in queue: # Breadth-first, so the nearest match wins
+            if version_id in ancestors:
+                return version_id
+            if version_id not in seen:
+                seen.add(version_id)
+                queue.extend(self.versions[version_id].parents)
+        return None
+
+    def merge(self, source, target=None, message=None, prefer=None):
+        """
+        Three-way merges branch `source` into `target`. Keys changed on only
+        one side are taken from that side. Keys changed differently on both
+        raise MergeConflict unless `prefer` is 'source' or 'target'.
+        """
+        target = self._branch(target)
+        source_head, target_head = self.head(source), self.head(target)
+        base_id = self.merge_base(source_head.version_id, target_head.version_id)
+        base = self.versions[base_id].state
+        if base_id == source_head.version_id:
+            return target_head # Nothing new on the source branch
+
+        merged, conflicts = {}, []
+        for name in SECTIONS:
+            ours, theirs = getattr(target_head.state, name), getattr(source_head.state, name)
+            ours_changes = {key: new for key, _, new in getattr(base, name).diff(ours)}
+            result = ours
+            for key, old, new in getattr(base, name).diff(theirs):
+                mine = ours_changes.get(key, MISSING)
+                if key in ours_changes and mine != new:
+                    if prefer == 'target':
+                        continue
+                    if prefer != 'source':
+                        conflicts.append((name, key, old, mine, new))
+                        continue
+                result = result.delete(key) if new is MISSING else result.set(key, new)
+            merged[name] = result
+        if conflicts:
+            raise MergeConflict(conflicts)
+        return self.commit(ProjectState(**merged), message or f"Merge {source} into {target}", target,
+                           parents=(target_head.version_id, source_head.version_id))
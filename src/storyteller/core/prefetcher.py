@@ -0,0 +1,145 @@
+"""
+Speculative pre-generation of likely next dialogue lines.
+
+While the player is deciding, the prefetcher uses idle backend capacity to
+generate the top-N most likely next lines. Results are cached under the
+manager's context version, so any change to world state or history discards
+them. Hit rate and wasted work are tracked to help tune N.
+"""
+import asyncio
+from collections import OrderedDict
+
+from storyteller.metrics import registry as metrics
+
+
+class SpeculativePrefetcher:
+    """Pre-generates likely next lines for a `DialogueManager`."""
+
+    def __init__(self, manager, top_n=2, capacity=32, max_speculative=1):
+        self.manager = manager
+        self.top_n = top_n
+        self.capacity = capacity
+        self.max_speculative = max_speculative # Speculative generations allowed at once
+        self._cache = OrderedDict() # (context version, request key) -> DialogueResponse
+        self._inflight = {} # (context version, request key) -> asyncio.Task
+        self._foreground = 0
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.wasted = 0
+        self.wasted_tokens = 0
+        self.cancelled = 0
+        manager.prefetcher = self
+
+    def _key(self, request):
+        return (self.manager.context_version, request.cache_key())
+
+    @property
+    def idle(self):
+        return self._foreground == 0 and len(self._inflight) < self.max_speculative
+
+    # --- Speculation ---
+
+    def prefetch(self, candidates):
+        """
+        Schedules speculative generation for the `top_n` most likely of
+        `candidates`, an iterable of (DialogueRequest, probability) pairs.
+        Returns the number of generations started.
+        """
+        ranked = sorted(candidates, key=lambda pair: pair[1], reverse=True)[:self.top_n]
+        started = 0
+        for request, _ in ranked:
+            key = self._key(request)
+            if key in self._cache or key in self._inflight:
+                continue
+            if not self.idle:
+                break
+            task = asyncio.ensure_future(self.manager.generate_dialogue(request, commit=False))
+            self._inflight[key] = task
+            task.add_done_callback(lambda task, key=key: self._finished(key, task))
+            started += 1
+        return started
+
+    def _finished(self, key, task):
+        if self._inflight.get(key) is not task:
+            return # Invalidated while running
+        del self._inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        self.generated += 1
+        metrics.increment('prefetch_generated')
+        self._cache[key] = task.result()
+        while len(self._cache) > self.capacity:
+            _, evicted = self._cache.popitem(last=False)
+            self._waste(evicted)
+
+    def _waste(self, response):
+        self.wasted += 1
+        self.wasted_tokens += response.tokens
+        metrics.increment('prefetch_wasted')
+        metrics.increment('prefetch_wasted_tokens', response.tokens)
+
+    def invalidate(self):
+        """Discards every speculative result; called when the context changes."""
+        for response in self._cache.values():
+            self._waste(response)
+        self._cache.clear()
+        self._cancel_speculation()
+
+    def _cancel_speculation(self):
+        for task in self._inflight.values():
+            task.cancel()
+            self.cancelled += 1
+            metrics.increment('prefetch_cancelled')
+        self._inflight.clear()
+
+    # --- Foreground requests ---
+
+    async def generate_dialogue(self, request, on_token=None, on_reset=None):
+        """Returns a prefetched line when one matches, otherwise generates it."""
+        key = self._key(request)
+        self._foreground += 1
+        try:
+            response = self._cache.pop(key, None)
+            task = self._inflight.pop(key, None)
+            if response is None and task is not None:
+                # The speculative generation is already under way; adopt it and
+                # give the rest of the backend to the foreground request
+                self._cancel_speculation()
+                try:
+                    response = await task
+                    self.generated += 1
+                    metrics.increment('prefetch_generated')
+                except asyncio.CancelledError:
+                    if asyncio.current_task().cancelling():
+                        raise
+                    response = None
+            if response is not None:
+                self.hits += 1
+                metrics.record_cache('prefetch', True)
+                if on_token is not None:
+                    on_token(response.text)
+                self.manager.update_dialogue_history(request, response)
+                return response
+
+            self.misses += 1
+            metrics.record_cache('prefetch', False)
+            self._cancel_speculation()
+            return await self.manager.generate_dialogue(request, on_token=on_token, on_reset=on_reset)
+        finally:
+            self._foreground -= 1
+
+    def stats(self):
+        """Returns hit rate and wasted-work figures for tuning `top_n`."""
+        lookups = self.hits + self.misses
+        return {
+            'top_n': self.top_n,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'generated': self.generated,
+            'wasted': self.wasted,
+            'waste_ratio': self.wasted / self.generated if self.generated else 0.0,
+            'wasted_tokens': self.wasted_tokens,
+            'cancelled': self.cancelled,
+        }
@@ -0,0 +1,167 @@
+"""
+Scene Scheduler for multi-character dialogue.
+
+A scene is a DAG of turns. A turn waits only for the turns it depends on, so
+independent turns (bystander reactions, alternative branches) are generated
+concurrently while dependent turns keep their order. Each turn sees a
+copy-on-write `ContextSnapshot` built from its dependencies' results.
+
+Generated lines live only in those snapshots; alternative branches are
+mutually exclusive, so nothing is added to the manager's history until
+`commit()` is called with the turn that ends the chosen path.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+
+from storyteller.core.context_tracker import ContextSnapshot
+from storyteller.core.dialogue_manager import DialogueRequest
+from storyteller.metrics import registry as metrics
+
+
+class SceneError(ValueError):
+    """Raised for malformed scenes (unknown dependencies, cycles, duplicate ids)."""
+
+
+@dataclass
+class SceneTurn:
+    """One line in a scene and the turns that must be spoken before it."""
+    turn_id: str
+    speaker_id: str
+    listener_ids: tuple = ()
+    situation: str = ''
+    depends_on: tuple = ()
+    params: dict = field(default_factory=dict)
+
+    def to_request(self):
+        return DialogueRequest(speaker_id=self.speaker_id, listener_ids=tuple(self.listener_ids),
+                               situation=self.situation, params=dict(self.params))
+
+
+class Scene:
+    """An ordered collection of turns forming a dependency DAG."""
+
+    def __init__(self, turns=()):
+        self.turns = {}
+        for turn in turns:
+            self.add_turn(turn)
+
+    def add_turn(self, turn):
+        if turn.turn_id in self.turns:
+            raise SceneError(f"Duplicate turn id '{turn.turn_id}'.")
+        self.turns[turn.turn_id] = turn
+        return turn
+
+    def topological_order(self):
+        """Returns the turns in dependency order, raising SceneError if invalid."""
+        pending = {}
+        dependents = {turn_id: [] for turn_id in self.turns}
+        for turn in self.turns.values():
+            for dependency in turn.depends_on:
+                if dependency not in self.turns:
+                    raise SceneError(f"Turn '{turn.turn_id}' depends on unknown turn '{dependency}'.")
+                dependents[dependency].append(turn.turn_id)
+            pending[turn.turn_id] = len(set(turn.depends_on))
+        # Kahn's algorithm, keeping insertion order among ready turns
+        ready = [turn_id for turn_id, count in pending.items() if count == 0]
+        order = []
+        while ready:
+            turn_id = ready.pop(0)
+            order.append(self.turns[turn_id])
+            for dependent in dependents[turn_id]:
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    ready.append(dependent)
+        if len(order) != len(self.turns):
+            stuck = sorted(set(self.turns) - {turn.turn_id for turn in order})
+            raise SceneError(f"Scene has a dependency cycle involving: {', '.join(stuck)}.")
+        return order
+
+
+@dataclass
+class SceneResult:
+    """Generated lines plus timing against the serial baseline."""
+    responses: dict # turn id -> DialogueResponse
+    snapshots: dict # turn id -> ContextSnapshot after the turn
+    turn_seconds: dict # turn id -> generation time, including queueing on the backend
+    wall_seconds: float
+    backend_seconds: dict = field(default_factory=dict) # turn id -> time the backend reported working on it
+
+    @property
+    def serial_is_estimate(self):
+        """True when some turn had no backend timing and its latency was used instead."""
+        return any(turn_id not in self.backend_seconds for turn_id in self.turn_seconds)
+
+    @property
+    def serial_seconds(self):
+        """Time the same turns would take generated one after another."""
+        # Latencies measured while turns overlap include waiting for a busy
+        # backend, so they are only used when the backend reports no timing
+        return sum(self.backend_seconds.get(turn_id, seconds)
+                   for turn_id, seconds in self.turn_seconds.items())
+
+    @property
+    def speedup(self):
+        return self.serial_seconds / self.wall_seconds if self.wall_seconds else 1.0
+
+    def summary(self):
+        return (f"{len(self.responses)} turns in {self.wall_seconds * 1000:.0f} ms "
+                f"(serial {'estimate' if self.serial_is_estimate else 'baseline'} "
+                f"{self.serial_seconds * 1000:.0f} ms, {self.speedup:.1f}x)")
+
+
+class SceneScheduler:
+    """Generates the turns of a scene as concurrently as their dependencies allow."""
+
+    def __init__(self, manager, max_concurrency=4):
+        self.manager = manager
+        self.max_concurrency = max_concurrency
+
+    async def run(self, scene, snapshot=None):
+        order = scene.topological_order()
+        root = snapshot or ContextSnapshot(self.manager.world_state)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        responses, snapshots, turn_seconds, backend_seconds = {}, {}, {}, {}
+        tasks = {}
+
+        async def run_turn(turn):
+            # Dependencies were scheduled earlier in topological order
+            parents = [await tasks[dependency] for dependency in turn.depends_on]
+            context = ContextSnapshot.merge(parents) if parents else root.fork()
+            async with semaphore:
+                start = time.perf_counter()
+                response = await self.manager.generate_dialogue(turn.to_request(), snapshot=context, commit=False)
+                turn_seconds[turn.turn_id] = time.perf_counter() - start
+            responses[turn.turn_id] = response
+            if response.metadata.get('backend_seconds'):
+                backend_seconds[turn.turn_id] = response.metadata['backend_seconds']
+            result = context.with_line({'turn_id': turn.turn_id, 'speaker_id': turn.speaker_id,
+                                        'text': response.text})
+            snapshots[turn.turn_id] = result
+            return result
+
+        start = time.perf_counter()
+        for turn in order:
+            tasks[turn.turn_id] = asyncio.ensure_future(run_turn(turn))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        wall_seconds = time.perf_counter() - start
+
+        metrics.observe('scene', wall_seconds)
+        metrics.increment('scene_turns', len(order))
+        return SceneResult(responses, snapshots, turn_seconds, wall_seconds, backend_seconds)
+
+    def commit(self, scene, result, turn_id):
+        """
+        Adds the lines leading up to and including `turn_id` to the manager's
+        history, in the order that turn saw them. Returns the committed turn ids.
+        """
+        path = [entry['turn_id'] for entry in result.snapshots[turn_id].history
+                if entry.get('turn_id') in result.responses]
+        for path_turn in path:
+            self.manager.update_dialogue_history(scene.turns[path_turn].to_request(), result.responses[path_turn])
+        return path
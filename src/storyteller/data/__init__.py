@@ -0,0 +1,3 @@
+"""
+Data handling: models, validation, import and export of project data.
+"""
@@ -0,0 +1,287 @@
+"""
+Streaming exporter for dialogue scripts and character sheets.
+
+Records are streamed out of the DataStore one entity at a time (a scene is all
+dialogue lines sharing a context_id), rendered in parallel in a process pool
+and written to `<project>/exports/` as each render completes:
+
+    exports/
+    ├── dialogue_exports/<scene>.fountain   # Fountain screenplay format
+    ├── character_sheets/<character>.md     # Markdown character sheets
+    └── manifest.json                       # Content hash of every exported entity
+
+At most `window` renders are in flight at once, so memory stays bounded however
+large the project is. The manifest records a hash of each entity's data;
+entities whose hash is unchanged since the last export are skipped, and the
+manifest is saved periodically, so an interrupted export resumes where it
+stopped. It also records each entity's file. When two ids map to the same
+safe file name (e.g. 'scene 1' and 'scene_1'), the later one gets a short hash
+suffix, and it keeps that file name in later exports.
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import textwrap
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+
+MANIFEST_FILE_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+# Bump when a renderer's output changes, so every entity is re-exported
+RENDER_VERSION = 1
+
+KINDS = ('dialogue', 'characters')
+
+
+@dataclass
+class ExportReport:
+    """Outcome of one export run."""
+    exported: int = 0
+    skipped: int = 0 # Unchanged since the last export
+    seconds: float = 0.0
+
+
+# --- Renderers (module-level so worker processes can unpickle them) ---
+
+def _heading(scene):
+    location = (scene['location'] or scene['scene_id']).upper()
+    return location if location.startswith(('INT.', 'EXT.')) else f"INT. {location}"
+
+
+def render_script(scene):
+    """Renders a scene as a Fountain screenplay."""
+    lines = [_heading(scene), '']
+    for line in scene['lines']:
+        lines.append(line['speaker'].upper())
+        emotion = line['metadata'].get('emotion') if isinstance(line['metadata'], dict) else None
+        if emotion:
+            lines.append(f"({emotion})")
+        lines.extend(textwrap.wrap(line['content'], 60) or [''])
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def _bullets(values):
+    if isinstance(values, dict):
+        return [f"- **{key}:** {value}" for key, value in values.items()]
+    if isinstance(values, (list, tuple)):
+        return [f"- {value}" for value in values]
+    return [f"- {values}"] if values else []
+
+
+def render_character_sheet(character):
+    """Renders a character as a Markdown sheet."""
+    lines = [f"# {character['name'] or character['character_id']}", '',
+             f"*ID:* `{character['character_id']}`", '']
+    sections = (
+        ('Background', [character['background']] if character['background'] else []),
+        ('Personality', _bullets(character['personality_traits'])),
+        ('Speech Patterns', _bullets(character['speech_patterns'])),
+        ('Goals', _bullets(character['goals'])),
+        ('Knowledge', _bullets(character['knowledge'])),
+        ('Relationships', [f"- {r['other']}: {r['type'] or 'unknown'} ({r['quality']:+.2f})"
+                           for r in character['relationships']]),
+    )
+    for title, body in sections:
+        if body:
+            lines += [f"## {title}", '', *body, '']
+    return '\n'.join(lines)
+
+
+RENDERERS = {
+    'dialogue': (render_script, 'dialogue_exports', '.fountain'),
+    'characters': (render_character_sheet, 'character_sheets', '.md'),
+}
+
+
+def _render(kind, payload):
+    return RENDERERS[kind][0](payload)
+
+
+# --- Entity streams ---
+
+def iter_scenes(store):
+    """Yields (scene_id, payload) per context_id, lines ordered by time."""
+    dialogue = store.get_table('dialogue_history')
+    names = dict(zip(store.get_table('characters').column('character_id'),
+                     store.get_table('characters').column('name')))
+    context = store.get_table('context')
+    locations = dict(zip(context.column('context_id'), context.column('location')))
+
+    # Only row indices are grouped up front; line payloads are built per scene
+    scenes = defaultdict(list)
+    for index, context_id in enumerate(dialogue.column('context_id')):
+        scenes[context_id].append(index)
+    created_at = dialogue.column('created_at')
+    for scene_id, rows in scenes.items():
+        rows.sort(key=created_at.__getitem__)
+        lines = []
+        for index in rows:
+            row = dialogue.row(index)
+            speaker_id = row['character_ids'][0] if row['character_ids'] else ''
+            lines.append({'speaker': names.get(speaker_id) or speaker_id or 'UNKNOWN',
+                          'content': row['content'], 'metadata': row['metadata']})
+        yield scene_id or 'unassigned', {
+            'scene_id': scene_id or 'unassigned', 'location': locations.get(scene_id, ''), 'lines': lines}
+
+
+def iter_characters(store):
+    """Yields (character_id, payload) with each character's relationships."""
+    relationships = store.get_table('relationships')
+    links = defaultdict(list)
+    for char1, char2, kind, quality in zip(relationships.column('char1_id'), relationships.column('char2_id'),
+                                           relationships.column('relationship_type'),
+                                           relationships.column('relationship_quality')):
+        links[char1].append({'other': char2, 'type': kind, 'quality': quality})
+        links[char2].append({'other': char1, 'type': kind, 'quality': quality})
+    characters = store.get_table('characters')
+    for index in range(len(characters)):
+        payload = characters.row(index)
+        payload['relationships'] = links.get(payload['character_id'], [])
+        yield payload['character_id'], payload
+
+
+ENTITY_STREAMS = {'dialogue': iter_scenes, 'characters': iter_characters}
+
+
+def content_hash(payload):
+    data = json.dumps(payload, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(f"{RENDER_VERSION}:{data}".encode('utf-8')).hexdigest()
+
+
+def safe_file_name(entity_id):
+    name = re.sub(r'[^\w.-]+', '_', str(entity_id)).strip('._')
+    return name or 'unnamed'
+
+
+def id_suffix(entity_id):
+    """Short, stable hash of an id, used to tell apart ids with the same safe name."""
+    return hashlib.sha256(str(entity_id).encode('utf-8')).hexdigest()[:8]
+
+
+# --- Exporter ---
+
+class Exporter:
+    """Exports project entities to `<export_dir>` incrementally."""
+
+    def __init__(self, store, export_dir, workers=None, window=None, checkpoint_every=100):
+        self.store = store
+        self.export_dir = Path(export_dir)
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.window = window or max(1, self.workers) * 4
+        self.checkpoint_every = checkpoint_every
+        self.manifest_path = self.export_dir / MANIFEST_FILE_NAME
+        self.manifest = self._load_manifest()
+        # Case-folded, since 'Mira.md' and 'mira.md' clash on some file systems
+        self._taken = {entry['file'].casefold() for entry in self.manifest.values()}
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable export manifest {self.manifest_path}: {e}", file=sys.stderr)
+            return {}
+        if manifest.get('version') != MANIFEST_VERSION:
+            return {}
+        return manifest.get('entities', {})
+
+    def save_manifest(self):
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+        temp_path = self.manifest_path.with_suffix('.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'entities': self.manifest}, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+
+    def pending(self, kinds=KINDS, ids=None, force=False):
+        """Yields (kind, entity_id, payload, digest) for entities that need exporting."""
+        for kind in kinds:
+            for entity_id, payload in ENTITY_STREAMS[kind](self.store):
+                if ids is not None and entity_id not in ids:
+                    continue
+                digest = content_hash(payload)
+                entry = self.manifest.get(f"{kind}/{entity_id}")
+                if (not force and entry and entry['hash'] == digest
+                        and (self.export_dir / entry['file']).exists()):
+                    yield kind, entity_id, None, None # Unchanged
+                else:
+                    yield kind, entity_id, payload, digest
+
+    def _file_for(self, kind, entity_id):
+        """Path of the entity's export relative to export_dir; an exported entity keeps its file."""
+        entry = self.manifest.get(f"{kind}/{entity_id}")
+        if entry:
+            return Path(entry['file'])
+        _, folder, suffix = RENDERERS[kind]
+        name = safe_file_name(entity_id)
+        relative = Path(folder) / f"{name}{suffix}"
+        if relative.as_posix().casefold() in self._taken:
+            relative = Path(folder) / f"{name}-{id_suffix(entity_id)}{suffix}"
+        return relative
+
+    def _write(self, kind, entity_id, digest, text):
+        relative = self._file_for(kind, entity_id)
+        path = self.export_dir / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(path.name + '.tmp')
+        temp_path.write_text(text, encoding='utf-8')
+        os.replace(temp_path, path)
+        self.manifest[f"{kind}/{entity_id}"] = {'hash': digest, 'file': relative.as_posix()}
+        self._taken.add(relative.as_posix().casefold())
+
+    def export(self, kinds=KINDS, ids=None, force=False):
+        """
+        Exports the given entity kinds (optionally only `ids`). Unchanged
+        entities are skipped unless `force` is set. Returns an ExportReport.
+        """
+        unknown = [k for k in kinds if k not in RENDERERS]
+        if unknown:
+            raise ValueError(f"Unknown export kind(s): {', '.join(unknown)}")
+        ids = set(ids) if ids is not None else None
+        report = ExportReport()
+        start = time.perf_counter()
+        since_checkpoint = 0
+
+        def finished(kind, entity_id, digest, text):
+            nonlocal since_checkpoint
+            self._write(kind, entity_id, digest, text)
+            report.exported += 1
+            since_checkpoint += 1
+            if since_checkpoint >= self.checkpoint_every:
+                self.save_manifest()
+                since_checkpoint = 0
+
+        try:
+            if self.workers <= 1:
+                for kind, entity_id, payload, digest in self.pending(kinds, ids, force):
+                    if payload is None:
+                        report.skipped += 1
+                    else:
+                        finished(kind, entity_id, digest, _render(kind, payload))
+            else:
+                with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                    in_flight = {}
+                    for kind, entity_id, payload, digest in self.pending(kinds, ids, force):
+                        if payload is None:
+                            report.skipped += 1
+                            continue
+                        # Bounded window: stop reading entities until a render completes
+                        while len(in_flight) >= self.window:
+                            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                            for future in done:
+                                finished(*in_flight.pop(future), future.result())
+                        in_flight[pool.submit(_render, kind, payload)] = (kind, entity_id, digest)
+                    for future in list(in_flight):
+                        finished(*in_flight.pop(future), future.result())
+        finally:
+            # Whatever was written so far is kept, so a rerun resumes from here
+            self.save_manifest()
+            report.seconds = time.perf_counter() - start
+        return report
@@ -0,0 +1,263 @@
+"""
+Streaming bulk importer for CSV and JSON data.
+
+Files are read in fixed-size chunks, so memory stays bounded whatever the file
+size. Each chunk is validated column-wise (see `data.validator`), its valid
+rows are committed to the DataStore straight away, and rejected rows are
+written to an error side file (`<file>.errors.csv`). Rows that cannot be
+parsed at all (malformed JSON lines, CSV rows with the wrong number of cells)
+are rejected the same way, with their line number, and the import continues.
+So are JSON objects with unknown keys; only a bad CSV header stops an import.
+
+Supported formats: CSV with a header row, JSON Lines (`.jsonl`/`.ndjson`) and
+JSON files holding an array of objects (decoded incrementally).
+"""
+import csv
+import json
+import time
+from dataclasses import dataclass
+from itertools import compress, islice
+from pathlib import Path
+
+from storyteller.data import models
+from storyteller.data import validator
+
+DEFAULT_CHUNK_SIZE = 50_000
+JSON_READ_SIZE = 1 << 16
+
+
+@dataclass
+class ImportReport:
+    """Outcome of importing one file."""
+    table: str
+    rows_read: int = 0
+    rows_imported: int = 0
+    rows_rejected: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    error_file: Path = None # Only set when some rows were rejected
+
+    @property
+    def rows_per_second(self):
+        return self.rows_read / self.seconds if self.seconds else 0.0
+
+
+# --- Chunked readers ---
+#
+# Each reader yields (columns, bad_rows): {column: [values]} plus {row index:
+# (error, raw text)} for rows that could not be parsed. A bad row stays in the
+# chunk as an empty placeholder, so row numbers still line up. Empty values
+# fail the required-field check, so a placeholder never claims a key.
+#
+# JSON objects each carry their own keys, so readers given the table's `fields`
+# reject an object with unknown keys as a bad row. A CSV header applies to
+# every row and is checked once by the importer instead.
+
+MAX_RAW_CHARS = 200 # Raw text kept in the error file for an unparseable row
+
+
+def iter_csv_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, fields=None):
+    with open(path, newline='', encoding='utf-8') as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader, None)
+        if header is None:
+            return
+        header = [name.strip() for name in header]
+        width = len(header)
+        rows_left = (row for row in reader if row) # Skip blank lines
+        while True:
+            rows, bad_rows = [], {}
+            for row in islice(rows_left, chunk_size):
+                if len(row) != width:
+                    bad_rows[len(rows)] = (f"line {reader.line_num}: expected {width} cells, got {len(row)}",
+                                           ','.join(row)[:MAX_RAW_CHARS])
+                    row = [''] * width
+                rows.append(row)
+            if not rows:
+                return
+            yield dict(zip(header, map(list, zip(*rows)))), bad_rows
+
+
+def _objects_to_columns(numbered_objects, fields=None):
+    """Columns from (line number, decoded value) pairs, plus the bad rows among them."""
+    objects, bad_rows = [], {}
+    for line, obj in numbered_objects:
+        if not isinstance(obj, dict):
+            bad_rows[len(objects)] = (f"line {line}: expected a JSON object, found {type(obj).__name__}",
+                                      json.dumps(obj)[:MAX_RAW_CHARS])
+            obj = {}
+        elif fields is not None:
+            unknown = [key for key in obj if key not in fields]
+            if unknown:
+                bad_rows[len(objects)] = (f"line {line}: unknown key(s): {', '.join(unknown)}",
+                                          json.dumps(obj)[:MAX_RAW_CHARS])
+                obj = {}
+        objects.append(obj)
+    names = {}
+    for obj in objects:
+        names.update(dict.fromkeys(obj))
+    return {name: [obj.get(name) for obj in objects] for name in names}, bad_rows
+
+
+def iter_jsonl_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, fields=None):
+    with open(path, encoding='utf-8') as json_file:
+        lines = ((number, line) for number, line in enumerate(json_file, 1) if line.strip())
+        while True:
+            numbered, invalid = [], {}
+            for number, line in islice(lines, chunk_size):
+                try:
+                    numbered.append((number, json.loads(line)))
+                except json.JSONDecodeError as e:
+                    invalid[len(numbered)] = (f"line {number}: invalid JSON: {e.msg} at column {e.colno}",
+                                              line.strip()[:MAX_RAW_CHARS])
+                    numbered.append((number, {}))
+            if not numbered:
+                return
+            columns, bad_rows = _objects_to_columns(numbered, fields)
+            bad_rows.update(invalid)
+            yield columns, bad_rows
+
+
+def _iter_json_array(json_file, read_size=JSON_READ_SIZE):
+    """Yields (line number, element) for a top-level JSON array, reading it in pieces."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    line = 1
+    started = False
+    eof = False
+
+    def consume(count):
+        nonlocal buffer, line
+        line += buffer.count('\n', 0, count)
+        buffer = buffer[count:]
+
+    while True:
+        consume(len(buffer) - len(buffer.lstrip(' \t\r\n,')))
+        if not started and buffer:
+            if buffer[0] != '[':
+                raise validator.SchemaError("JSON file must contain an array of objects.")
+            consume(1)
+            started = True
+            continue
+        if started and buffer.startswith(']'):
+            return
+        if buffer and started:
+            try:
+                value, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError as e:
+                if eof:
+                    # Elements of an array cannot be told apart once one is malformed
+                    error_line = line + buffer.count('\n', 0, e.pos)
+                    raise validator.SchemaError(f"Invalid JSON at line {error_line}: {e.msg}") from e
+            else:
+                yield line, value
+                consume(end)
+                continue
+        if eof:
+            return
+        data = json_file.read(read_size)
+        eof = not data
+        buffer += data
+
+
+def iter_json_array(json_file, read_size=JSON_READ_SIZE):
+    """Yields the elements of a top-level JSON array without loading the whole file."""
+    for _, value in _iter_json_array(json_file, read_size):
+        yield value
+
+
+def iter_json_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, fields=None):
+    with open(path, encoding='utf-8') as json_file:
+        elements = _iter_json_array(json_file)
+        while True:
+            chunk = list(islice(elements, chunk_size))
+            if not chunk:
+                return
+            yield _objects_to_columns(chunk, fields)
+
+
+READERS = {
+    '.csv': iter_csv_chunks,
+    '.jsonl': iter_jsonl_chunks,
+    '.ndjson': iter_jsonl_chunks,
+    '.json': iter_json_chunks,
+}
+
+
+# --- Importer ---
+
+class StreamingImporter:
+    """Imports files into a DataStore chunk by chunk."""
+
+    def __init__(self, store, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.store = store
+        self.chunk_size = chunk_size
+
+    def import_file(self, table_name, path, error_path=None):
+        """Imports `path` into `table_name` and returns an ImportReport."""
+        path = Path(path)
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise validator.SchemaError(f"Unsupported file type '{path.suffix}'. "
+                                        f"Use one of: {', '.join(sorted(READERS))}")
+        error_path = Path(error_path) if error_path else path.with_name(path.name + '.errors.csv')
+        model = models.MODELS[table_name]
+        table = self.store.get_table(table_name)
+
+        # Keys and referenced ids are collected once, then kept up to date per chunk
+        known_keys = set(table.column(model.KEY)) if model.KEY else None
+        character_ids = None
+        if table_name in validator.CHARACTER_REFERENCES:
+            character_ids = set(self.store.get_table('characters').column('character_id'))
+
+        report = ImportReport(table=table_name)
+        start = time.perf_counter()
+        error_file = error_writer = None
+        try:
+            for columns, bad_rows in reader(path, self.chunk_size, fields=model.SCHEMA):
+                if reader is iter_csv_chunks:
+                    validator.check_header(table_name, columns)
+                elif columns:
+                    # A required key no object of the chunk has is empty in every row
+                    row_count = len(next(iter(columns.values())))
+                    for name in validator.REQUIRED_FIELDS.get(table_name, ()):
+                        columns.setdefault(name, [None] * row_count)
+                if columns:
+                    coerced, valid, errors = validator.validate_chunk(
+                        table_name, columns, known_keys, character_ids)
+                else: # No row of the chunk could be parsed
+                    coerced, valid, errors = {}, [False] * len(bad_rows), []
+                # Unparseable rows are reported once, with their own error
+                rows = [(index, column, columns[column][index], message)
+                        for index, column, message in errors if index not in bad_rows]
+                for index, (message, raw) in bad_rows.items():
+                    valid[index] = False
+                    rows.append((index, '', raw, message))
+                first_row = report.rows_read
+                row_count = len(valid)
+                report.rows_read += row_count
+                report.chunks += 1
+
+                if rows:
+                    if error_writer is None:
+                        error_file = open(error_path, 'w', newline='', encoding='utf-8')
+                        error_writer = csv.writer(error_file)
+                        error_writer.writerow(['row', 'column', 'value', 'error'])
+                    for index, column, value, message in sorted(rows, key=lambda row: row[:2]):
+                        # Row numbers are 1-based data rows, matching spreadsheet views
+                        error_writer.writerow([first_row + index + 1, column, value, message])
+
+                accepted = sum(valid)
+                report.rows_rejected += row_count - accepted
+                if not accepted:
+                    continue
+                if accepted < row_count:
+                    coerced = {name: list(compress(values, valid)) for name, values in coerced.items()}
+                self.store.append_rows(table_name, coerced, coerced=True)
+                report.rows_imported += accepted
+        finally:
+            if error_file is not None:
+                error_file.close()
+                report.error_file = error_path
+            report.seconds = time.perf_counter() - start
+        return report
@@ -0,0 +1,217 @@
+"""
+Core data models: Character, Relationship, ContextElement and Dialogue.
+
+Projects can hold hundreds of thousands of characters and millions of context
+events, so the models are compact:
+
+- Records use `__slots__`, so there is no per-object `__dict__`.
+- Enum-like string fields (relationship types, statuses, context types,
+  trait names) are interned, so equal values share one string object.
+- Each model also has a row view class that reads straight from the DataStore
+  columns without copying, plus helpers to convert records to and from columns.
+
+Column kinds used in `SCHEMA`:
+    'str'   free text                 'enum'  interned string
+    'int'   array('q') column         'float' array('d') column
+    'tags'  tuple of interned strings 'json'  arbitrary object (dict/list)
+"""
+import sys
+from array import array
+
+# array typecodes for numeric column kinds
+ARRAY_TYPECODES = {'int': 'q', 'float': 'd'}
+
+
+def intern_value(value):
+    """Interns a string (or returns non-strings unchanged)."""
+    return sys.intern(value) if type(value) is str else value
+
+
+def intern_tags(values):
+    """Normalizes a trait/tag collection to a tuple of interned strings."""
+    if values is None or values == '':
+        return ()
+    if isinstance(values, str):
+        values = [v.strip() for v in values.split(';') if v.strip()]
+    return tuple(sys.intern(str(v)) for v in values)
+
+
+def coerce(kind, value):
+    """Converts a raw value to the Python type stored for a column kind."""
+    if kind == 'enum':
+        return intern_value('' if value is None else str(value))
+    if kind == 'tags':
+        return intern_tags(value)
+    if kind == 'int':
+        return int(value) if value not in (None, '') else 0
+    if kind == 'float':
+        return float(value) if value not in (None, '') else 0.0
+    if kind == 'str':
+        return '' if value is None else str(value)
+    return value
+
+
+def new_column(kind, values=()):
+    """Creates column storage for `kind` holding already-coerced `values`."""
+    typecode = ARRAY_TYPECODES.get(kind)
+    return array(typecode, values) if typecode else list(values)
+
+
+class Record:
+    """Base class for slotted models. Subclasses define `SCHEMA` and `__slots__`."""
+    __slots__ = ()
+    SCHEMA = {}
+    KEY = None # Name of the primary key field
+
+    def __init__(self, **values):
+        for name, kind in self.SCHEMA.items():
+            object.__setattr__(self, name, coerce(kind, values.get(name)))
+        unknown = set(values) - set(self.SCHEMA)
+        if unknown:
+            raise TypeError(f"{type(self).__name__} has no field(s) {', '.join(sorted(unknown))}")
+
+    def __setattr__(self, name, value):
+        kind = self.SCHEMA.get(name)
+        object.__setattr__(self, name, coerce(kind, value) if kind else value)
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, n) == getattr(other, n) for n in self.SCHEMA)
+
+    def __repr__(self):
+        key = getattr(self, self.KEY) if self.KEY else ''
+        return f"{type(self).__name__}({key!r})"
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.SCHEMA}
+
+
+class Character(Record):
+    SCHEMA = {
+        'character_id': 'enum', # Shared with the relationship id columns
+        'name': 'str',
+        'background': 'str',
+        'personality_traits': 'tags',
+        'speech_patterns': 'json',
+        'goals': 'tags',
+        'knowledge': 'json',
+    }
+    KEY = 'character_id'
+    __slots__ = tuple(SCHEMA)
+
+
+class Relationship(Record):
+    SCHEMA = {
+        'char1_id': 'enum', # Ids repeat across many relationships, so intern them
+        'char2_id': 'enum',
+        'relationship_type': 'enum',
+        'relationship_quality': 'float',
+        'shared_history': 'str',
+        'current_status': 'enum',
+    }
+    __slots__ = tuple(SCHEMA)
+
+    def __repr__(self):
+        return f"Relationship({self.char1_id!r}, {self.char2_id!r}, {self.relationship_type!r})"
+
+
+class ContextElement(Record):
+    SCHEMA = {
+        'context_id': 'str',
+        'context_type': 'enum', # spatial, temporal, narrative, social, emotional
+        'location': 'enum',
+        'value': 'json',
+        'priority': 'int',
+        'timestamp': 'float',
+        'relevance': 'float',
+    }
+    KEY = 'context_id'
+    __slots__ = tuple(SCHEMA)
+
+
+class Dialogue(Record):
+    SCHEMA = {
+        'dialogue_id': 'str',
+        'character_ids': 'tags',
+        'context_id': 'str',
+        'created_at': 'float',
+        'content': 'str',
+        'metadata': 'json',
+    }
+    KEY = 'dialogue_id'
+    __slots__ = tuple(SCHEMA)
+
+
+MODELS = {
+    'characters': Character,
+    'relationships': Relationship,
+    'context': ContextElement,
+    'dialogue_history': Dialogue,
+}
+
+
+# --- Row views over columnar tables ---
+
+class RowView:
+    """
+    Read-only record view over one row of a columnar table. Field access reads
+    the table's column directly, so creating a view copies nothing.
+    """
+    __slots__ = ('_columns', '_row')
+    MODEL = Record
+
+    def __init__(self, columns, row):
+        self._columns = columns
+        self._row = row
+
+    def __repr__(self):
+        return f"{type(self).__name__}(row={self._row})"
+
+    def to_record(self):
+        """Materializes the row as a standalone model instance."""
+        record = object.__new__(self.MODEL)
+        for name in self.MODEL.SCHEMA:
+            object.__setattr__(record, name, self._columns[name][self._row])
+        return record
+
+    def to_dict(self):
+        return {name: self._columns[name][self._row] for name in self.MODEL.SCHEMA}
+
+
+def _column_property(name):
+    return property(lambda self: self._columns[name][self._row], doc=f"Column '{name}'.")
+
+
+def _make_view_class(model):
+    namespace = {'__slots__': (), 'MODEL': model}
+    for name in model.SCHEMA:
+        namespace[name] = _column_property(name)
+    return type(f"{model.__name__}View", (RowView,), namespace)
+
+
+CharacterView = _make_view_class(Character)
+RelationshipView = _make_view_class(Relationship)
+ContextElementView = _make_view_class(ContextElement)
+DialogueView = _make_view_class(Dialogue)
+
+VIEWS = {model: view for model, view in (
+    (Character, CharacterView), (Relationship, RelationshipView),
+    (ContextElement, ContextElementView), (Dialogue, DialogueView))}
+
+
+def iter_views(columns, model, rows=None):
+    """Yields row views over `columns` (all rows, or the given row indices)."""
+    view = VIEWS[model]
+    if rows is None:
+        lengths = [len(c) for c in columns.values()]
+        rows = range(lengths[0] if lengths else 0)
+    for row in rows:
+        yield view(columns, row)
+
+
+def records_to_columns(records, model):
+    """Converts model instances to a dict of column storage."""
+    records = list(records)
+    return {name: new_column(kind, [getattr(r, name) for r in records])
+            for name, kind in model.SCHEMA.items()}
@@ -0,0 +1,137 @@
+"""
+Validation of imported table data.
+
+Validation works a column at a time rather than a row at a time: every column
+of a chunk is coerced in one pass, and key and reference checks are set
+operations over whole columns. The result is a per-row validity mask plus a
+list of errors, so invalid rows can be dropped without rejecting the chunk.
+"""
+import json
+
+from storyteller.data import models
+
+
+class SchemaError(ValueError):
+    """Raised when a file's columns cannot be imported into a table at all."""
+
+
+# Fields that must be present and non-empty, per table
+REQUIRED_FIELDS = {
+    'characters': ('character_id',),
+    'relationships': ('char1_id', 'char2_id'),
+    'context': ('context_id',),
+    'dialogue_history': ('dialogue_id',),
+}
+
+# Fields that must name an existing character
+CHARACTER_REFERENCES = {
+    'relationships': ('char1_id', 'char2_id'),
+}
+
+
+def check_header(table_name, columns):
+    """Raises SchemaError unless `columns` can populate `table_name`."""
+    model = models.MODELS.get(table_name)
+    if model is None:
+        raise SchemaError(f"Unknown table '{table_name}'.")
+    missing = [f for f in REQUIRED_FIELDS.get(table_name, ()) if f not in columns]
+    if missing:
+        raise SchemaError(f"Missing required column(s) for {table_name}: {', '.join(missing)}")
+    unknown = [c for c in columns if c not in model.SCHEMA]
+    if unknown:
+        raise SchemaError(f"Unknown column(s) for {table_name}: {', '.join(unknown)}")
+
+
+def coerce_column(kind, values):
+    """
+    Coerces a whole column. Returns (coerced values, {index: error message})
+    for the values that could not be converted.
+    """
+    if kind in ('str', 'enum', 'tags'):
+        # These conversions cannot fail
+        return [models.coerce(kind, v) for v in values], {}
+    if kind == 'json':
+        return _coerce_json(values)
+    convert = int if kind == 'int' else float
+    coerced, errors = [], {}
+    for index, value in enumerate(values):
+        if value is None or value == '':
+            coerced.append(convert(0))
+            continue
+        try:
+            coerced.append(convert(value))
+        except (TypeError, ValueError):
+            coerced.append(convert(0))
+            errors[index] = f"expected {kind}, got {value!r}"
+    return coerced, errors
+
+
+def _coerce_json(values):
+    # CSV cells hold JSON as text; JSON sources already hold decoded objects
+    coerced, errors = [], {}
+    for index, value in enumerate(values):
+        if isinstance(value, str):
+            text = value.strip()
+            if not text:
+                value = None
+            elif text[0] in '{[':
+                try:
+                    value = json.loads(text)
+                except ValueError as e:
+                    errors[index] = f"invalid JSON: {e}"
+                    value = None
+        coerced.append(value)
+    return coerced, errors
+
+
+def validate_chunk(table_name, columns, known_keys=None, character_ids=None):
+    """
+    Validates one chunk of column data for `table_name`.
+
+    `known_keys` holds primary keys already in the table (updated in place as
+    new keys are accepted) and `character_ids` the ids relationships may
+    reference. Returns (coerced columns, valid mask, errors) where errors are
+    (chunk row index, column, message) tuples.
+    """
+    model = models.MODELS[table_name]
+    row_count = len(next(iter(columns.values()), ()))
+    valid = [True] * row_count
+    errors = []
+
+    def reject(indices, column, message):
+        for index in indices:
+            valid[index] = False
+            errors.append((index, column, message))
+
+    coerced = {}
+    for name, values in columns.items():
+        coerced[name], bad = coerce_column(model.SCHEMA[name], values)
+        for index, message in bad.items():
+            reject((index,), name, message)
+
+    for name in REQUIRED_FIELDS.get(table_name, ()):
+        reject([i for i, v in enumerate(coerced[name]) if not v], name, "required value is empty")
+
+    references = CHARACTER_REFERENCES.get(table_name, ())
+    if references and character_ids is not None:
+        for name in references:
+            column = coerced[name]
+            # Set difference finds the few unknown ids without a lookup per row
+            unknown = set(column) - character_ids
+            if unknown:
+                reject([i for i, v in enumerate(column) if v in unknown and v], name,
+                       "unknown character id")
+
+    if model.KEY and known_keys is not None:
+        keys = coerced[model.KEY]
+        duplicates = []
+        for index, key in enumerate(keys):
+            if not valid[index]:
+                continue
+            if key in known_keys:
+                duplicates.append(index)
+            else:
+                known_keys.add(key)
+        reject(duplicates, model.KEY, "duplicate id")
+
+    return coerced, valid, errors
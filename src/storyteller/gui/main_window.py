@@ -1,6 +1,8 @@
+from PyQt6.QtCore import QTimer
 from PyQt6.QtWidgets import QMainWindow, QLabel
 # Import the WelcomeDialog
 from .welcome_dialog import WelcomeDialog
+from .view_registry import DEFAULT_VIEWS, ViewRegistry
 
 class MainWindow(QMainWindow):
     """
@@ -10,6 +12,9 @@ class MainWindow(QMainWindow):
         super().__init__(parent)
         self.setWindowTitle("StoryTeller")
         self.setGeometry(100, 100, 1200, 800) # x, y, width, height
+        self.on_first_paint = None # Optional callback, run once after the first paint (startup timing)
+        self._first_paint_done = False
+        self.welcome_dialog = None
 
         # Add a placeholder label
         central_widget = QLabel("StoryTeller Main Window - Content Area")
@@ -20,18 +25,46 @@ class MainWindow(QMainWindow):
         self.load_initial_data()
 
     def setup_ui(self):
-        # TODO: Initialize Menu Bar, Tool Bar, Status Bar, Dock Widgets
-        pass
+        """Creates the menus, status bar and dock shells. Dock contents are built on first show."""
+        self.views = ViewRegistry(self)
+        for spec in DEFAULT_VIEWS:
+            self.views.register(spec)
+        self.views.restore_layout()
+
+        view_menu = self.menuBar().addMenu("&View")
+        for action in self.views.toggle_actions():
+            view_menu.addAction(action)
+        self.statusBar().showMessage("Ready")
 
     def load_initial_data(self):
         # Placeholder for data loading logic
         pass
 
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self._first_paint_done:
+            return
+        self._first_paint_done = True
+        if self.on_first_paint is not None:
+            callback, self.on_first_paint = self.on_first_paint, None
+            callback()
+        # Likely-next views are built in idle time once the window is on screen
+        self.views.start_preloading()
+
     def showEvent(self, event):
         """Override showEvent to show dialog only once when window is first shown."""
         super().showEvent(event)
-        # Check and show the welcome dialog using showEvent (ensures parent is visible)
+        # The welcome dialog is deferred to the next event loop pass and is
+        # non-modal, so it never delays the window's first paint or input
         # Use a flag to ensure it only runs once per instance
         if not hasattr(self, '_welcome_shown'):
-            WelcomeDialog.show_welcome_if_needed(self)
+            QTimer.singleShot(0, self._show_welcome)
             self._welcome_shown = True # Set flag
+
+    def _show_welcome(self):
+        self.welcome_dialog = WelcomeDialog.show_welcome_if_needed(self)
+
+    def closeEvent(self, event):
+        self.views.stop_preloading()
+        self.views.save_layout()
+        super().closeEvent(event)
@@ -0,0 +1,145 @@
+"""
+Theme Manager.
+
+Each time qt_material's `apply_stylesheet` runs, it renders its stylesheet
+template and writes recoloured SVG icons to disk before anything can paint.
+ThemeManager does that work only once per theme and qt_material version. It
+stores the compiled QSS, the icons and the theme fonts under the app cache
+dir, and later launches load them straight from there. Like
+`apply_stylesheet`, it also switches the app to the Fusion style.
+
+    <cache dir>/themes/<theme>-<qt_material version>-v<format>/
+        stylesheet.qss
+        icons/        # Registered as the 'icon:' search path used by the QSS
+        fonts/
+        theme.json    # Written last; marks the entry as complete
+"""
+import importlib.metadata
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+from PyQt6.QtCore import QDir
+from PyQt6.QtGui import QFontDatabase
+
+from storyteller import config
+from storyteller import paths
+
+# Make qt_material optional
+try:
+    import qt_material # type: ignore
+    qt_material_available = True
+except ImportError:
+    qt_material = None
+    qt_material_available = False
+
+# Bump when the cache layout changes, so old entries are rebuilt
+CACHE_FORMAT = 1
+STYLESHEET_FILE_NAME = "stylesheet.qss"
+MANIFEST_FILE_NAME = "theme.json"
+FONT_SUFFIXES = ('.ttf', '.otf')
+BASE_STYLE = 'Fusion' # The Qt style qt_material's stylesheets are written against
+
+
+def qt_material_version():
+    try:
+        return importlib.metadata.version('qt-material')
+    except importlib.metadata.PackageNotFoundError:
+        return getattr(qt_material, '__version__', 'unknown')
+
+
+class ThemeManager:
+    """Applies the configured qt_material theme, using the compiled-stylesheet cache."""
+
+    def __init__(self, cache_root=None):
+        self.cache_root = Path(cache_root) if cache_root else paths.get_cache_dir() / 'themes'
+        self.source = None # 'cache' or 'compiled' after apply()
+
+    def cache_dir(self, theme):
+        return self.cache_root / f"{Path(theme).stem}-{qt_material_version()}-v{CACHE_FORMAT}"
+
+    def is_cached(self, theme):
+        return (self.cache_dir(theme) / MANIFEST_FILE_NAME).exists()
+
+    def apply(self, app, theme=None):
+        """
+        Styles `app` with `theme` (default from the [Appearance] config).
+        Returns False when qt_material is not installed.
+        """
+        if not qt_material_available:
+            return False
+        theme = theme or config.get_setting('Appearance', 'theme')
+        use_cache = config.get_bool_setting('Appearance', 'stylesheet_cache', True)
+        if use_cache and self.is_cached(theme):
+            try:
+                stylesheet = self.load(theme)
+                self.source = 'cache'
+            except OSError as e:
+                print(f"Warning: Could not read cached theme, rebuilding it. Error: {e}", file=sys.stderr)
+                stylesheet = self.compile(theme, store=True)
+        else:
+            stylesheet = self.compile(theme, store=use_cache)
+        app.setStyle(BASE_STYLE)
+        app.setStyleSheet(stylesheet)
+        return True
+
+    def load(self, theme):
+        """Registers a cached theme's icons and fonts and returns its QSS."""
+        cache_dir = self.cache_dir(theme)
+        stylesheet = (cache_dir / STYLESHEET_FILE_NAME).read_text(encoding='utf-8')
+        self._set_search_paths(cache_dir)
+        for font in sorted((cache_dir / 'fonts').rglob('*')):
+            if font.suffix.lower() in FONT_SUFFIXES:
+                QFontDatabase.addApplicationFont(str(font))
+        return stylesheet
+
+    def compile(self, theme, store=True):
+        """Renders the theme with qt_material and (optionally) stores it in the cache."""
+        # build_stylesheet also registers fonts and writes the icons it points 'icon:' at
+        stylesheet = qt_material.build_stylesheet(theme=theme)
+        if stylesheet is None:
+            raise ValueError(f"Unknown qt_material theme '{theme}'.")
+        self.source = 'compiled'
+        if store:
+            try:
+                self._store(theme, stylesheet)
+            except OSError as e:
+                print(f"Warning: Could not cache compiled theme. Error: {e}", file=sys.stderr)
+        return stylesheet
+
+    def _store(self, theme, stylesheet):
+        cache_dir = self.cache_dir(theme)
+        temp_dir = cache_dir.with_name(cache_dir.name + '.tmp')
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        (temp_dir / 'fonts').mkdir(parents=True)
+        for icon_dir in QDir.searchPaths('icon'):
+            shutil.copytree(icon_dir, temp_dir / 'icons', dirs_exist_ok=True)
+        fonts_dir = Path(qt_material.__file__).parent / 'fonts'
+        for font in fonts_dir.rglob('*'):
+            if font.suffix.lower() in FONT_SUFFIXES:
+                shutil.copy2(font, temp_dir / 'fonts' / font.name)
+        (temp_dir / STYLESHEET_FILE_NAME).write_text(stylesheet, encoding='utf-8')
+        with open(temp_dir / MANIFEST_FILE_NAME, 'w', encoding='utf-8') as f:
+            json.dump({'theme': theme, 'qt_material': qt_material_version(),
+                       'format': CACHE_FORMAT, 'created': time.time()}, f, indent=2)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os.replace(temp_dir, cache_dir)
+        # Later loads point 'icon:' at the cached copy, so use it from now on too
+        self._set_search_paths(cache_dir)
+
+    @staticmethod
+    def _set_search_paths(cache_dir):
+        # The prefixes qt_material registers: 'icon:' for the rendered icons and
+        # 'qt_material:' for the resources shipped in its package
+        QDir.setSearchPaths('icon', [str(cache_dir / 'icons')])
+        resources = str(Path(qt_material.__file__).parent / 'resources')
+        if resources not in QDir.searchPaths('qt_material'):
+            # setSearchPaths() rejects prefixes with an underscore; addSearchPath() does not
+            QDir.addSearchPath('qt_material', resources)
+
+    def clear(self):
+        """Deletes every cached theme."""
+        shutil.rmtree(self.cache_root, ignore_errors=True)
@@ -0,0 +1,187 @@
+"""
+View Registry.
+
+Builds the main window's dock views lazily. Every view is registered as an
+empty QDockWidget "shell" that has the view's objectName, so
+`QMainWindow.restoreState` can place and show or hide it. The real view
+widget is only imported and constructed the first time its dock becomes
+visible. Views that are likely to be opened next are preloaded one per idle
+event-loop pass after the window is up.
+"""
+import importlib
+import sys
+import time
+from dataclasses import dataclass
+
+from PyQt6.QtCore import QByteArray, QObject, Qt, QTimer, pyqtSignal
+from PyQt6.QtWidgets import QDockWidget, QLabel
+
+from storyteller import config
+from storyteller import metrics
+
+Area = Qt.DockWidgetArea
+
+
+@dataclass
+class ViewSpec:
+    """Describes a dock view without building it."""
+    name: str # Also the dock's objectName, used by saveState/restoreState
+    title: str
+    factory: str # "module:Class"; imported on first build
+    area: Area = Area.LeftDockWidgetArea
+    visible: bool = False # Visible when there is no saved layout
+    preload: int = None # Idle preload order (lower first); None never preloads
+
+
+# The planned views (see gui/views/). Views whose module does not exist yet
+# show a placeholder.
+DEFAULT_VIEWS = (
+    ViewSpec('character_editor', "Characters", 'storyteller.gui.views.character_editor_view:CharacterEditorView',
+             Area.LeftDockWidgetArea, visible=True, preload=0),
+    ViewSpec('dialogue_tester', "Dialogue Tester", 'storyteller.gui.views.dialogue_tester_view:DialogueTesterView',
+             Area.RightDockWidgetArea, visible=True, preload=0),
+    ViewSpec('context_editor', "Context", 'storyteller.gui.views.context_editor_view:ContextEditorView',
+             Area.LeftDockWidgetArea, preload=1),
+    ViewSpec('dialogue_history', "History", 'storyteller.gui.views.dialogue_history_view:DialogueHistoryView',
+             Area.BottomDockWidgetArea, preload=2),
+    ViewSpec('relationship_editor', "Relationships",
+             'storyteller.gui.views.relationship_editor_view:RelationshipEditorView',
+             Area.LeftDockWidgetArea, preload=3),
+    ViewSpec('visualization', "Visualization", 'storyteller.gui.views.visualization_view:VisualizationView',
+             Area.BottomDockWidgetArea),
+    ViewSpec('settings', "Settings", 'storyteller.gui.views.settings_view:SettingsView',
+             Area.RightDockWidgetArea),
+)
+
+
+class PlaceholderView(QLabel):
+    """Stands in for views that are not implemented yet."""
+
+    def __init__(self, title, parent=None, note="coming soon"):
+        super().__init__(f"{title} ({note})", parent)
+        self.setAlignment(Qt.AlignmentFlag.AlignCenter)
+
+
+def resolve_factory(spec):
+    """Imports a view class from its "module:Class" path (None if the module is missing)."""
+    module_name, _, class_name = spec.factory.partition(':')
+    try:
+        module = importlib.import_module(module_name)
+    except ModuleNotFoundError as e:
+        if not (module_name == e.name or module_name.startswith(f"{e.name}.")):
+            raise # A dependency of the view is missing, not the view itself
+        return None
+    return getattr(module, class_name)
+
+
+class ViewRegistry(QObject):
+    """Creates dock shells up front and their contents on demand."""
+    view_built = pyqtSignal(str)
+
+    def __init__(self, window):
+        super().__init__(window)
+        self.window = window
+        self.specs = {}
+        self.docks = {}
+        self.views = {} # Built view widgets, by name
+        self._preload_queue = []
+        self._preload_timer = QTimer(self)
+        self._preload_timer.setInterval(0) # Fires once the event queue is empty
+        self._preload_timer.timeout.connect(self._preload_next)
+
+    def register(self, spec):
+        """Adds an (empty) dock for `spec` to the window."""
+        if spec.name in self.specs:
+            raise ValueError(f"View '{spec.name}' is already registered.")
+        dock = QDockWidget(spec.title, self.window)
+        dock.setObjectName(spec.name)
+        self.window.addDockWidget(spec.area, dock)
+        dock.setVisible(spec.visible)
+        dock.visibilityChanged.connect(lambda visible, name=spec.name: visible and self.ensure_built(name))
+        self.specs[spec.name] = spec
+        self.docks[spec.name] = dock
+        return dock
+
+    def is_built(self, name):
+        return name in self.views
+
+    def ensure_built(self, name):
+        """Builds the view for `name` if needed and returns it."""
+        view = self.views.get(name)
+        if view is not None:
+            return view
+        spec = self.specs[name]
+        dock = self.docks[name]
+        start = time.perf_counter()
+        # Builds usually run from a Qt signal, where an exception would abort the app
+        try:
+            view_cls = resolve_factory(spec)
+            view = view_cls(dock) if view_cls is not None else PlaceholderView(spec.title, dock)
+        except Exception as e:
+            print(f"Error: Could not build the '{name}' view: {e}", file=sys.stderr)
+            view = PlaceholderView(spec.title, dock, note="failed to load")
+        dock.setWidget(view)
+        self.views[name] = view
+        metrics.registry.observe('view_build', time.perf_counter() - start)
+        self.view_built.emit(name)
+        return view
+
+    def show_view(self, name):
+        dock = self.docks[name]
+        dock.show()
+        dock.raise_()
+        return self.ensure_built(name)
+
+    def toggle_actions(self):
+        """Checkable show/hide actions for a View menu (they do not build anything)."""
+        return [self.docks[name].toggleViewAction() for name in self.specs]
+
+    # --- Layout state ---
+
+    def save_layout(self):
+        """Stores window geometry and dock layout in the [Layout] config section."""
+        config.set_setting('Layout', 'geometry', bytes(self.window.saveGeometry().toBase64()).decode('ascii'))
+        config.set_setting('Layout', 'window_state', bytes(self.window.saveState().toBase64()).decode('ascii'))
+
+    def restore_layout(self):
+        """
+        Restores the saved layout. Only docks that end up visible get built,
+        since building is triggered by visibility.
+        """
+        restored = False
+        geometry = config.get_setting('Layout', 'geometry', '')
+        state = config.get_setting('Layout', 'window_state', '')
+        if geometry:
+            self.window.restoreGeometry(QByteArray.fromBase64(geometry.encode('ascii')))
+        if state:
+            restored = self.window.restoreState(QByteArray.fromBase64(state.encode('ascii')))
+        return restored
+
+    # --- Idle preloading ---
+
+    def start_preloading(self):
+        """Builds views marked for preloading, one per idle pass of the event loop."""
+        if not config.get_bool_setting('Layout', 'preload_views', True):
+            return
+        candidates = [s for s in self.specs.values() if s.preload is not None and not self.is_built(s.name)]
+        self._preload_queue = [s.name for s in sorted(candidates, key=lambda s: s.preload)]
+        if self._preload_queue:
+            self._preload_timer.start()
+
+    def stop_preloading(self):
+        self._preload_timer.stop()
+        self._preload_queue = []
+
+    def _preload_next(self):
+        while self._preload_queue:
+            name = self._preload_queue.pop(0)
+            if not self.is_built(name):
+                self.ensure_built(name)
+                break
+        if not self._preload_queue:
+            self._preload_timer.stop()
+
+    def build_all(self):
+        """Builds every view immediately (used to compare against lazy startup)."""
+        for name in self.specs:
+            self.ensure_built(name)
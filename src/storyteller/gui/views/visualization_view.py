@@ -0,0 +1,290 @@
+"""
+Relationship Graph View.
+
+Draws the relationship graph, filtered by relationship type and strength. The
+force-directed layout is computed in a `LayoutWorker` process (see
+core.graph_layout). A timer picks up the newest positions, so the GUI thread
+only paints. Painting is culled to the viewport, and detail is reduced as the
+view zooms out: nodes become points, labels are dropped, and edges are bundled
+once too many are visible.
+"""
+import math
+from array import array
+
+from PyQt6.QtCore import QCoreApplication, QLineF, QPointF, Qt, QTimer
+from PyQt6.QtGui import QColor, QPainter, QPen, QPolygonF
+from PyQt6.QtWidgets import QComboBox, QHBoxLayout, QLabel, QSlider, QVBoxLayout, QWidget
+
+from storyteller.core.graph_layout import (
+    LayoutWorker, RelationshipGraph, SpatialGrid, bundle_edges, detail_level
+)
+
+POLL_INTERVAL_MS = 33 # Roughly one position update per frame at 30 fps
+ALL_TYPES = "All types"
+ZOOM_STEP = 1.0015 # Zoom factor per wheel angle unit
+FIT_MARGIN = 0.9
+
+
+class GraphCanvas(QWidget):
+    """Paints the graph and handles pan (drag) and zoom (wheel). Double-click fits the graph."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.graph = RelationshipGraph()
+        self.positions = array('d')
+        self.edges = [] # Indices of the edges that pass the filter
+        self.scale = 1.0 # Pixels per layout unit
+        self.offset = QPointF(0.0, 0.0) # Screen position of the layout origin
+        self.drawn = (0, 0) # Nodes and edge strokes drawn by the last paint
+        self._fitted = False
+        self._grid = None
+        self._bundles = {} # Bundling cell size -> strokes
+        self._visible = None # (viewport, node indices) of the last paint
+        self._points = None # All nodes as a QPolygonF, reused while the whole graph is visible
+        self._drag_start = None
+        self.setMinimumSize(200, 150)
+
+    def set_graph(self, graph, positions):
+        self.graph = graph
+        self._fitted = False
+        self.edges = list(range(graph.edge_count))
+        self.set_positions(positions)
+
+    def set_positions(self, positions):
+        self.positions = positions
+        self._grid = self._visible = self._points = None
+        self._bundles.clear()
+        if not self._fitted and len(positions):
+            self.fit()
+        self.update()
+
+    def set_edges(self, edges):
+        self.edges = list(edges)
+        self._bundles.clear()
+        self.update()
+
+    def fit(self):
+        """Zooms and pans so the whole graph is visible."""
+        xs, ys = self.positions[0::2], self.positions[1::2]
+        if not xs or self.width() <= 0 or self.height() <= 0:
+            return
+        width = max(max(xs) - min(xs), 1.0)
+        height = max(max(ys) - min(ys), 1.0)
+        self.scale = FIT_MARGIN * min(self.width() / width, self.height() / height)
+        center_x, center_y = (max(xs) + min(xs)) / 2, (max(ys) + min(ys)) / 2
+        self.offset = QPointF(self.width() / 2 - center_x * self.scale, self.height() / 2 - center_y * self.scale)
+        self._fitted = True
+        self.update()
+
+    def to_layout(self, point):
+        return QPointF((point.x() - self.offset.x()) / self.scale, (point.y() - self.offset.y()) / self.scale)
+
+    def visible_nodes(self):
+        """Indices of the nodes inside the viewport (reused until the view or positions change)."""
+        viewport = (self.scale, self.offset.x(), self.offset.y(), self.width(), self.height())
+        if self._visible is None or self._visible[0] != viewport:
+            if self._grid is None:
+                self._grid = SpatialGrid(self.positions)
+            top_left = self.to_layout(QPointF(0, 0))
+            bottom_right = self.to_layout(QPointF(self.width(), self.height()))
+            self._visible = (viewport, self._grid.query(top_left.x(), top_left.y(),
+                                                        bottom_right.x(), bottom_right.y()))
+        return self._visible[1]
+
+    def _bundled(self, cell_size):
+        strokes = self._bundles.get(cell_size)
+        if strokes is None:
+            strokes = self._bundles[cell_size] = bundle_edges(
+                self.positions, self.graph.sources, self.graph.targets, cell_size, self.edges)
+        return strokes
+
+    # --- Painting ---
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self.palette().base())
+        if not len(self.positions):
+            painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, "No relationships to show")
+            return
+        positions = self.positions
+        sources, targets = self.graph.sources, self.graph.targets
+        visible = self.visible_nodes()
+        shown = bytearray(len(self.graph))
+        for i in visible:
+            shown[i] = 1
+        edges = [e for e in self.edges if shown[sources[e]] or shown[targets[e]]]
+        level = detail_level(self.scale, len(visible), len(edges))
+
+        painter.translate(self.offset)
+        painter.scale(self.scale, self.scale)
+        edge_color = QColor(self.palette().text().color())
+        edge_color.setAlpha(90)
+        if level.bundle_cell:
+            strokes = self._draw_bundles(painter, edge_color, level.bundle_cell)
+        else:
+            pen = QPen(edge_color, 1)
+            pen.setCosmetic(True) # Widths in pixels, whatever the zoom
+            painter.setPen(pen)
+            painter.drawLines([QLineF(positions[2 * sources[e]], positions[2 * sources[e] + 1],
+                                      positions[2 * targets[e]], positions[2 * targets[e] + 1]) for e in edges])
+            strokes = len(edges)
+        # Antialiasing is only worth its cost for circles, never for thousands of edges
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing, level.node_radius > 0)
+        self._draw_nodes(painter, visible, level)
+        if level.labels:
+            painter.resetTransform()
+            painter.setPen(self.palette().text().color())
+            for i in visible:
+                x = positions[2 * i] * self.scale + self.offset.x()
+                y = positions[2 * i + 1] * self.scale + self.offset.y()
+                painter.drawText(QPointF(x + level.node_radius + 2, y + 4), self.graph.labels[i])
+        self.drawn = (len(visible), strokes)
+
+    def _draw_bundles(self, painter, color, cell_size):
+        # One pen per width step; bundle width grows with the log of its edge count
+        by_width = {}
+        for x1, y1, x2, y2, count in self._bundled(cell_size):
+            by_width.setdefault(1 + int(math.log2(count)), []).append(QLineF(x1, y1, x2, y2))
+        for width, lines in by_width.items():
+            pen = QPen(color, width)
+            pen.setCosmetic(True)
+            painter.setPen(pen)
+            painter.drawLines(lines)
+        return sum(len(lines) for lines in by_width.values())
+
+    def _draw_nodes(self, painter, visible, level):
+        # One drawPoints call; a round pen as wide as the node draws circles
+        if len(visible) == len(self.graph):
+            if self._points is None:
+                self._points = self._polygon(visible)
+            points = self._points
+        else:
+            points = self._polygon(visible)
+        pen = QPen(self.palette().highlight().color(), max(2.0, 2 * level.node_radius))
+        pen.setCapStyle(Qt.PenCapStyle.RoundCap if level.node_radius else Qt.PenCapStyle.SquareCap)
+        pen.setCosmetic(True)
+        painter.setPen(pen)
+        painter.drawPoints(points)
+
+    def _polygon(self, nodes):
+        positions = self.positions
+        return QPolygonF([QPointF(positions[2 * i], positions[2 * i + 1]) for i in nodes])
+
+    # --- Pan and zoom ---
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if not self._fitted:
+            self.fit()
+
+    def wheelEvent(self, event):
+        factor = ZOOM_STEP ** event.angleDelta().y()
+        cursor = event.position()
+        # Keep the point under the cursor in place
+        self.offset = cursor - (cursor - self.offset) * factor
+        self.scale *= factor
+        self.update()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self._drag_start = event.position() - self.offset
+
+    def mouseMoveEvent(self, event):
+        if self._drag_start is not None:
+            self.offset = event.position() - self._drag_start
+            self.update()
+
+    def mouseReleaseEvent(self, event):
+        self._drag_start = None
+
+    def mouseDoubleClickEvent(self, event):
+        self.fit()
+
+
+class VisualizationView(QWidget):
+    """Interactive relationship graph with type and strength filters."""
+
+    def __init__(self, parent=None, worker=None):
+        super().__init__(parent)
+        self.graph = RelationshipGraph()
+        self.worker = worker or LayoutWorker()
+        self.type_filter = QComboBox(self)
+        self.type_filter.addItem(ALL_TYPES)
+        self.type_filter.currentTextChanged.connect(self.apply_filters)
+        self.strength_filter = QSlider(Qt.Orientation.Horizontal, self)
+        self.strength_filter.setRange(0, 100) # Minimum |relationship_quality|, in percent
+        self.strength_filter.valueChanged.connect(self.apply_filters)
+        self.status = QLabel(self)
+        self.canvas = GraphCanvas(self)
+
+        filters = QHBoxLayout()
+        filters.addWidget(QLabel("Type:", self))
+        filters.addWidget(self.type_filter)
+        filters.addWidget(QLabel("Min strength:", self))
+        filters.addWidget(self.strength_filter)
+        filters.addWidget(self.status, 1)
+        layout = QVBoxLayout(self)
+        layout.addLayout(filters)
+        layout.addWidget(self.canvas, 1)
+
+        self._layout_timer = QTimer(self)
+        self._layout_timer.setInterval(POLL_INTERVAL_MS)
+        self._layout_timer.timeout.connect(self._poll_layout)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.worker.stop)
+
+    def load_store(self, store):
+        self.set_graph(RelationshipGraph.from_store(store))
+
+    def set_graph(self, graph):
+        """
+        Shows `graph`. Characters that were already shown keep their positions
+        while the worker updates the layout incrementally.
+        """
+        old = self.canvas.positions
+        known = {node_id: (old[2 * i], old[2 * i + 1]) for i, node_id in enumerate(self.graph.node_ids)}
+        positions = array('d', bytes(16 * len(graph)))
+        for i, node_id in enumerate(graph.node_ids):
+            positions[2 * i], positions[2 * i + 1] = known.get(node_id, (0.0, 0.0))
+        self.graph = graph
+        self.canvas.set_graph(graph, positions if known else array('d'))
+
+        current = self.type_filter.currentText()
+        self.type_filter.blockSignals(True)
+        self.type_filter.clear()
+        self.type_filter.addItems([ALL_TYPES] + sorted({kind for kind in graph.types if kind}))
+        self.type_filter.setCurrentText(current)
+        self.type_filter.blockSignals(False)
+        self.apply_filters()
+
+        if len(graph):
+            self.worker.set_graph(graph.node_ids, graph.sources, graph.targets, graph.weights())
+            self._layout_timer.start()
+
+    def apply_filters(self):
+        """Shows only the edges matching the type and strength filters (no relayout)."""
+        kind = self.type_filter.currentText()
+        minimum = self.strength_filter.value() / 100
+        graph = self.graph
+        self.canvas.set_edges(e for e in range(graph.edge_count)
+                              if (kind == ALL_TYPES or graph.types[e] == kind) and abs(graph.strengths[e]) >= minimum)
+        self._update_status()
+
+    def _poll_layout(self):
+        frame = self.worker.poll()
+        if frame is None:
+            if not self.worker.running:
+                self._layout_timer.stop()
+                self.status.setText("Layout stopped unexpectedly")
+            return
+        self.canvas.set_positions(frame.positions)
+        if frame.converged:
+            self._layout_timer.stop()
+        self._update_status(frame)
+
+    def _update_status(self, frame=None):
+        text = f"{len(self.graph)} characters, {len(self.canvas.edges)} of {self.graph.edge_count} relationships"
+        if frame is not None and not frame.converged:
+            text += f" (laying out, iteration {frame.iterations})"
+        self.status.setText(text)
@@ -8,7 +8,7 @@ class WelcomeDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Welcome to StoryTeller")
-        self.setModal(True)
+        self.setModal(False) # Never block the main window's first interaction
 
         layout = QVBoxLayout(self)
 
@@ -42,8 +42,11 @@ class WelcomeDialog(QDialog):
 
     @staticmethod
     def show_welcome_if_needed(parent):
-        """Checks config and shows the dialog if required."""
+        """Checks config and shows the dialog (non-modally) if required. Returns it, or None."""
         if config.get_bool_setting('General', 'show_welcome_on_startup', True):
             dialog = WelcomeDialog(parent)
-            dialog.exec()
+            dialog.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+            dialog.show()
+            return dialog
+        return None
 
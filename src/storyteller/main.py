@@ -1,36 +1,65 @@
+import multiprocessing
 import sys
 import subprocess
 from pathlib import Path
 import click
 import importlib.metadata
+import json
 
 # --- Project Imports ---
 # Import constants and paths
 from . import const
 from . import paths
+from . import metrics
 
 # --- GUI Imports ---
-try:
-    from storyteller.gui.main_window import MainWindow
-    from PyQt6.QtWidgets import QApplication
-    
-    # Make qt_material optional
+# The GUI stack is imported on first use so headless commands (serve, stats,
+# build) never load PyQt6. _GUI_NOT_LOADED marks names not yet resolved.
+_GUI_NOT_LOADED = object()
+MainWindow = _GUI_NOT_LOADED
+QApplication = _GUI_NOT_LOADED
+qt_material = None
+qt_material_available = False
+ThemeManager = None
+
+def _load_gui():
+    """Imports the GUI components (once) and binds them to module globals."""
+    global MainWindow, QApplication, qt_material, qt_material_available, ThemeManager
+    if MainWindow is not _GUI_NOT_LOADED and QApplication is not _GUI_NOT_LOADED:
+        return
     try:
-        import qt_material # type: ignore
-        qt_material_available = True
-    except ImportError:
-        qt_material = None
-        qt_material_available = False
-        print("Warning: qt-material package not found. Using default PyQt styling.", file=sys.stderr)
-except ImportError as e:
-    # Print the original error for better debugging
-    print(f"Warning: Could not import GUI components. GUI functionality might be limited. Error: {e}", file=sys.stderr)
-    MainWindow = None
-    QApplication = None
-    qt_material = None
-    qt_material_available = False
-
-@click.group(invoke_without_command=True)
+        from storyteller.gui.main_window import MainWindow as main_window_cls
+        from PyQt6.QtWidgets import QApplication as application_cls
+        if MainWindow is _GUI_NOT_LOADED:
+            MainWindow = main_window_cls
+        if QApplication is _GUI_NOT_LOADED:
+            QApplication = application_cls
+
+        # qt_material is optional; the theme module handles its absence
+        from storyteller.gui import theme as theme_module
+        ThemeManager = theme_module.ThemeManager
+        qt_material = theme_module.qt_material
+        qt_material_available = theme_module.qt_material_available
+        if not qt_material_available:
+            print("Warning: qt-material package not found. Using default PyQt styling.", file=sys.stderr)
+    except ImportError as e:
+        # Print the original error for better debugging
+        print(f"Warning: Could not import GUI components. GUI functionality might be limited. Error: {e}", file=sys.stderr)
+        if MainWindow is _GUI_NOT_LOADED:
+            MainWindow = None
+        if QApplication is _GUI_NOT_LOADED:
+            QApplication = None
+
+class StoryTellerGroup(click.Group):
+    """The CLI group; lets frozen builds start multiprocessing workers."""
+
+    def main(self, *args, **kwargs):
+        # In a frozen build, a spawned worker (e.g. the graph layout process) runs
+        # its task here instead of parsing its arguments and starting the app again
+        multiprocessing.freeze_support()
+        return super().main(*args, **kwargs)
+
+@click.group(cls=StoryTellerGroup, invoke_without_command=True)
 @click.version_option(package_name='storyteller')
 @click.pass_context
 def cli(ctx):
@@ -39,8 +68,11 @@ def cli(ctx):
 
     Run without arguments or with the 'run' command to launch the GUI.
     Use the 'build' command to create a distributable package.
+    Use the 'serve' command to run the headless dialogue server.
+    Use the 'stats' command to inspect recorded pipeline metrics.
     """
     if ctx.invoked_subcommand is None:
+        _load_gui()
         if MainWindow is None or QApplication is None:
             click.echo("Error: Cannot run GUI, GUI components failed to load.", err=True)
             if 'build' not in sys.argv:
@@ -49,27 +81,46 @@ def cli(ctx):
             ctx.invoke(run)
 
 @cli.command()
-def run():
+@click.option('--timing', is_flag=True, help="Print a startup timing report once the main window has painted.")
+def run(timing=False):
     """Launches the StoryTeller GUI application."""
+    timer = metrics.StartupTimer()
+    _load_gui()
     if MainWindow is None or QApplication is None:
         click.echo("Error: Cannot run GUI, GUI components failed to load.", err=True)
         return
-    
+    timer.mark('gui_import')
+
     # We can still run the app without qt_material
 
     click.echo("Launching StoryTeller GUI...")
     app = QApplication(sys.argv)
+    timer.mark('qapplication')
 
-    # Apply the qt-material theme only if available
-    if qt_material_available:
+    # Apply the qt-material theme only if available (compiled once, then loaded from the cache)
+    theme_note = 'default style'
+    if qt_material_available and ThemeManager is not None:
         try:
-            qt_material.apply_stylesheet(app, theme='dark_blue.xml')  # Choose a dark theme
+            theme_manager = ThemeManager()
+            theme_manager.apply(app)
+            theme_note = theme_manager.source
         except Exception as e:
             click.echo(f"Warning: Failed to apply qt-material theme. Using default style. Error: {e}", err=True)
     else:
         click.echo("Using default PyQt style (qt-material not installed).")
+    timer.mark('theme', theme_note)
 
     main_window = MainWindow()
+    timer.mark('main_window')
+
+    def report_first_paint():
+        timer.mark('first_paint')
+        metrics.registry.observe('startup_first_paint', timer.total())
+        if timing:
+            click.echo(timer.report())
+            click.echo(f"Time to first paint: {timer.total() * 1000:.1f} ms")
+
+    main_window.on_first_paint = report_first_paint
     main_window.show()
     sys.exit(app.exec())
 
@@ -129,5 +180,65 @@ def build():
         click.echo(f"An unexpected error occurred during build: {e}", err=True)
         sys.exit(1)
 
+@cli.command()
+@click.option('--host', default=None, help="Interface to bind (default from config).")
+@click.option('--port', type=int, default=None, help="Port to listen on (default from config).")
+@click.option('--max-client-concurrency', type=int, default=None,
+              help="Maximum in-progress requests per client (default from config).")
+def serve(host, port, max_client_concurrency):
+    """Runs the headless HTTP/WebSocket dialogue server."""
+    # Imported here so the GUI entry points never pay for the server
+    from . import server
+    server.run_server(host, port, max_client_concurrency)
+
+@cli.command()
+@click.option('--format', 'output_format', type=click.Choice(['table', 'json', 'prometheus']),
+              default='table', show_default=True, help="Output format.")
+@click.option('--reset', is_flag=True, help="Delete the recorded metrics after printing them.")
+def stats(output_format, reset):
+    """Shows recorded dialogue pipeline metrics."""
+    metrics_file = paths.get_metrics_file_path()
+    snapshot = metrics.load_snapshot(metrics_file)
+    if not snapshot:
+        click.echo("No metrics recorded yet.")
+        click.echo(f"Enable them with 'enabled = true' in the [Metrics] section of {paths.get_config_file_path()}")
+        return
+
+    if output_format == 'json':
+        click.echo(json.dumps(snapshot, indent=2))
+    elif output_format == 'prometheus':
+        click.echo(metrics.render_prometheus(snapshot), nl=False)
+    else:
+        registry = metrics.MetricsRegistry(enabled=True)
+        registry.merge(snapshot)
+
+        click.echo(f"{'Stage':<20}{'Count':>8}{'Mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        # Canonical stages first, then anything else that was recorded
+        stage_names = [s for s in metrics.PIPELINE_STAGES if s in registry.histograms]
+        stage_names += sorted(set(registry.histograms) - set(stage_names))
+        for stage in stage_names:
+            histogram = registry.histograms[stage]
+            click.echo(f"{stage:<20}{histogram.count:>8}{histogram.mean() * 1000:>10.1f}"
+                       f"{histogram.quantile(0.5) * 1000:>10.1f}{histogram.quantile(0.99) * 1000:>10.1f}")
+
+        if registry.counters:
+            click.echo("\nEvents:")
+            for name, value in sorted(registry.counters.items()):
+                click.echo(f"  {name:<30}{value:>10}")
+
+        click.echo(f"\nGenerated tokens: {registry.generated_tokens} "
+                   f"({registry.tokens_per_second():.1f} tokens/s)")
+
+        if registry.caches:
+            click.echo("\nCache hit rates:")
+            for name in sorted(registry.caches):
+                hits, misses = registry.caches[name]
+                click.echo(f"  {name:<30}{registry.cache_hit_rate(name):>9.1%}  ({hits} hits, {misses} misses)")
+
+    if reset:
+        metrics_file.unlink(missing_ok=True)
+        click.echo("Metrics reset.", err=True)
+
 if __name__ == "__main__":
+    multiprocessing.freeze_support() # Must run first in the PyInstaller entry script
     cli()
@@ -0,0 +1,330 @@
+"""
+Lightweight instrumentation for the Dialogue Generation Pipeline.
+
+Records per-stage latency histograms, retry/regeneration counters, generation
+throughput and cache hit rates. When metrics are disabled every recording call
+returns immediately, so spans can stay in hot paths permanently.
+"""
+import atexit
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+from . import config
+from . import paths
+
+# The eight stages of the Dialogue Generation Pipeline, in execution order
+PIPELINE_STAGES = (
+    'input_processing',
+    'data_retrieval',
+    'prompt_building',
+    'model_config',
+    'generation',
+    'post_processing',
+    'quality_assurance',
+    'finalization',
+)
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implicit
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (non-cumulative counts per bucket)."""
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # Last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Adds a single observation."""
+        index = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            index += 1
+        self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimates the q-quantile by interpolating within the matching bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for index, bucket_count in enumerate(self.counts):
+            upper = self.buckets[index] if index < len(self.buckets) else lower
+            if bucket_count and seen + bucket_count >= rank:
+                return lower + (upper - lower) * ((rank - seen) / bucket_count)
+            seen += bucket_count
+            lower = upper
+        return lower
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def to_dict(self):
+        return {'buckets': list(self.buckets), 'counts': list(self.counts),
+                'sum': self.total, 'count': self.count}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data['buckets'])
+        histogram.counts = list(data['counts'])
+        histogram.total = data['sum']
+        histogram.count = data['count']
+        return histogram
+
+
+class _NullSpan:
+    """Span returned while metrics are disabled; does nothing."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """Times one pipeline stage and records it on exit."""
+    __slots__ = ('registry', 'stage', 'start')
+
+    def __init__(self, registry, stage):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.stage, time.perf_counter() - self.start)
+        if exc_type is not None:
+            self.registry.increment(f'{self.stage}_errors')
+        return False # Never swallow exceptions
+
+
+class MetricsRegistry:
+    """Collects pipeline metrics in memory and exports them as JSON or Prometheus text."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clears all recorded values."""
+        self.histograms = {}
+        self.counters = {}
+        self.caches = {} # cache name -> [hits, misses]
+        self.generated_tokens = 0
+        self.generation_seconds = 0.0
+
+    # --- Recording ---
+
+    def span(self, stage):
+        """Returns a context manager timing `stage` (a no-op when disabled)."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage)
+
+    def observe(self, stage, seconds):
+        """Records a latency observation for a stage."""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, name, amount=1):
+        """Increments a named counter (e.g. 'retries', 'regenerations')."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_tokens(self, tokens, seconds):
+        """Records generated tokens and the time spent generating them."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.generated_tokens += tokens
+            self.generation_seconds += seconds
+
+    def record_cache(self, cache, hit):
+        """Records a hit or miss for the named cache."""
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self.caches.setdefault(cache, [0, 0])
+            stats[0 if hit else 1] += 1
+
+    # --- Derived values ---
+
+    def tokens_per_second(self):
+        if not self.generation_seconds:
+            return 0.0
+        return self.generated_tokens / self.generation_seconds
+
+    def cache_hit_rate(self, cache):
+        hits, misses = self.caches.get(cache, (0, 0))
+        total = hits + misses
+        return hits / total if total else 0.0
+
+    # --- Export ---
+
+    def snapshot(self):
+        """Returns all metrics as a JSON-serializable dictionary."""
+        with self._lock:
+            return {
+                'updated_at': time.time(),
+                'stages': {name: h.to_dict() for name, h in self.histograms.items()},
+                'counters': dict(self.counters),
+                'generated_tokens': self.generated_tokens,
+                'generation_seconds': self.generation_seconds,
+                'caches': {name: {'hits': s[0], 'misses': s[1]} for name, s in self.caches.items()},
+            }
+
+    def merge(self, snapshot):
+        """Adds the values of a previously exported snapshot to this registry."""
+        with self._lock:
+            for name, data in snapshot.get('stages', {}).items():
+                incoming = Histogram.from_dict(data)
+                histogram = self.histograms.get(name)
+                if histogram is None or histogram.buckets != incoming.buckets:
+                    self.histograms[name] = incoming
+                    continue
+                histogram.counts = [a + b for a, b in zip(histogram.counts, incoming.counts)]
+                histogram.total += incoming.total
+                histogram.count += incoming.count
+            for name, value in snapshot.get('counters', {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            self.generated_tokens += snapshot.get('generated_tokens', 0)
+            self.generation_seconds += snapshot.get('generation_seconds', 0.0)
+            for name, data in snapshot.get('caches', {}).items():
+                stats = self.caches.setdefault(name, [0, 0])
+                stats[0] += data['hits']
+                stats[1] += data['misses']
+
+    def write_json(self, path=None):
+        """Writes the metrics to `path` (defaults to the user data metrics file)."""
+        path = Path(path) if path is not None else paths.get_metrics_file_path()
+        try:
+            with open(path, 'w') as metrics_file:
+                json.dump(self.snapshot(), metrics_file, indent=2)
+        except IOError as e:
+            print(f"Error saving metrics to {path}: {e}", file=sys.stderr)
+
+    def flush(self, path=None):
+        """Accumulates this session's metrics into the metrics file and resets."""
+        if not self.enabled or not (self.histograms or self.counters or self.caches):
+            return
+        path = Path(path) if path is not None else paths.get_metrics_file_path()
+        session = self.snapshot()
+        self.reset()
+        self.merge(load_snapshot(path))
+        self.merge(session)
+        self.write_json(path)
+        self.reset()
+
+    def to_prometheus(self):
+        return render_prometheus(self.snapshot())
+
+
+class StartupTimer:
+    """Records named startup phases (e.g. for time-to-first-paint reports)."""
+
+    def __init__(self):
+        self.start = self._last = time.perf_counter()
+        self.phases = [] # (name, phase seconds, seconds since start, note)
+
+    def mark(self, name, note=''):
+        """Ends the current phase as `name`."""
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last, now - self.start, note))
+        self._last = now
+
+    def total(self):
+        return self.phases[-1][2] if self.phases else 0.0
+
+    def report(self):
+        lines = [f"{'Phase':<16}{'ms':>10}{'total ms':>10}"]
+        for name, seconds, elapsed, note in self.phases:
+            suffix = f"  ({note})" if note else ''
+            lines.append(f"{name:<16}{seconds * 1000:>10.1f}{elapsed * 1000:>10.1f}{suffix}")
+        return '\n'.join(lines)
+
+
+def load_snapshot(path=None):
+    """Loads a metrics snapshot written by `MetricsRegistry.write_json`."""
+    path = Path(path) if path is not None else paths.get_metrics_file_path()
+    if not path.exists():
+        return {}
+    try:
+        with open(path) as metrics_file:
+            return json.load(metrics_file)
+    except (IOError, ValueError) as e:
+        print(f"Error reading metrics from {path}: {e}", file=sys.stderr)
+        return {}
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(snapshot):
+    """Renders a snapshot in the Prometheus text exposition format."""
+    lines = [
+        '# HELP storyteller_stage_duration_seconds Dialogue pipeline stage latency.',
+        '# TYPE storyteller_stage_duration_seconds histogram',
+    ]
+    for stage, data in sorted(snapshot.get('stages', {}).items()):
+        cumulative = 0
+        bounds = [_format_value(float(b)) for b in data['buckets']] + ['+Inf']
+        for bound, count in zip(bounds, data['counts']):
+            cumulative += count
+            lines.append(f'storyteller_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'storyteller_stage_duration_seconds_sum{{stage="{stage}"}} {_format_value(float(data["sum"]))}')
+        lines.append(f'storyteller_stage_duration_seconds_count{{stage="{stage}"}} {data["count"]}')
+
+    lines += ['# HELP storyteller_events_total Pipeline events such as retries and regenerations.',
+              '# TYPE storyteller_events_total counter']
+    for name, value in sorted(snapshot.get('counters', {}).items()):
+        lines.append(f'storyteller_events_total{{event="{name}"}} {_format_value(value)}')
+
+    tokens = snapshot.get('generated_tokens', 0)
+    seconds = snapshot.get('generation_seconds', 0.0)
+    lines += ['# TYPE storyteller_generated_tokens_total counter',
+              f'storyteller_generated_tokens_total {tokens}',
+              '# TYPE storyteller_generation_seconds_total counter',
+              f'storyteller_generation_seconds_total {_format_value(float(seconds))}',
+              '# TYPE storyteller_tokens_per_second gauge',
+              f'storyteller_tokens_per_second {_format_value(tokens / seconds if seconds else 0.0)}']
+
+    lines += ['# HELP storyteller_cache_requests_total Cache lookups by result.',
+              '# TYPE storyteller_cache_requests_total counter']
+    for name, data in sorted(snapshot.get('caches', {}).items()):
+        lines.append(f'storyteller_cache_requests_total{{cache="{name}",result="hit"}} {data["hits"]}')
+        lines.append(f'storyteller_cache_requests_total{{cache="{name}",result="miss"}} {data["misses"]}')
+    return '\n'.join(lines) + '\n'
+
+
+# Shared registry used by the pipeline; enabled through [Metrics] enabled = true
+registry = MetricsRegistry(enabled=config.get_bool_setting('Metrics', 'enabled', False))
+
+# Persist whatever the session recorded when the interpreter exits
+atexit.register(registry.flush)
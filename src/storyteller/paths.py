@@ -32,6 +32,44 @@ def get_config_file_path() -> Path:
     """Gets the full path to the configuration file."""
     return get_config_dir() / const.CONFIG_FILE_NAME
 
+def get_data_dir() -> Path:
+    """Gets the application's user data directory (metrics, recent files, etc.)."""
+    if os.name == 'nt': # Windows
+        path = Path(os.getenv('LOCALAPPDATA', Path.home() / 'AppData' / 'Local')) / const.APP_NAME
+    else: # Linux/macOS (using XDG Base Directory Specification fallback)
+        xdg_data_home = os.getenv('XDG_DATA_HOME')
+        if xdg_data_home:
+            path = Path(xdg_data_home) / const.APP_NAME
+        else:
+            path = Path.home() / '.local' / 'share' / const.APP_NAME
+
+    # Ensure the directory exists
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+def get_cache_dir() -> Path:
+    """Gets the application's cache directory (compiled themes, etc.). Safe to delete."""
+    if os.name == 'nt': # Windows
+        path = Path(os.getenv('LOCALAPPDATA', Path.home() / 'AppData' / 'Local')) / const.APP_NAME / 'Cache'
+    else: # Linux/macOS (using XDG Base Directory Specification fallback)
+        xdg_cache_home = os.getenv('XDG_CACHE_HOME')
+        if xdg_cache_home:
+            path = Path(xdg_cache_home) / const.APP_NAME
+        else:
+            path = Path.home() / '.cache' / const.APP_NAME
+
+    # Ensure the directory exists
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+def get_metrics_file_path() -> Path:
+    """Gets the full path to the exported pipeline metrics file."""
+    return get_data_dir() / const.METRICS_FILE_NAME
+
+def get_model_stats_file_path() -> Path:
+    """Gets the full path to the per-model latency and quality statistics file."""
+    return get_data_dir() / const.MODEL_STATS_FILE_NAME
+
 def get_main_script_path() -> Path:
     """Gets the path to the main entry point script (main.py)."""
     # This assumes main.py is in the same directory as paths.py
@@ -0,0 +1,411 @@
+"""
+Headless dialogue server for game-engine integration.
+
+A small asyncio HTTP/1.1 + WebSocket server built on the standard library. It
+never imports PyQt6, so it can run on build agents and game servers.
+
+Endpoints:
+    GET  /health     -> {"status": "ok"}
+    GET  /metrics    -> pipeline metrics in Prometheus text format
+    POST /dialogue   -> JSON DialogueRequest in, JSON DialogueResponse out
+    GET  /ws         -> WebSocket; each JSON request message is answered with
+                        {"type": "token"} messages followed by "done" or "error".
+                        A {"type": "reset"} message means the tokens sent so far
+                        were discarded (retry or QA regeneration).
+
+Identical in-flight requests are coalesced into one generation, each client
+(X-Client-Id header, or peer address) has a concurrency limit, and requests
+carrying a deadline (deadline_ms field or X-Deadline-Ms header) are cancelled
+when it passes.
+"""
+import asyncio
+import base64
+import dataclasses
+import hashlib
+import json
+import math
+import struct
+import sys
+from http import HTTPStatus
+
+from . import config
+from .core.dialogue_manager import (
+    DialogueGenerationError, DialogueManager, DialogueRequest, DialogueRequestError
+)
+from .ai.ollama_integration import OllamaError
+from .metrics import registry as metrics
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+MAX_BODY_BYTES = 1024 * 1024
+
+REQUEST_FIELDS = {f.name for f in dataclasses.fields(DialogueRequest)}
+RESET = object() # Queued when the streamed tokens are discarded
+
+
+class HTTPError(Exception):
+    """Raised inside a handler to answer with an error status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def parse_deadline(value):
+    """Reads a deadline in milliseconds (number or numeric string); None if absent."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Deadline must be a number of milliseconds.")
+    try:
+        deadline_ms = float(value)
+    except (TypeError, ValueError):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Deadline must be a number of milliseconds.")
+    if not math.isfinite(deadline_ms) or deadline_ms <= 0:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Deadline must be a positive number of milliseconds.")
+    return deadline_ms
+
+
+def parse_dialogue_request(data):
+    """Builds a (DialogueRequest, deadline_ms) pair from a decoded JSON object."""
+    if not isinstance(data, dict):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object.")
+    fields = {k: v for k, v in data.items() if k in REQUEST_FIELDS}
+    fields['deadline_ms'] = deadline_ms = parse_deadline(data.get('deadline_ms'))
+    if not isinstance(fields.get('params', {}), dict):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "'params' must be a JSON object.")
+    if 'listener_ids' in fields:
+        listener_ids = fields['listener_ids']
+        if not isinstance(listener_ids, (list, tuple)) or not all(isinstance(i, str) for i in listener_ids):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'listener_ids' must be a list of character ids.")
+        fields['listener_ids'] = tuple(listener_ids)
+    try:
+        return DialogueRequest(**fields), deadline_ms
+    except TypeError as e:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid dialogue request: {e}")
+
+
+class RequestCoalescer:
+    """
+    Shares one generation between identical in-flight requests.
+
+    The shared task is cancelled only once every waiter has given up, so one
+    client's deadline never cancels work another client is still waiting for.
+    """
+
+    def __init__(self):
+        self._inflight = {} # key -> [task, waiter count]
+
+    def __len__(self):
+        return len(self._inflight)
+
+    def _forget(self, key, task):
+        # A cancelled task's callback runs late; keep the entry if a newer task replaced it
+        entry = self._inflight.get(key)
+        if entry is not None and entry[0] is task:
+            del self._inflight[key]
+
+    async def run(self, key, factory, timeout=None):
+        entry = self._inflight.get(key)
+        if entry is None or entry[0].cancelled():
+            task = asyncio.ensure_future(factory())
+            entry = self._inflight[key] = [task, 0]
+            task.add_done_callback(lambda task, key=key: self._forget(key, task))
+        else:
+            metrics.increment('coalesced_requests')
+        entry[1] += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(entry[0]), timeout)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not entry[0].done():
+                entry[0].cancel()
+
+
+class DialogueServer:
+    """Serves the dialogue pipeline over HTTP and WebSocket."""
+
+    def __init__(self, manager=None, host=None, port=None, max_client_concurrency=None):
+        self.manager = manager or DialogueManager()
+        self.host = host or config.get_setting('Server', 'host')
+        self.port = int(port if port is not None else config.get_setting('Server', 'port'))
+        self.max_client_concurrency = int(max_client_concurrency or config.get_setting('Server', 'max_client_concurrency'))
+        self.coalescer = RequestCoalescer()
+        self._client_slots = {} # client id -> requests in progress
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        # Pick up the real port when started with port 0
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    # --- Per-client admission ---
+
+    def _acquire(self, client_id):
+        in_progress = self._client_slots.get(client_id, 0)
+        if in_progress >= self.max_client_concurrency:
+            metrics.increment('rejected_requests')
+            raise HTTPError(HTTPStatus.TOO_MANY_REQUESTS,
+                            f"Client '{client_id}' already has {in_progress} requests in progress.")
+        self._client_slots[client_id] = in_progress + 1
+
+    def _release(self, client_id):
+        remaining = self._client_slots[client_id] - 1
+        if remaining:
+            self._client_slots[client_id] = remaining
+        else:
+            del self._client_slots[client_id]
+
+    # --- Dialogue execution ---
+
+    async def generate(self, client_id, request, deadline_ms=None):
+        """Runs one request under the client's limit, coalesced and deadline-bound."""
+        if deadline_ms and request.deadline_ms is None:
+            # Let the model router plan for the deadline as well
+            request = dataclasses.replace(request, deadline_ms=deadline_ms)
+        self._acquire(client_id)
+        try:
+            timeout = deadline_ms / 1000 if deadline_ms else None
+            return await self.coalescer.run(
+                request.cache_key(), lambda: self.manager.generate_dialogue(request), timeout)
+        except asyncio.TimeoutError:
+            metrics.increment('deadline_exceeded')
+            raise HTTPError(HTTPStatus.GATEWAY_TIMEOUT, f"Deadline of {deadline_ms} ms exceeded.")
+        except DialogueRequestError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(e))
+        except DialogueGenerationError as e:
+            raise HTTPError(HTTPStatus.UNPROCESSABLE_ENTITY, str(e))
+        except OllamaError as e:
+            raise HTTPError(HTTPStatus.BAD_GATEWAY, str(e))
+        finally:
+            self._release(client_id)
+
+    # --- HTTP ---
+
+    async def _handle_connection(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        peer_id = peer[0] if peer else 'unknown'
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._send_json(writer, HTTPStatus.BAD_REQUEST, {'error': "Malformed request line."})
+                    break
+                headers = await self._read_headers(reader)
+                client_id = headers.get('x-client-id', peer_id)
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+
+                if target == '/ws' and headers.get('upgrade', '').lower() == 'websocket':
+                    await self._handle_websocket(reader, writer, headers, client_id)
+                    break
+
+                body = b''
+                try:
+                    length = int(headers.get('content-length', 0) or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._send_json(writer, HTTPStatus.BAD_REQUEST, {'error': "Invalid Content-Length."})
+                    break
+                if length > MAX_BODY_BYTES:
+                    await self._send_json(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': "Body too large."})
+                    break
+                if length:
+                    body = await reader.readexactly(length)
+
+                try:
+                    status, payload, content_type = await self._route(method, target, headers, body, client_id)
+                except HTTPError as e:
+                    status, payload, content_type = e.status, {'error': e.message}, None
+                except Exception as e:
+                    print(f"Error handling {method} {target}: {e!r}", file=sys.stderr)
+                    status, content_type = HTTPStatus.INTERNAL_SERVER_ERROR, None
+                    payload = {'error': "Internal server error."}
+                if content_type is None:
+                    await self._send_json(writer, status, payload, keep_alive)
+                else:
+                    await self._send(writer, status, payload.encode('utf-8'), content_type, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_headers(self, reader):
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                return headers
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+    async def _route(self, method, target, headers, body, client_id):
+        path = target.split('?', 1)[0]
+        if path == '/health' and method == 'GET':
+            return HTTPStatus.OK, {'status': 'ok', 'inflight': len(self.coalescer)}, None
+        if path == '/metrics' and method == 'GET':
+            return HTTPStatus.OK, metrics.to_prometheus(), 'text/plain; version=0.0.4'
+        if path == '/dialogue':
+            if method != 'POST':
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use POST.")
+            try:
+                data = json.loads(body or b'{}')
+            except ValueError:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Body is not valid JSON.")
+            request, deadline_ms = parse_dialogue_request(data)
+            deadline_ms = deadline_ms or parse_deadline(headers.get('x-deadline-ms'))
+            response = await self.generate(client_id, request, deadline_ms)
+            return HTTPStatus.OK, dataclasses.asdict(response), None
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"No route for {method} {path}.")
+
+    async def _send(self, writer, status, body, content_type, keep_alive=False):
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status, payload, keep_alive=False):
+        await self._send(writer, status, json.dumps(payload).encode('utf-8'), 'application/json', keep_alive)
+
+    # --- WebSocket ---
+
+    async def _handle_websocket(self, reader, writer, headers, client_id):
+        key = headers.get('sec-websocket-key')
+        if not key:
+            await self._send_json(writer, HTTPStatus.BAD_REQUEST, {'error': "Missing Sec-WebSocket-Key."})
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\n"
+                      "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode('latin-1'))
+        await writer.drain()
+
+        while True:
+            opcode, payload = await read_frame(reader)
+            if opcode == 0x8: # Close
+                writer.write(encode_frame(b'', opcode=0x8))
+                await writer.drain()
+                return
+            if opcode == 0x9: # Ping
+                writer.write(encode_frame(payload, opcode=0xA))
+                await writer.drain()
+                continue
+            if opcode != 0x1:
+                continue
+            try:
+                data = json.loads(payload)
+                request, deadline_ms = parse_dialogue_request(data)
+                await self._stream_dialogue(writer, client_id, request, deadline_ms, data.get('id'))
+            except (ValueError, HTTPError) as e:
+                message = e.message if isinstance(e, HTTPError) else "Message is not valid JSON."
+                await send_json_frame(writer, {'type': 'error', 'error': message})
+
+    async def _stream_dialogue(self, writer, client_id, request, deadline_ms, message_id):
+        """Generates one line, forwarding tokens as they arrive (not coalesced)."""
+        self._acquire(client_id)
+        queue = asyncio.Queue()
+        task = asyncio.ensure_future(self.manager.generate_dialogue(
+            request, on_token=queue.put_nowait, on_reset=lambda: queue.put_nowait(RESET)))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + deadline_ms / 1000 if deadline_ms else None
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - loop.time())
+                chunk = await asyncio.wait_for(queue.get(), timeout)
+                if chunk is None:
+                    break
+                if chunk is RESET:
+                    await send_json_frame(writer, {'type': 'reset', 'id': message_id})
+                else:
+                    await send_json_frame(writer, {'type': 'token', 'id': message_id, 'text': chunk})
+            response = task.result()
+            await send_json_frame(writer, {'type': 'done', 'id': message_id, **dataclasses.asdict(response)})
+        except asyncio.TimeoutError:
+            task.cancel()
+            metrics.increment('deadline_exceeded')
+            await send_json_frame(writer, {'type': 'error', 'id': message_id,
+                                           'error': f"Deadline of {deadline_ms} ms exceeded."})
+        except (DialogueRequestError, DialogueGenerationError, OllamaError) as e:
+            await send_json_frame(writer, {'type': 'error', 'id': message_id, 'error': str(e)})
+        except Exception as e:
+            print(f"Error streaming dialogue: {e!r}", file=sys.stderr)
+            await send_json_frame(writer, {'type': 'error', 'id': message_id, 'error': "Internal server error."})
+        finally:
+            if not task.done():
+                task.cancel()
+            self._release(client_id)
+
+
+async def read_frame(reader):
+    """Reads one WebSocket frame and returns (opcode, payload)."""
+    first, second = await reader.readexactly(2)
+    opcode = first & 0x0F
+    length = second & 0x7F
+    if length == 126:
+        (length,) = struct.unpack('!H', await reader.readexactly(2))
+    elif length == 127:
+        (length,) = struct.unpack('!Q', await reader.readexactly(8))
+    if length > MAX_BODY_BYTES:
+        raise ConnectionError("WebSocket frame too large.")
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return opcode, payload
+
+
+def encode_frame(payload, opcode=0x1, mask=None):
+    """Encodes a single unfragmented WebSocket frame (clients must pass a mask)."""
+    length = len(payload)
+    mask_bit = 0x80 if mask else 0
+    if length < 126:
+        head = struct.pack('!BB', 0x80 | opcode, mask_bit | length)
+    elif length < 1 << 16:
+        head = struct.pack('!BBH', 0x80 | opcode, mask_bit | 126, length)
+    else:
+        head = struct.pack('!BBQ', 0x80 | opcode, mask_bit | 127, length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        head += mask
+    return head + payload
+
+
+async def send_json_frame(writer, data):
+    writer.write(encode_frame(json.dumps(data).encode('utf-8')))
+    await writer.drain()
+
+
+def run_server(host=None, port=None, max_client_concurrency=None, manager=None):
+    """Runs a DialogueServer until interrupted."""
+    server = DialogueServer(manager, host, port, max_client_concurrency)
+
+    async def main():
+        await server.start()
+        print(f"StoryTeller dialogue server listening on http://{server.host}:{server.port}", file=sys.stderr)
+        await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,47 @@
+from storyteller.core.context_tracker import ContextSnapshot, MAX_SNAPSHOT_DEPTH
+
+def test_fork_is_copy_on_write():
+    """Writes to a fork never reach the parent, and unchanged keys are shared."""
+    root = ContextSnapshot({'location': 'gate', 'time': 'night'})
+    branch = root.fork()
+    branch.set('location', 'tavern')
+    assert root.world_state['location'] == 'gate'
+    assert branch.world_state['location'] == 'tavern'
+    assert branch.world_state['time'] == 'night'
+    # Only the changed key lives in the branch's own layer
+    assert branch.world_state.maps[0] == {'location': 'tavern'}
+    assert branch.world_state.maps[1] is root.world_state.maps[0]
+
+def test_with_line_extends_history_without_touching_parent():
+    root = ContextSnapshot({}, [{'speaker_id': 'a', 'text': 'hi'}])
+    child = root.with_line({'speaker_id': 'b', 'text': 'hello'})
+    assert len(root.history) == 1
+    assert [h['text'] for h in child.history] == ['hi', 'hello']
+
+def test_merge_combines_branches():
+    """Merging keeps each branch's lines once and lets later branches win conflicts."""
+    root = ContextSnapshot({'mood': 'calm'}).with_line({'speaker_id': 'a', 'text': 'hi'})
+    left = root.with_line({'speaker_id': 'b', 'text': 'left'})
+    left.set('mood', 'tense')
+    right = root.with_line({'speaker_id': 'c', 'text': 'right'})
+    right.set('weather', 'rain')
+    merged = ContextSnapshot.merge([left, right])
+    assert [h['text'] for h in merged.history] == ['hi', 'left', 'right']
+    assert merged.to_dict() == {'mood': 'tense', 'weather': 'rain'}
+
+def test_merge_orders_shared_layers_by_ancestry():
+    """A fork shared by some branches shadows the root no matter the merge order."""
+    root = ContextSnapshot({'k': 1})
+    fork = root.fork()
+    fork.set('k', 2)
+    b1, b2, b3 = fork.fork(), fork.fork(), root.fork()
+    assert ContextSnapshot.merge([b1, b2, b3]).world_state['k'] == 2
+    assert ContextSnapshot.merge([b3, b1, b2]).world_state['k'] == 2
+
+def test_deep_forks_are_flattened():
+    snapshot = ContextSnapshot({'n': 0})
+    for i in range(MAX_SNAPSHOT_DEPTH * 2):
+        snapshot = snapshot.fork()
+        snapshot.set('n', i)
+    assert len(snapshot.world_state.maps) <= MAX_SNAPSHOT_DEPTH + 2
+    assert snapshot.world_state['n'] == MAX_SNAPSHOT_DEPTH * 2 - 1
@@ -0,0 +1,54 @@
+import pytest
+from array import array
+
+from storyteller.core.data_store import DataStore, Table
+from storyteller.data.models import Character, Relationship
+
+def test_data_store_has_model_tables():
+    store = DataStore()
+    assert set(store.tables) == {'characters', 'relationships', 'context', 'dialogue_history'}
+    assert len(store.get_table('characters')) == 0
+    with pytest.raises(KeyError, match="Unknown table"):
+        store.get_table('missing')
+
+def test_append_and_extend_coerce_values():
+    table = Table.for_model(Relationship)
+    table.append({'char1_id': 'a', 'char2_id': 'b', 'relationship_quality': '0.5'})
+    table.append(Relationship(char1_id='b', char2_id='c', relationship_type='friend'))
+    table.extend({'char1_id': ['c'], 'char2_id': ['a'], 'relationship_quality': [1]})
+    assert len(table) == 3
+    assert isinstance(table.column('relationship_quality'), array)
+    assert list(table.column('relationship_quality')) == [0.5, 0.0, 1.0]
+    # Missing columns are filled with the kind's empty value
+    assert table.column('current_status') == ['', '', '']
+
+def test_bad_values_leave_no_partial_rows():
+    """A value that fails coercion in a later column must not leave earlier columns longer."""
+    table = DataStore().get_table('context')
+    with pytest.raises(ValueError):
+        table.append({'context_id': 'a', 'priority': 'high'})
+    with pytest.raises(ValueError):
+        table.extend({'context_id': ['a'], 'priority': ['high']})
+    with pytest.raises(TypeError):
+        table.extend({'context_id': ['a'], 'priority': ['high']}, coerced=True)
+    assert {len(column) for column in table.columns.values()} == {0}
+
+def test_take_and_views():
+    table = Table.for_model(Character, [Character(character_id=f'c{i}', name=f'N{i}') for i in range(4)])
+    subset = table.take([3, 1])
+    assert subset.column('character_id') == ['c3', 'c1']
+    assert [v.name for v in table.views(Character, rows=[2])] == ['N2']
+
+def test_versions_track_changes():
+    store = DataStore()
+    store.append_rows('characters', {'character_id': ['c1'], 'name': ['Mira']})
+    assert store.data_version == 1
+    assert store.schema_version == 0
+    store.update_table('characters', Table.for_model(Character))
+    assert store.schema_version == 0 # Same columns
+    store.update_table('characters', Table({'character_id': 'enum'}))
+    assert store.schema_version == 1
+
+def test_mismatched_columns_are_rejected():
+    with pytest.raises(ValueError):
+        Table({'a': 'str'}, {'b': []})
@@ -0,0 +1,135 @@
+import asyncio
+import pytest
+
+from storyteller.ai.ollama_integration import Completion, OllamaError
+from storyteller.core.dialogue_manager import (
+    DialogueGenerationError, DialogueManager, DialogueRequest, DialogueRequestError
+)
+from storyteller.metrics import registry as metrics
+
+
+class FakeOllama:
+    """Stands in for OllamaIntegration, returning queued replies."""
+    model = 'fake-model'
+
+    def __init__(self, replies=None):
+        self.replies = list(replies or ['"Well met, traveller."'])
+        self.prompts = []
+
+    def _next(self):
+        reply = self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    async def generate_completion(self, prompt, params=None, model=None, system=None, context=None):
+        self.prompts.append((prompt, system, dict(params or {})))
+        return Completion(text=self._next(), model=model, eval_count=4, eval_seconds=0.1)
+
+    async def stream_completion(self, prompt, params=None, model=None, system=None, context=None):
+        self.prompts.append((prompt, system, dict(params or {})))
+        text = self._next()
+        for word in text.split(' '):
+            yield word + ' '
+        yield Completion(text=text, model=model, eval_count=4, eval_seconds=0.1)
+
+
+CHARACTERS = {
+    'guard': {'name': 'Guard', 'background': 'A tired city guard.', 'personality_traits': 'gruff'},
+    'hero': {'name': 'Hero'},
+}
+
+@pytest.fixture(autouse=True)
+def enabled_metrics(monkeypatch):
+    monkeypatch.setattr(metrics, 'enabled', True)
+    metrics.reset()
+    yield
+    metrics.reset()
+
+def test_generate_dialogue_runs_all_stages():
+    """A successful request passes through every pipeline stage once."""
+    manager = DialogueManager(FakeOllama(), CHARACTERS, world_state={'time': 'night'})
+    response = asyncio.run(manager.generate_dialogue(DialogueRequest('guard', ('hero',), "Hero approaches the gate")))
+
+    assert response.text == "Well met, traveller."
+    assert response.model == 'fake-model'
+    assert response.attempts == 1
+    for stage in metrics.histograms:
+        assert metrics.histograms[stage].count == 1
+    assert set(metrics.histograms) == {
+        'input_processing', 'data_retrieval', 'prompt_building', 'model_config',
+        'generation', 'post_processing', 'quality_assurance', 'finalization'}
+    assert manager.history[-1]['text'] == "Well met, traveller."
+
+def test_prompt_includes_character_and_world_state():
+    """The prompt carries the profile, listeners, world state and situation."""
+    ollama = FakeOllama()
+    manager = DialogueManager(ollama, CHARACTERS, world_state={'time': 'night'})
+    asyncio.run(manager.generate_dialogue(DialogueRequest('guard', ('hero',), "Hero approaches the gate")))
+    prompt, system, _ = ollama.prompts[0]
+    assert "You are Guard" in system
+    assert "Personality: gruff" in prompt
+    assert "Speaking to: Hero" in prompt
+    assert "time=night" in prompt
+    assert "Situation: Hero approaches the gate" in prompt
+
+def test_unknown_speaker_is_rejected():
+    manager = DialogueManager(FakeOllama(), CHARACTERS)
+    with pytest.raises(DialogueRequestError):
+        asyncio.run(manager.generate_dialogue(DialogueRequest('nobody')))
+
+def test_failed_calls_are_retried_and_counted():
+    """Ollama errors are retried up to max_retries."""
+    ollama = FakeOllama([OllamaError("down"), "Halt!"])
+    manager = DialogueManager(ollama, CHARACTERS, max_retries=1)
+    response = asyncio.run(manager.generate_dialogue(DialogueRequest('guard')))
+    assert response.text == "Halt!"
+    assert response.attempts == 2
+    assert metrics.counters['retries'] == 1
+
+def test_retries_exhausted_raises():
+    manager = DialogueManager(FakeOllama([OllamaError("down")]), CHARACTERS, max_retries=1)
+    with pytest.raises(OllamaError):
+        asyncio.run(manager.generate_dialogue(DialogueRequest('guard')))
+
+def test_quality_failure_regenerates_with_cooler_temperature():
+    """Lines failing QA are regenerated with a lower temperature."""
+    ollama = FakeOllama(["x" * 50, "Halt!"])
+    manager = DialogueManager(ollama, CHARACTERS)
+    response = asyncio.run(manager.generate_dialogue(
+        DialogueRequest('guard', params={'temperature': 0.9}, max_chars=20)))
+    assert response.text == "Halt!"
+    assert metrics.counters['regenerations'] == 1
+    assert ollama.prompts[1][2]['temperature'] == pytest.approx(0.7)
+
+def test_quality_failures_exhausted_raises():
+    manager = DialogueManager(FakeOllama(["x" * 50]), CHARACTERS, max_regenerations=1)
+    with pytest.raises(DialogueGenerationError):
+        asyncio.run(manager.generate_dialogue(DialogueRequest('guard', max_chars=20)))
+    assert metrics.counters['qa_failures'] == 1
+
+def test_streaming_forwards_tokens():
+    """With on_token the completion is streamed chunk by chunk."""
+    chunks = []
+    manager = DialogueManager(FakeOllama(["Guard: Who goes there?"]), CHARACTERS)
+    response = asyncio.run(manager.generate_dialogue(DialogueRequest('guard'), on_token=chunks.append))
+    assert ''.join(chunks).strip() == "Guard: Who goes there?"
+    assert response.text == "Who goes there?" # Speaker prefix removed in post-processing
+    assert metrics.generated_tokens == 4
+
+def test_streaming_resets_after_failed_attempts():
+    """on_reset is called before a retry or regeneration replaces streamed chunks."""
+    class BrokenStream(FakeOllama):
+        async def stream_completion(self, prompt, params=None, model=None, system=None, context=None):
+            if not self.prompts:
+                self.prompts.append(prompt)
+                yield "Who "
+                raise OllamaError("connection dropped")
+            async for item in super().stream_completion(prompt, params, model, system, context):
+                yield item
+    events = []
+    manager = DialogueManager(BrokenStream(["x" * 50, "Halt!"]), CHARACTERS, max_retries=1)
+    response = asyncio.run(manager.generate_dialogue(
+        DialogueRequest('guard', max_chars=20), on_token=events.append, on_reset=lambda: events.append(None)))
+    assert events == ["Who ", None, "x" * 50 + " ", None, "Halt! "]
+    assert response.text == "Halt!"
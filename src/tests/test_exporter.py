@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from storyteller.core.data_store import DataStore
+from storyteller.data.exporter import Exporter, id_suffix, render_script, safe_file_name
+
+@pytest.fixture
+def store():
+    store = DataStore()
+    store.append_rows('characters', {
+        'character_id': ['mira', 'tor'], 'name': ['Mira', 'Tor'],
+        'personality_traits': [('curious', 'blunt'), ()], 'speech_patterns': [{'tone': 'dry'}, None]})
+    store.append_rows('relationships', {'char1_id': ['mira'], 'char2_id': ['tor'],
+                                        'relationship_type': ['rival'], 'relationship_quality': [-0.25]})
+    store.append_rows('context', {'context_id': ['s1'], 'location': ['Harbor tavern']})
+    store.append_rows('dialogue_history', {
+        'dialogue_id': ['d2', 'd1', 'd3'], 'character_ids': [('tor',), ('mira', 'tor'), ('mira',)],
+        'context_id': ['s1', 's1', 's2'], 'created_at': [2, 1, 3],
+        'content': ['Not tonight.', 'You owe me.', 'Alone again.'],
+        'metadata': [{'emotion': 'tired'}, None, None]})
+    return store
+
+def test_render_script_orders_lines():
+    text = render_script({'scene_id': 's', 'location': 'EXT. DOCKS', 'lines': [
+        {'speaker': 'Mira', 'content': 'Hello.', 'metadata': {'emotion': 'warm'}}]})
+    assert text.splitlines()[:4] == ['EXT. DOCKS', '', 'MIRA', '(warm)']
+
+def test_export_writes_files_and_skips_unchanged(tmp_path, store):
+    exporter = Exporter(store, tmp_path, workers=1)
+    report = exporter.export()
+    assert (report.exported, report.skipped) == (4, 0)
+    script = (tmp_path / 'dialogue_exports' / 's1.fountain').read_text()
+    assert script.index('You owe me.') < script.index('Not tonight.')
+    assert script.startswith('INT. HARBOR TAVERN')
+    sheet = (tmp_path / 'character_sheets' / 'mira.md').read_text()
+    assert '# Mira' in sheet and '- curious' in sheet and '- tor: rival (-0.25)' in sheet
+    manifest = json.loads((tmp_path / 'manifest.json').read_text())
+    assert set(manifest['entities']) == {'dialogue/s1', 'dialogue/s2', 'characters/mira', 'characters/tor'}
+
+    # A fresh exporter reads the manifest and only re-renders what changed
+    store.get_table('characters').column('name')[1] = 'Torvald'
+    report = Exporter(store, tmp_path, workers=1).export()
+    # Tor's sheet and scene s1 (speaker name) change; Mira's sheet only lists Tor's id
+    assert (report.exported, report.skipped) == (2, 2)
+    assert 'TORVALD' in (tmp_path / 'dialogue_exports' / 's1.fountain').read_text()
+
+def test_partial_export_and_missing_files(tmp_path, store):
+    exporter = Exporter(store, tmp_path, workers=1)
+    assert exporter.export(kinds=('characters',), ids={'tor'}).exported == 1
+    assert not (tmp_path / 'dialogue_exports').exists()
+    (tmp_path / 'character_sheets' / 'tor.md').unlink()
+    assert Exporter(store, tmp_path, workers=1).export(kinds=('characters',)).exported == 2
+    with pytest.raises(ValueError, match="Unknown export kind"):
+        exporter.export(kinds=('maps',))
+
+def test_process_pool_export(tmp_path, store):
+    report = Exporter(store, tmp_path, workers=2, window=1).export()
+    assert report.exported == 4
+    assert (tmp_path / 'character_sheets' / 'tor.md').exists()
+
+def test_safe_file_name():
+    assert safe_file_name('../scene 1/a') == 'scene_1_a'
+    assert safe_file_name('') == 'unnamed'
+
+def test_ids_with_the_same_safe_name_get_separate_files(tmp_path, store):
+    store.append_rows('characters', {'character_id': ['scene 1', 'scene_1', 'Mira'],
+                                     'name': ['Space', 'Underscore', 'Capital']})
+    Exporter(store, tmp_path, workers=1).export(kinds=('characters',))
+    sheets = tmp_path / 'character_sheets'
+    assert '# Space' in (sheets / 'scene_1.md').read_text()
+    assert '# Underscore' in (sheets / f"scene_1-{id_suffix('scene_1')}.md").read_text()
+    assert '# Capital' in (sheets / f"Mira-{id_suffix('Mira')}.md").read_text()
+
+    # Each entity keeps its file when exported again
+    report = Exporter(store, tmp_path, workers=1).export(kinds=('characters',), force=True)
+    assert report.exported == 5
+    assert len(list(sheets.iterdir())) == 5
+    assert '# Underscore' in (sheets / f"scene_1-{id_suffix('scene_1')}.md").read_text()
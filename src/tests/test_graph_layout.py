@@ -0,0 +1,159 @@
+import math
+import queue
+import random
+import threading
+import time
+from array import array
+
+import pytest
+
+from storyteller.core.data_store import DataStore
+from storyteller.core.graph_layout import (
+    ForceLayout, LayoutWorker, RelationshipGraph, SpatialGrid, bundle_edges, detail_level, numpy_available,
+    run_layout_worker
+)
+
+BACKENDS = [False] + ([True] if numpy_available else [])
+
+def clusters(groups=2, size=20, edges_per_group=60, seed=1):
+    """`groups` dense clusters chained together by one edge each."""
+    rng = random.Random(seed)
+    sources, targets = [], []
+    for g in range(groups):
+        base = g * size
+        for _ in range(edges_per_group):
+            a, b = rng.sample(range(base, base + size), 2)
+            sources.append(a)
+            targets.append(b)
+        if g:
+            sources.append(base - size)
+            targets.append(base)
+    return [f"c{i}" for i in range(groups * size)], sources, targets
+
+def distance(positions, i, j):
+    return math.dist(positions[2 * i:2 * i + 2], positions[2 * j:2 * j + 2])
+
+def test_graph_from_store():
+    store = DataStore()
+    store.append_rows('characters', {'character_id': ['mira', 'tor'], 'name': ['Mira', 'Tor']})
+    store.append_rows('relationships', {'char1_id': ['mira', 'tor', 'mira'], 'char2_id': ['tor', 'ash', 'mira'],
+                                        'relationship_type': ['rival', 'friend', 'self'],
+                                        'relationship_quality': [-0.5, 0.8, 1.0]})
+    graph = RelationshipGraph.from_store(store)
+    assert graph.node_ids == ['mira', 'tor', 'ash']
+    assert graph.labels == ['Mira', 'Tor', 'ash']
+    assert (list(graph.sources), list(graph.targets), graph.types) == ([0, 1], [1, 2], ['rival', 'friend'])
+    assert list(graph.weights()) == [1.5, 1.8]
+
+@pytest.mark.parametrize('use_numpy', BACKENDS)
+def test_layout_separates_clusters(use_numpy):
+    node_ids, sources, targets = clusters()
+    layout = ForceLayout(use_numpy=use_numpy)
+    layout.set_graph(node_ids, sources, targets)
+    assert layout.run() < 1000
+    assert layout.converged
+    positions = layout.positions()
+    within = sum(distance(positions, i, j) for i in range(20) for j in range(i + 1, 20)) / 190
+    between = sum(distance(positions, i, j) for i in range(20) for j in range(20, 40)) / 400
+    assert within * 2 < between
+
+@pytest.mark.skipif(not numpy_available, reason="numpy is not installed")
+def test_backends_agree():
+    node_ids, sources, targets = clusters()
+    results = []
+    for use_numpy in (False, True):
+        layout = ForceLayout(use_numpy=use_numpy)
+        layout.set_graph(node_ids, sources, targets)
+        layout.step(20)
+        results.append(layout.positions())
+    assert results[0] == pytest.approx(results[1], abs=1e-6)
+
+@pytest.mark.parametrize('use_numpy', BACKENDS)
+def test_incremental_update_only_moves_the_affected_neighbourhood(use_numpy):
+    node_ids, sources, targets = clusters(groups=4)
+    layout = ForceLayout(use_numpy=use_numpy)
+    layout.set_graph(node_ids, sources, targets)
+    layout.run()
+    before = layout.positions()
+
+    moving = layout.set_graph(node_ids + ['new'], sources + [80], targets + [5])
+    assert 0 < moving < 40
+    assert layout.temperature > 0 and not layout.converged
+    layout.run()
+    after = layout.positions()
+    assert distance(after, 80, 5) < 3 * 10 # Starts and stays next to its neighbour
+    neighbours = {5} | {t for s, t in zip(sources, targets) if s == 5} | {s for s, t in zip(sources, targets) if t == 5}
+    unaffected = [i for i in range(80) if i not in neighbours]
+    assert all(after[2 * i:2 * i + 2] == before[2 * i:2 * i + 2] for i in unaffected)
+
+def test_unchanged_graph_does_not_reheat():
+    node_ids, sources, targets = clusters()
+    layout = ForceLayout(use_numpy=False)
+    layout.set_graph(node_ids, sources, targets)
+    layout.run()
+    assert layout.set_graph(node_ids, sources, targets) == 0
+    assert layout.converged
+    layout.set_graph([], [], [])
+    assert layout.converged and len(layout.positions()) == 0
+
+def test_worker_streams_frames_until_converged():
+    node_ids, sources, targets = clusters()
+    worker = LayoutWorker(emit_every=10, use_numpy=False)
+    try:
+        version = worker.set_graph(node_ids, sources, targets)
+        frames = []
+        deadline = time.monotonic() + 30
+        while not (frames and frames[-1].converged) and time.monotonic() < deadline:
+            frame = worker.poll()
+            if frame is not None:
+                frames.append(frame)
+            time.sleep(0.01)
+        assert frames and frames[-1].converged
+        assert {frame.version for frame in frames} == {version}
+        assert len(frames[-1].positions) == 2 * len(node_ids)
+    finally:
+        worker.stop()
+    assert not worker.running
+
+def test_worker_answers_every_version_even_if_already_converged():
+    """Setting the same graph again still yields a converged frame for the new version."""
+    node_ids, sources, targets = clusters()
+    commands, frames = queue.Queue(), queue.Queue()
+    thread = threading.Thread(target=run_layout_worker, args=(commands, frames, 50, False), daemon=True)
+    thread.start()
+
+    def wait_for(version):
+        while True:
+            frame = frames.get(timeout=30)
+            if frame.version == version and frame.converged:
+                return frame
+
+    try:
+        for version in (1, 2):
+            commands.put(('graph', version, node_ids, sources, targets, None))
+            assert len(wait_for(version).positions) == 2 * len(node_ids)
+    finally:
+        commands.put(('stop',))
+        thread.join(5)
+    assert not thread.is_alive()
+
+def test_spatial_grid_query():
+    positions = array('d', [0, 0, 5, 5, 50, 50, -30, 2])
+    grid = SpatialGrid(positions, cell_size=10)
+    assert sorted(grid.query(-1, -1, 6, 6)) == [0, 1]
+    assert sorted(grid.query(-100, -100, 100, 100)) == [0, 1, 2, 3]
+    assert grid.query(200, 200, 300, 300) == []
+
+def test_bundle_edges_merges_edges_between_cells():
+    # Two nodes near the origin, two near (100, 0)
+    positions = array('d', [0, 0, 2, 2, 100, 0, 102, 2])
+    strokes = bundle_edges(positions, [0, 0, 1, 0], [2, 3, 3, 1], cell_size=10)
+    assert strokes == [(1.0, 1.0, 101.0, 1.0, 3)] # The edge inside one cell is dropped
+    assert bundle_edges(positions, [0, 0, 1, 0], [2, 3, 3, 1], cell_size=10, edges=[0])[0][4] == 1
+
+def test_detail_level():
+    close = detail_level(scale=4.0, visible_nodes=50, visible_edges=100)
+    assert close.node_radius > 0 and close.labels and not close.bundle_cell
+    far = detail_level(scale=0.1, visible_nodes=10000, visible_edges=50000)
+    assert far.node_radius == 0 and not far.labels
+    assert far.bundle_cell == 256.0 # 24 px at 0.1 px/unit, rounded up to a power of two
@@ -0,0 +1,85 @@
+import random
+
+import pytest
+
+from storyteller.core.data_store import DataStore
+from storyteller.core.history import (MISSING, MergeConflict, PersistentMap, ProjectState, VersionStore)
+
+class CollidingKey:
+    """Keys with equal hashes, to exercise collision nodes."""
+    def __init__(self, name):
+        self.name = name
+    def __hash__(self):
+        return 42
+    def __eq__(self, other):
+        return isinstance(other, CollidingKey) and other.name == self.name
+    def __repr__(self):
+        return f"CollidingKey({self.name!r})"
+
+def test_persistent_map_matches_dict():
+    rng = random.Random(3)
+    reference, current = {}, PersistentMap()
+    versions = []
+    for step in range(3000):
+        key = rng.randrange(500)
+        if rng.random() < 0.3:
+            reference.pop(key, None)
+            current = current.delete(key)
+        else:
+            reference[key] = step
+            current = current.set(key, step)
+        versions.append((dict(reference), current))
+    for expected, version in versions[::250]:
+        assert version.to_dict() == expected
+        assert len(version) == len(expected)
+    assert current.get(-1) is None and -1 not in current
+    with pytest.raises(KeyError):
+        current[-1]
+
+def test_versions_share_structure_and_diff():
+    base = PersistentMap((i, str(i)) for i in range(1000))
+    changed = base.set(5, 'five').delete(7).set(1000, 'new')
+    assert base[5] == '5' and 7 in base # The original is untouched
+    assert sorted(base.diff(changed), key=lambda c: c[0]) == [
+        (5, '5', 'five'), (7, '7', MISSING), (1000, MISSING, 'new')]
+    assert base.set(3, base[3]) is base # Writing the same value shares everything
+    assert changed.delete(1000).set(7, '7').set(5, '5') == base
+
+def test_hash_collisions():
+    a, b, c = CollidingKey('a'), CollidingKey('b'), CollidingKey('c')
+    m = PersistentMap({a: 1, b: 2, c: 3})
+    assert (m[a], m[b], m[c], len(m)) == (1, 2, 3, 3)
+    m = m.delete(b).set(a, 10)
+    assert m.to_dict() == {a: 10, c: 3}
+    assert m.delete(a).delete(c) == PersistentMap()
+
+def test_commit_undo_redo_and_log():
+    store = DataStore()
+    store.append_rows('characters', {'character_id': ['mira'], 'name': ['Mira']})
+    history = VersionStore(ProjectState.from_store(store, {'weather': 'rain'}))
+    first = history.commit(history.state().update_world_state({'weather': 'storm'}), "storm")
+    history.commit(history.state().set_character({'character_id': 'tor', 'name': 'Tor'}), "add tor")
+    assert [v.message for v in history.log()] == ['add tor', 'storm', 'initial']
+    assert history.undo().version_id == first.version_id
+    assert 'tor' not in history.state().characters
+    assert 'tor' in history.redo().state.characters
+    with pytest.raises(IndexError):
+        history.redo()
+    assert history.diff(0, first.version_id) == {'world_state': [('weather', 'rain', 'storm')]}
+
+def test_branch_and_merge():
+    history = VersionStore(ProjectState(world_state=PersistentMap({'mood': 'calm', 'time': 'dusk'})))
+    history.create_branch('what-if')
+    history.commit(history.state().update_world_state({'time': 'night'}), "night falls")
+    history.switch('what-if')
+    history.commit(history.state().update_world_state({'mood': 'tense'}), "argument")
+    merged = history.merge('what-if', target='main')
+    assert merged.state.world_state.to_dict() == {'mood': 'tense', 'time': 'night'}
+    assert len(merged.parents) == 2
+
+    history.commit(history.head('what-if').state.update_world_state({'time': 'dawn'}), branch='what-if')
+    history.commit(history.state().update_world_state({'time': 'noon'}), branch='main')
+    with pytest.raises(MergeConflict) as error:
+        history.merge('what-if', target='main')
+    assert error.value.conflicts[0][:2] == ('world_state', 'time')
+    assert history.merge('what-if', target='main', prefer='source').state.world_state['time'] == 'dawn'
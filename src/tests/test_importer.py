@@ -0,0 +1,98 @@
+import csv
+import json
+
+import pytest
+
+from storyteller.core.data_store import DataStore
+from storyteller.data.importer import StreamingImporter, iter_json_array
+from storyteller.data.validator import SchemaError
+
+@pytest.fixture
+def store():
+    store = DataStore()
+    store.append_rows('characters', {'character_id': ['a', 'b'], 'name': ['Ana', 'Bo']})
+    return store
+
+def test_csv_import_in_chunks_with_error_file(tmp_path, store):
+    path = tmp_path / 'relationships.csv'
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['char1_id', 'char2_id', 'relationship_quality'])
+        writer.writerows([['a', 'b', '0.5'], ['a', 'ghost', '0.1'], ['b', 'a', 'x'], ['b', 'a', '1']])
+    report = StreamingImporter(store, chunk_size=2).import_file('relationships', path)
+    assert (report.rows_read, report.rows_imported, report.rows_rejected, report.chunks) == (4, 2, 2, 2)
+    table = store.get_table('relationships')
+    assert list(table.column('relationship_quality')) == [0.5, 1.0]
+    with open(report.error_file, newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ['row', 'column', 'value', 'error']
+    assert [r[:3] for r in rows[1:]] == [['2', 'char2_id', 'ghost'], ['3', 'relationship_quality', 'x']]
+
+def test_json_and_jsonl_import(tmp_path, store):
+    array_path = tmp_path / 'characters.json'
+    array_path.write_text(json.dumps([{'character_id': 'c', 'personality_traits': ['calm']},
+                                      {'character_id': 'a'}]))
+    report = StreamingImporter(store).import_file('characters', array_path)
+    assert (report.rows_imported, report.rows_rejected) == (1, 1) # 'a' already exists
+    lines_path = tmp_path / 'context.jsonl'
+    lines_path.write_text('{"context_id": "k1", "priority": 3}\n\n{"context_id": "k2"}\n')
+    report = StreamingImporter(store).import_file('context', lines_path)
+    assert report.rows_imported == 2 and report.error_file is None
+    assert list(store.get_table('context').column('priority')) == [3, 0]
+    assert store.get_table('characters').column('personality_traits')[-1] == ('calm',)
+
+def test_unparseable_rows_are_reported_and_skipped(tmp_path, store):
+    """Malformed JSON lines and CSV rows of the wrong width become row errors with their line number."""
+    lines_path = tmp_path / 'context.jsonl'
+    lines_path.write_text('{"context_id": "k1"}\n{"context_id": \n\n[1, 2]\n{"context_id": "k2"}\n')
+    report = StreamingImporter(store, chunk_size=2).import_file('context', lines_path)
+    assert (report.rows_read, report.rows_imported, report.rows_rejected) == (4, 2, 2)
+    assert list(store.get_table('context').column('context_id')) == ['k1', 'k2']
+    with open(report.error_file, newline='') as f:
+        rows = list(csv.reader(f))[1:]
+    assert [(r[0], r[1]) for r in rows] == [('2', ''), ('3', '')]
+    assert rows[0][2] == '{"context_id":' and rows[0][3].startswith("line 2: invalid JSON")
+    assert rows[1][3] == "line 4: expected a JSON object, found list"
+
+    csv_path = tmp_path / 'characters.csv'
+    csv_path.write_text('character_id,name\nc,Cy\nd,Di,extra\ne\n\nf,Fa\n')
+    report = StreamingImporter(store).import_file('characters', csv_path)
+    assert (report.rows_read, report.rows_imported, report.rows_rejected) == (4, 2, 2)
+    assert list(store.get_table('characters').column('character_id'))[-2:] == ['c', 'f']
+    with open(report.error_file, newline='') as f:
+        rows = list(csv.reader(f))[1:]
+    assert rows == [['2', '', 'd,Di,extra', 'line 3: expected 2 cells, got 3'],
+                    ['3', '', 'e', 'line 4: expected 2 cells, got 1']]
+
+def test_json_keys_are_checked_per_row(tmp_path, store):
+    """An unknown or missing key rejects that object only, even after earlier chunks were committed."""
+    lines_path = tmp_path / 'characters.jsonl'
+    lines_path.write_text('{"character_id": "c"}\n{"character_id": "d", "nickname": "Dee"}\n'
+                          '{"name": "Nobody"}\n{"character_id": "e"}\n')
+    report = StreamingImporter(store, chunk_size=1).import_file('characters', lines_path)
+    assert (report.rows_read, report.rows_imported, report.rows_rejected) == (4, 2, 2)
+    assert list(store.get_table('characters').column('character_id'))[-2:] == ['c', 'e']
+    with open(report.error_file, newline='') as f:
+        rows = list(csv.reader(f))[1:]
+    assert rows[0][3] == "line 2: unknown key(s): nickname"
+    assert rows[1][:2] == ['3', 'character_id'] and rows[1][3] == "required value is empty"
+
+def test_malformed_json_array_names_the_line(tmp_path, store):
+    path = tmp_path / 'characters.json'
+    path.write_text('[\n {"character_id": "c"},\n {"character_id": }\n]')
+    with pytest.raises(SchemaError, match="line 3"):
+        StreamingImporter(store).import_file('characters', path)
+
+def test_iter_json_array_small_reads(tmp_path):
+    path = tmp_path / 'items.json'
+    path.write_text(' [ {"a": "x,]"}, [1, 2] , 3 ] ')
+    with open(path) as f:
+        assert list(iter_json_array(f, read_size=3)) == [{'a': 'x,]'}, [1, 2], 3]
+
+def test_bad_files_are_rejected(tmp_path, store):
+    path = tmp_path / 'characters.csv'
+    path.write_text('character_id,age\nc,3\n')
+    with pytest.raises(SchemaError, match="Unknown column"):
+        StreamingImporter(store).import_file('characters', path)
+    with pytest.raises(SchemaError, match="Unsupported"):
+        StreamingImporter(store).import_file('characters', tmp_path / 'characters.xlsx')
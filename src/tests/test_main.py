@@ -45,6 +45,12 @@ def test_cli_invoked_without_command_runs_gui(runner, mock_gui):
     mock_mainwindow_instance.show.assert_called_once()
     # QApplication.exec() is called within sys.exit mock, so check QApplication call
 
+@patch('storyteller.main.multiprocessing.freeze_support')
+def test_cli_calls_freeze_support_before_parsing(mock_freeze_support, runner):
+    """Frozen builds need freeze_support() before click sees a worker's arguments."""
+    runner.invoke(main.cli, ['--multiprocessing-fork'])
+    assert mock_freeze_support.called
+
 def test_cli_run_command_runs_gui(runner, mock_gui):
     """Test that running 'storyteller run' invokes the run command."""
     # Unpack the new mock_qt_material
@@ -58,6 +64,23 @@ def test_cli_run_command_runs_gui(runner, mock_gui):
     mock_mainwindow.assert_called_once()
     mock_mainwindow_instance.show.assert_called_once()
 
+def test_cli_run_timing_reports_first_paint(runner, mock_gui, monkeypatch):
+    """Test that 'run --timing' prints the startup report once the window paints."""
+    _, _, mock_mainwindow_instance, _ = mock_gui
+    mock_theme_manager = MagicMock()
+    mock_theme_manager.return_value.source = 'cache'
+    monkeypatch.setattr(main, "ThemeManager", mock_theme_manager)
+    monkeypatch.setattr(main, "qt_material_available", True)
+    # Simulate the first paint as soon as the window is shown
+    mock_mainwindow_instance.show.side_effect = lambda: mock_mainwindow_instance.on_first_paint()
+    result = runner.invoke(main.cli, ['run', '--timing'])
+
+    assert result.exit_code == 0
+    mock_theme_manager.return_value.apply.assert_called_once()
+    assert "first_paint" in result.output
+    assert "(cache)" in result.output
+    assert "Time to first paint:" in result.output
+
 def test_cli_run_command_fails_if_gui_import_fails(runner, monkeypatch):
     """Test that 'run' fails gracefully if MainWindow is None."""
     monkeypatch.setattr(main, "MainWindow", None)
@@ -198,6 +221,8 @@ def test_cli_help_output(runner):
     assert "Commands:" in result.output
     assert "build" in result.output
     assert "run" in result.output
+    assert "stats" in result.output
+    assert "serve" in result.output
 
 def test_cli_build_help_output(runner):
     """Test the build --help output."""
@@ -220,3 +245,33 @@ def test_cli_version_output(runner):
     assert result.exit_code == 0
     # The actual output format might be "cli, version 0.1.0" or similar
     assert "0.1.0" in result.output
+
+def test_cli_stats_without_metrics(runner, tmp_path):
+    """Test that 'stats' explains how to enable metrics when none are recorded."""
+    with patch('storyteller.main.paths.get_metrics_file_path', return_value=tmp_path / "metrics.json"):
+        result = runner.invoke(main.cli, ['stats'])
+    assert result.exit_code == 0
+    assert "No metrics recorded yet." in result.output
+
+def test_cli_stats_formats(runner, tmp_path):
+    """Test that 'stats' renders recorded metrics as a table and as Prometheus text."""
+    from storyteller import metrics
+    metrics_file = tmp_path / "metrics.json"
+    registry = metrics.MetricsRegistry(enabled=True)
+    registry.observe('generation', 0.5)
+    registry.increment('retries')
+    registry.record_cache('profiles', True)
+    registry.write_json(metrics_file)
+
+    with patch('storyteller.main.paths.get_metrics_file_path', return_value=metrics_file):
+        table = runner.invoke(main.cli, ['stats'])
+        prometheus = runner.invoke(main.cli, ['stats', '--format', 'prometheus'])
+        reset = runner.invoke(main.cli, ['stats', '--format', 'json', '--reset'])
+
+    assert table.exit_code == 0
+    assert "generation" in table.output
+    assert "retries" in table.output
+    assert "100.0%" in table.output
+    assert 'storyteller_stage_duration_seconds_count{stage="generation"} 1' in prometheus.output
+    assert reset.exit_code == 0
+    assert not metrics_file.exists()
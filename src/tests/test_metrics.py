@@ -0,0 +1,102 @@
+import json
+import pytest
+
+from storyteller import metrics
+
+@pytest.fixture
+def registry():
+    return metrics.MetricsRegistry(enabled=True)
+
+def test_disabled_registry_records_nothing():
+    """A disabled registry hands out the shared no-op span and ignores recordings."""
+    registry = metrics.MetricsRegistry(enabled=False)
+    span = registry.span('generation')
+    assert span is metrics._NULL_SPAN
+    with span:
+        pass
+    registry.increment('retries')
+    registry.record_tokens(10, 1.0)
+    registry.record_cache('profiles', True)
+    assert registry.histograms == {}
+    assert registry.counters == {}
+    assert registry.generated_tokens == 0
+    assert registry.caches == {}
+
+def test_span_records_stage_latency(registry):
+    """Spans record one observation per use."""
+    with registry.span('generation'):
+        pass
+    with registry.span('generation'):
+        pass
+    assert registry.histograms['generation'].count == 2
+
+def test_span_counts_errors_and_reraises(registry):
+    """A failing stage is timed, counted as an error and the exception propagates."""
+    with pytest.raises(ValueError):
+        with registry.span('post_processing'):
+            raise ValueError("bad output")
+    assert registry.histograms['post_processing'].count == 1
+    assert registry.counters['post_processing_errors'] == 1
+
+def test_histogram_quantiles():
+    """Quantiles are interpolated within buckets."""
+    histogram = metrics.Histogram(buckets=(1.0, 2.0))
+    for value in (0.5, 0.5, 1.5, 1.5):
+        histogram.observe(value)
+    assert histogram.count == 4
+    assert histogram.mean() == pytest.approx(1.0)
+    assert histogram.quantile(0.5) == pytest.approx(1.0)
+    assert 1.0 < histogram.quantile(0.99) <= 2.0
+
+def test_tokens_per_second_and_cache_hit_rate(registry):
+    """Derived throughput and cache hit rate values."""
+    registry.record_tokens(100, 2.0)
+    registry.record_cache('profiles', True)
+    registry.record_cache('profiles', True)
+    registry.record_cache('profiles', False)
+    assert registry.tokens_per_second() == pytest.approx(50.0)
+    assert registry.cache_hit_rate('profiles') == pytest.approx(2 / 3)
+    assert registry.cache_hit_rate('unknown') == 0.0
+
+def test_prometheus_rendering(registry):
+    """Histogram buckets are rendered cumulatively with counters and cache results."""
+    registry.observe('generation', 0.2)
+    registry.observe('generation', 40.0)
+    registry.increment('retries', 3)
+    registry.record_cache('prompts', False)
+    text = registry.to_prometheus()
+    assert 'storyteller_stage_duration_seconds_bucket{stage="generation",le="0.25"} 1' in text
+    assert 'storyteller_stage_duration_seconds_bucket{stage="generation",le="+Inf"} 2' in text
+    assert 'storyteller_stage_duration_seconds_count{stage="generation"} 2' in text
+    assert 'storyteller_events_total{event="retries"} 3' in text
+    assert 'storyteller_cache_requests_total{cache="prompts",result="miss"} 1' in text
+
+def test_flush_accumulates_into_file(registry, tmp_path):
+    """Flushing merges the session into the existing file and resets the registry."""
+    metrics_file = tmp_path / "metrics.json"
+    registry.observe('generation', 0.1)
+    registry.increment('regenerations')
+    registry.flush(metrics_file)
+    assert registry.histograms == {}
+
+    registry.observe('generation', 0.3)
+    registry.increment('regenerations')
+    registry.flush(metrics_file)
+
+    snapshot = json.loads(metrics_file.read_text())
+    assert snapshot['stages']['generation']['count'] == 2
+    assert snapshot['counters']['regenerations'] == 2
+    assert metrics.load_snapshot(metrics_file)['stages']['generation']['sum'] == pytest.approx(0.4)
+
+def test_load_snapshot_missing_file(tmp_path):
+    """A missing metrics file loads as an empty snapshot."""
+    assert metrics.load_snapshot(tmp_path / "missing.json") == {}
+
+def test_startup_timer_report():
+    timer = metrics.StartupTimer()
+    timer.mark('gui_import')
+    timer.mark('theme', 'cache')
+    assert [phase[0] for phase in timer.phases] == ['gui_import', 'theme']
+    assert timer.total() == timer.phases[-1][2] >= timer.phases[0][2]
+    report = timer.report()
+    assert 'theme' in report and '(cache)' in report
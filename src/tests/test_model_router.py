@@ -0,0 +1,172 @@
+import asyncio
+import pytest
+
+from storyteller.ai.model_router import (
+    ModelProfile, ModelRouter, parse_parameter_count, parse_quantization_bits
+)
+from storyteller.ai import model_router
+from storyteller.ai.ollama_integration import Completion, OllamaError
+from storyteller.core.dialogue_manager import DialogueManager, DialogueRequest
+from storyteller.metrics import registry as metrics
+
+MODEL_INFO = {
+    'tiny:q4': {'details': {'parameter_size': '1B', 'quantization_level': 'Q4_K_M'}},
+    'mid:q8': {'details': {'parameter_size': '3B', 'quantization_level': 'Q8_0'}},
+    'big:f16': {'model_info': {'general.parameter_count': 8_000_000_000}, 'details': {'quantization_level': 'F16'}},
+}
+
+
+class RoutingOllama:
+    """Reports MODEL_INFO and returns a per-model reply."""
+    model = 'big:f16'
+
+    def __init__(self, replies=None):
+        self.replies = replies or {}
+        self.models_used = []
+
+    async def list_available_models(self):
+        return list(MODEL_INFO)
+
+    async def get_model_info(self, model_name):
+        return MODEL_INFO[model_name]
+
+    async def generate_completion(self, prompt, params=None, model=None, system=None, context=None):
+        self.models_used.append(model)
+        return Completion(text=self.replies.get(model, "Halt!"), model=model, eval_count=2)
+
+
+@pytest.fixture(autouse=True)
+def enabled_metrics(monkeypatch):
+    monkeypatch.setattr(metrics, 'enabled', True)
+    metrics.reset()
+    yield
+    metrics.reset()
+
+def make_router(**kwargs):
+    router = ModelRouter(RoutingOllama(), models=[], min_quality=0.8, window=20, parallel=1, **kwargs)
+    asyncio.run(router.refresh())
+    return router
+
+def choose(router, **fields):
+    return asyncio.run(router.choose(DialogueRequest('guard', **fields)))
+
+def test_parse_model_info():
+    assert parse_parameter_count(MODEL_INFO['tiny:q4']) == 1_000_000_000
+    assert parse_parameter_count({'details': {'parameter_size': '494.03M'}}) == 494_030_000
+    assert parse_parameter_count(MODEL_INFO['big:f16']) == 8_000_000_000
+    assert parse_parameter_count({}) == 0
+    assert parse_quantization_bits(MODEL_INFO['tiny:q4']) == 4
+    assert parse_quantization_bits(MODEL_INFO['big:f16']) == 16
+    assert parse_quantization_bits({}) == 16
+
+def test_cheapest_model_is_chosen_without_a_deadline():
+    router = make_router()
+    assert [p.name for p in sorted(router.profiles.values(), key=lambda p: p.cost)] == ['tiny:q4', 'mid:q8', 'big:f16']
+    decision = choose(router)
+    assert decision.model == 'tiny:q4'
+    assert decision.reason == 'cheapest'
+
+def test_deadline_skips_models_that_are_too_slow():
+    router = make_router()
+    router.profiles['tiny:q4'].latencies.extend([2.0] * 10)
+    router.profiles['mid:q8'].latencies.extend([0.5] * 10)
+    assert choose(router, deadline_ms=1000).model == 'mid:q8'
+    assert choose(router, deadline_ms=3000).model == 'tiny:q4'
+
+def test_unmeasured_models_are_estimated_from_cost():
+    router = make_router()
+    router.profiles['tiny:q4'].latencies.extend([0.5] * 10) # 0.5 GB of weights
+    # mid (3 GB) is predicted at 3 s and big (16 GB) at 16 s
+    assert router.predicted_latency(router.profiles['mid:q8']) == pytest.approx(3.0)
+    assert choose(router, deadline_ms=1000).model == 'tiny:q4'
+
+def test_load_moves_requests_to_a_smaller_model():
+    """Requests queued on a model stretch its predicted latency past the deadline."""
+    router = make_router()
+    router.profiles['tiny:q4'].outcomes.extend([0] * 10) # Too poor for the QA threshold
+    router.profiles['mid:q8'].latencies.extend([0.6] * 10)
+    router.profiles['big:f16'].latencies.extend([0.4] * 10)
+    router.profiles['mid:q8'].in_flight = 2
+    assert choose(router, deadline_ms=1000).model == 'big:f16'
+    router.profiles['mid:q8'].in_flight = 0
+    assert choose(router, deadline_ms=1000).model == 'mid:q8'
+
+def test_quality_threshold_and_fallback():
+    router = make_router()
+    router.profiles['tiny:q4'].outcomes.extend([1, 0, 0, 1, 0, 0])
+    assert choose(router).model == 'mid:q8'
+    assert choose(router, min_quality=0.3).model == 'tiny:q4'
+    for profile in router.profiles.values():
+        profile.latencies.extend([5.0] * 5)
+    router.profiles['big:f16'].latencies.clear()
+    router.profiles['big:f16'].latencies.extend([2.0] * 5)
+    decision = choose(router, deadline_ms=1000)
+    assert (decision.model, decision.reason) == ('big:f16', 'fallback')
+    assert metrics.counters['model_fallbacks'] == 1
+
+def test_track_counts_in_flight_and_records_latency():
+    router = make_router()
+    with router.track('mid:q8'):
+        assert router.profiles['mid:q8'].in_flight == 1
+    assert router.profiles['mid:q8'].in_flight == 0
+    assert len(router.profiles['mid:q8'].latencies) == 1
+    with pytest.raises(OllamaError):
+        with router.track('mid:q8'):
+            raise OllamaError("down")
+    assert len(router.profiles['mid:q8'].latencies) == 1 # Failures record no latency
+
+def test_stats_persist_across_runs(tmp_path):
+    path = tmp_path / 'model_stats.json'
+    router = make_router(stats_path=path)
+    router.profiles['mid:q8'].latencies.extend([0.5, 0.7])
+    router.record_quality('mid:q8', False)
+    router.save()
+    restored = ModelRouter(RoutingOllama(), models=[], window=20, stats_path=path)
+    restored.load()
+    assert list(restored.profiles['mid:q8'].latencies) == [0.5, 0.7]
+    assert list(restored.profiles['mid:q8'].outcomes) == [0]
+
+def test_dialogue_manager_routes_and_escalates_after_qa_failure():
+    """A routed model whose line fails QA is skipped on the regeneration."""
+    ollama = RoutingOllama(replies={'tiny:q4': "x" * 50})
+    router = ModelRouter(ollama, models=[], min_quality=0.8, window=20, parallel=1)
+    manager = DialogueManager(ollama, {'guard': {'name': 'Guard'}}, router=router)
+    response = asyncio.run(manager.generate_dialogue(DialogueRequest('guard', max_chars=20)))
+    assert ollama.models_used == ['tiny:q4', 'mid:q8']
+    assert response.model == 'mid:q8'
+    assert response.metadata['route'] == 'cheapest'
+    assert list(router.profiles['tiny:q4'].outcomes) == [0]
+    assert list(router.profiles['mid:q8'].outcomes) == [1]
+
+def test_explicit_model_is_not_rerouted():
+    ollama = RoutingOllama()
+    manager = DialogueManager(ollama, {'guard': {'name': 'Guard'}}, router=ModelRouter(ollama, models=[]))
+    asyncio.run(manager.generate_dialogue(DialogueRequest('guard', model='big:f16')))
+    assert ollama.models_used == ['big:f16']
+
+def test_profile_cost():
+    assert ModelProfile('m', parameters=2_000_000_000, bits=4).cost == 1_000_000_000
+
+def test_models_of_unknown_size_are_not_cheapest():
+    """A model whose info could not be read costs +inf rather than nothing."""
+    class PartlyBrokenOllama(RoutingOllama):
+        async def list_available_models(self):
+            return ['mystery'] + list(MODEL_INFO)
+        async def get_model_info(self, model_name):
+            if model_name == 'mystery':
+                raise OllamaError("show failed")
+            return MODEL_INFO[model_name]
+    router = ModelRouter(PartlyBrokenOllama(), models=[], min_quality=0.8, window=20, parallel=1)
+    asyncio.run(router.refresh())
+    assert router.profiles['mystery'].cost == float('inf')
+    assert router.predicted_latency(router.profiles['mystery']) is None
+    assert choose(router).model == 'tiny:q4'
+    assert choose(router, deadline_ms=1000).model == 'tiny:q4'
+
+def test_routers_are_saved_by_one_exit_handler(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_router.paths, 'get_model_stats_file_path', lambda: tmp_path / 'stats.json')
+    routers = [ModelRouter.from_config(RoutingOllama()) for _ in range(3)]
+    assert set(routers) <= set(model_router._routers_to_save)
+    routers[0].profiles['tiny:q4'] = ModelProfile('tiny:q4')
+    model_router._save_routers()
+    assert (tmp_path / 'stats.json').exists()
@@ -0,0 +1,62 @@
+import pytest
+from array import array
+
+from storyteller.data import models
+from storyteller.data.models import Character, Relationship, CharacterView, RelationshipView
+
+def test_records_have_no_instance_dict():
+    """Slotted models carry no per-object __dict__."""
+    character = Character(character_id='c1', name='Mira')
+    assert not hasattr(character, '__dict__')
+    with pytest.raises(AttributeError):
+        character.nickname = 'M'
+
+def test_enum_fields_are_interned():
+    """Equal enum-like values share one string object."""
+    first = Relationship(char1_id='a', char2_id='b', relationship_type=''.join(['riv', 'al']))
+    second = Relationship(char1_id='c', char2_id='d', relationship_type=''.join(['ri', 'val']))
+    assert first.relationship_type is second.relationship_type
+
+def test_tags_are_normalized():
+    character = Character(character_id='c1', personality_traits='brave; curious ;')
+    assert character.personality_traits == ('brave', 'curious')
+    character.goals = ['find the map']
+    assert character.goals == ('find the map',)
+
+def test_numeric_fields_are_coerced():
+    relationship = Relationship(char1_id='a', char2_id='b', relationship_quality='0.5')
+    assert relationship.relationship_quality == 0.5
+
+def test_unknown_fields_are_rejected():
+    with pytest.raises(TypeError, match="no field"):
+        Character(character_id='c1', height=180)
+
+def test_equality_and_dict_round_trip():
+    character = Character(character_id='c1', name='Mira', personality_traits=['brave'])
+    assert Character(**character.to_dict()) == character
+
+def test_records_to_columns_uses_arrays_for_numbers():
+    columns = models.records_to_columns(
+        [Relationship(char1_id='a', char2_id='b', relationship_quality=0.25)], Relationship)
+    assert isinstance(columns['relationship_quality'], array)
+    assert list(columns['relationship_quality']) == [0.25]
+    assert columns['char1_id'] == ['a']
+
+def test_views_read_columns_without_copying():
+    """Row views read straight from the columns and see later changes."""
+    records = [Character(character_id=f'c{i}', name=f'Name {i}') for i in range(3)]
+    columns = models.records_to_columns(records, Character)
+    views = list(models.iter_views(columns, Character))
+    assert [v.name for v in views] == ['Name 0', 'Name 1', 'Name 2']
+    assert not hasattr(views[0], '__dict__')
+    columns['name'][1] = 'Renamed'
+    assert views[1].name == 'Renamed'
+    assert views[1].to_record() == Character(character_id='c1', name='Renamed')
+    assert isinstance(views[0], CharacterView)
+
+def test_view_to_dict_and_row_selection():
+    columns = models.records_to_columns(
+        [Relationship(char1_id='a', char2_id='b'), Relationship(char1_id='c', char2_id='d')], Relationship)
+    (view,) = models.iter_views(columns, Relationship, rows=[1])
+    assert isinstance(view, RelationshipView)
+    assert view.to_dict()['char1_id'] == 'c'
@@ -0,0 +1,62 @@
+import asyncio
+import http.server
+import json
+import threading
+import pytest
+
+from storyteller.ai.ollama_integration import OllamaIntegration
+
+
+class StallingHandler(http.server.BaseHTTPRequestHandler):
+    """Accepts a generate request and never finishes it; notes when the client hangs up."""
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if payload['stream']:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.end_headers()
+            self.wfile.write(json.dumps({'response': 'Halt '}).encode() + b'\n')
+            self.wfile.flush()
+        # Blocks until the client shuts the connection down (or the test times out)
+        self.connection.settimeout(5)
+        try:
+            self.rfile.read(1)
+        except OSError:
+            return
+        self.server.disconnected.set()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stalling_server():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StallingHandler)
+    httpd.disconnected = threading.Event()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def make_ollama(httpd):
+    return OllamaIntegration(host=f'http://127.0.0.1:{httpd.server_address[1]}', model='m', timeout=30)
+
+def test_cancelled_completion_closes_connection(stalling_server):
+    ollama = make_ollama(stalling_server)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(asyncio.wait_for(ollama.generate_completion("Hi"), 0.2))
+    assert stalling_server.disconnected.wait(2)
+
+def test_abandoned_stream_closes_connection(stalling_server):
+    ollama = make_ollama(stalling_server)
+    chunks = []
+    async def consume():
+        async for chunk in ollama.stream_completion("Hi"):
+            chunks.append(chunk)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(asyncio.wait_for(consume(), 0.2))
+    assert chunks == ['Halt ']
+    assert stalling_server.disconnected.wait(2)
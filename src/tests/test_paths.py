@@ -137,3 +137,12 @@ def test_get_dist_dir(mock_get_root, tmp_path):
     assert not dist_dir.exists()
     mock_get_root.assert_called_once()
 
+
+@patch('storyteller.paths.os.name', 'posix') # Simulate Linux/macOS
+def test_get_cache_dir_linux_xdg(monkeypatch, tmp_path):
+    """Test get_cache_dir honours XDG_CACHE_HOME and creates the directory."""
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    cache_dir = paths.get_cache_dir()
+
+    assert cache_dir == tmp_path / const.APP_NAME
+    assert cache_dir.exists()
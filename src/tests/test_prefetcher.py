@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+
+from storyteller.ai.ollama_integration import Completion
+from storyteller.core.dialogue_manager import DialogueManager, DialogueRequest
+from storyteller.core.prefetcher import SpeculativePrefetcher
+
+
+class CountingOllama:
+    """Echoes the situation back after a short delay, counting calls."""
+    model = 'fake-model'
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.calls = 0
+
+    async def generate_completion(self, prompt, params=None, model=None, system=None, context=None):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        situation = prompt.split('Situation: ')[-1].split('\n')[0]
+        return Completion(text=f"Reply to {situation}", model=model, eval_count=5, eval_seconds=self.delay)
+
+
+def choice(option):
+    return DialogueRequest('innkeeper', ('player',), situation=option)
+
+
+def make_prefetcher(**kwargs):
+    ollama = CountingOllama()
+    manager = DialogueManager(ollama, {'innkeeper': {'name': 'Innkeeper'}, 'player': {'name': 'Player'}})
+    return ollama, manager, SpeculativePrefetcher(manager, **kwargs)
+
+
+def test_prefetched_line_is_served_without_generating():
+    async def run():
+        ollama, manager, prefetcher = make_prefetcher(top_n=2, max_speculative=2)
+        started = prefetcher.prefetch([(choice('ask for a room'), 0.6), (choice('order ale'), 0.3),
+                                       (choice('pick a fight'), 0.1)])
+        await asyncio.sleep(0.05)
+        calls_before = ollama.calls
+        response = await prefetcher.generate_dialogue(choice('order ale'))
+        return started, calls_before, ollama.calls, response, manager, prefetcher
+    started, calls_before, calls_after, response, manager, prefetcher = asyncio.run(run())
+    assert started == 2 # Only the top two candidates
+    assert calls_before == calls_after == 2
+    assert response.text == "Reply to order ale"
+    assert manager.history[-1]['text'] == "Reply to order ale" # Committed on use
+    stats = prefetcher.stats()
+    assert stats['hits'] == 1
+    assert stats['hit_rate'] == 1.0
+    assert stats['wasted'] == 1 # 'ask for a room' was discarded once history changed
+
+def test_miss_generates_and_counts():
+    async def run():
+        ollama, manager, prefetcher = make_prefetcher(top_n=1)
+        prefetcher.prefetch([(choice('ask for a room'), 0.9)])
+        await asyncio.sleep(0.05)
+        response = await prefetcher.generate_dialogue(choice('leave'))
+        return ollama, response, prefetcher
+    ollama, response, prefetcher = asyncio.run(run())
+    assert response.text == "Reply to leave"
+    assert ollama.calls == 2
+    assert prefetcher.stats()['misses'] == 1
+    assert prefetcher.stats()['wasted'] == 1
+
+def test_world_state_change_discards_speculation():
+    async def run():
+        ollama, manager, prefetcher = make_prefetcher(top_n=1)
+        prefetcher.prefetch([(choice('order ale'), 0.9)])
+        await asyncio.sleep(0.05)
+        manager.update_world_state({'time': 'closing'})
+        await prefetcher.generate_dialogue(choice('order ale'))
+        return ollama, prefetcher
+    ollama, prefetcher = asyncio.run(run())
+    assert ollama.calls == 2 # Stale line was not reused
+    assert prefetcher.stats()['hits'] == 0
+    assert prefetcher.stats()['wasted'] == 1
+
+def test_inflight_speculation_is_adopted():
+    """A request matching a running speculative generation waits for it instead of starting over."""
+    async def run():
+        ollama, manager, prefetcher = make_prefetcher(top_n=1)
+        ollama.delay = 0.05
+        prefetcher.prefetch([(choice('order ale'), 0.9)])
+        await asyncio.sleep(0)
+        response = await prefetcher.generate_dialogue(choice('order ale'))
+        return ollama, response, prefetcher
+    ollama, response, prefetcher = asyncio.run(run())
+    assert ollama.calls == 1
+    assert response.text == "Reply to order ale"
+    assert prefetcher.stats()['hits'] == 1
+
+def test_speculation_waits_for_idle_capacity():
+    async def run():
+        ollama, manager, prefetcher = make_prefetcher(top_n=3, max_speculative=1)
+        return prefetcher.prefetch([(choice('a'), 0.5), (choice('b'), 0.3), (choice('c'), 0.2)]), prefetcher
+    started, prefetcher = asyncio.run(run())
+    assert started == 1
+
+def test_cache_is_bounded():
+    async def run():
+        ollama, manager, prefetcher = make_prefetcher(top_n=1, capacity=2)
+        for option in ('a', 'b', 'c'):
+            prefetcher.prefetch([(choice(option), 1.0)])
+            await asyncio.sleep(0.03)
+        return prefetcher
+    prefetcher = asyncio.run(run())
+    assert len(prefetcher._cache) == 2
+    assert prefetcher.stats()['wasted'] == 1
+    assert prefetcher.stats()['wasted_tokens'] == 5
@@ -0,0 +1,156 @@
+import asyncio
+import pytest
+
+from storyteller.ai.ollama_integration import Completion
+from storyteller.ai.prompts import PromptBuilder, SessionStore
+from storyteller.core.dialogue_manager import DialogueContext, DialogueManager, DialogueRequest
+from storyteller.metrics import registry as metrics
+
+
+class SessionOllama:
+    """Returns a growing context, like Ollama does, and records what was sent."""
+    model = 'fake-model'
+
+    def __init__(self):
+        self.calls = []
+
+    async def generate_completion(self, prompt, params=None, model=None, system=None, context=None):
+        self.calls.append({'prompt': prompt, 'system': system, 'context': context})
+        previous = list(context or [])
+        return Completion(text=f"Line {len(self.calls)}.", model=model, eval_count=3,
+                          prompt_eval_count=len(prompt.split()),
+                          context=previous + list(range(len(prompt.split()) + 3)))
+
+
+CHARACTERS = {
+    'guard': {'name': 'Guard', 'background': 'A tired city guard.',
+              'personality_traits': ['gruff', 'loyal'], 'speech_patterns': {'tone': 'curt', 'accent': 'none'}},
+    'hero': {'name': 'Hero'},
+}
+
+@pytest.fixture(autouse=True)
+def enabled_metrics(monkeypatch):
+    monkeypatch.setattr(metrics, 'enabled', True)
+    metrics.reset()
+    yield
+    metrics.reset()
+
+def make_context(history=(), world_state=None):
+    return DialogueContext(speaker=CHARACTERS['guard'], listeners=[CHARACTERS['hero']],
+                           world_state=world_state or {'weather': 'rain', 'time': 'night'},
+                           history=list(history))
+
+def test_layout_runs_from_stable_to_volatile():
+    """Character, scene and then the per-turn lines, with the instruction last."""
+    history = [{'speaker_id': 'hero', 'text': "Open the gate."}]
+    parts = PromptBuilder().build(DialogueRequest('guard', ('hero',), "Hero waits"), make_context(history))
+    lines = parts.full_prompt().split('\n')
+    assert lines == ["Personality: gruff, loyal", "Speech patterns: accent=none; tone=curt",
+                     "Speaking to: Hero", "World state: time=night; weather=rain",
+                     "hero: Open the gate.", "Situation: Hero waits", "Write the next line."]
+    assert parts.system.startswith("You are Guard. A tired city guard.")
+
+def test_prefix_is_deterministic_and_ignores_turn_content():
+    builder = PromptBuilder()
+    a = builder.build(DialogueRequest('guard', situation="one"), make_context(world_state={'a': 1, 'b': 2}))
+    b = builder.build(DialogueRequest('guard', situation="two"),
+                      make_context([{'speaker_id': 'hero', 'text': "Hi"}], world_state={'b': 2, 'a': 1}))
+    assert a.prefix() == b.prefix()
+    assert a.prefix_key() == b.prefix_key()
+    c = builder.build(DialogueRequest('guard'), make_context(world_state={'a': 1, 'b': 3}))
+    assert c.prefix_key() != a.prefix_key()
+
+def test_session_continuation_sends_only_new_lines_with_context():
+    """The second turn reuses the first turn's context and skips lines it already contains."""
+    ollama = SessionOllama()
+    manager = DialogueManager(ollama, CHARACTERS, world_state={'time': 'night'})
+
+    async def run():
+        await manager.generate_dialogue(DialogueRequest('guard', ('hero',), "Hero approaches"))
+        manager.history.append({'speaker_id': 'hero', 'text': "Let me in.", 'listener_ids': ['guard']})
+        return await manager.generate_dialogue(DialogueRequest('guard', ('hero',), "Hero insists"))
+
+    response = asyncio.run(run())
+    first, second = ollama.calls
+    assert first['context'] is None
+    assert "Personality:" in first['prompt']
+    assert second['context'] is not None
+    assert second['system'] == ''
+    assert second['prompt'].split('\n') == ["hero: Let me in.", "Situation: Hero insists", "Write the next line."]
+    assert response.metadata['reused_context_tokens'] == len(second['context'])
+    assert metrics.counters['prompt_eval_tokens_saved'] == len(second['context'])
+
+def test_session_restarts_when_scene_changes():
+    ollama = SessionOllama()
+    manager = DialogueManager(ollama, CHARACTERS, world_state={'time': 'night'})
+
+    async def run():
+        await manager.generate_dialogue(DialogueRequest('guard', ('hero',)))
+        manager.update_world_state({'time': 'dawn'})
+        await manager.generate_dialogue(DialogueRequest('guard', ('hero',)))
+
+    asyncio.run(run())
+    assert ollama.calls[1]['context'] is None
+    assert "time=dawn" in ollama.calls[1]['prompt']
+
+def build_parts(*lines):
+    """Guard's turn after `lines` ((speaker, text) pairs)."""
+    history = [{'speaker_id': speaker, 'text': text} for speaker, text in lines]
+    return PromptBuilder().build(DialogueRequest('guard', ('hero',)), make_context(history))
+
+def test_session_restarts_past_context_limit():
+    store = SessionStore(max_context_tokens=10)
+    parts = build_parts()
+    store.update(store.prepare('guard', 'm', parts), parts,
+                 Completion(text="Halt.", model="m", context=list(range(8))), "Halt.")
+    parts = build_parts(('guard', "Halt."))
+    prepared = store.prepare('guard', 'm', parts)
+    assert prepared.context == list(range(8))
+    store.update(prepared, parts, Completion(text="Go.", model="m", context=list(range(20))), "Go.")
+    assert store.prepare('guard', 'm', build_parts(('guard', "Halt."), ('guard', "Go."))).context is None
+
+def test_stale_update_does_not_overwrite_newer_context():
+    """Two overlapping turns for one character: the one finishing second is dropped."""
+    store = SessionStore(max_context_tokens=100)
+    parts = build_parts()
+    store.update(store.prepare('guard', 'm', parts), parts, Completion(text="a", model="m", context=[1]), "a")
+    parts = build_parts(('guard', "a"))
+    first = store.prepare('guard', 'm', parts)
+    second = store.prepare('guard', 'm', parts)
+    store.update(first, parts, Completion(text="b", model="m", context=[1, 2]), "b")
+    store.update(second, parts, Completion(text="c", model="m", context=[1, 3]), "c")
+    assert store.prepare('guard', 'm', build_parts(('guard', "a"), ('guard', "b"))).context == [1, 2]
+
+def test_session_is_only_continued_along_its_own_conversation():
+    """A history that does not start with the session's lines starts a fresh session."""
+    store = SessionStore(max_context_tokens=100)
+    parts = build_parts(('hero', "Open up."))
+    store.update(store.prepare('guard', 'm', parts), parts, Completion(text="No.", model="m", context=[1]), "No.")
+    continued = store.prepare('guard', 'm', build_parts(('hero', "Open up."), ('guard', "No."), ('hero', "Please.")))
+    assert continued.context == [1]
+    assert continued.prompt.split('\n')[0] == "hero: Please."
+    other_branch = store.prepare('guard', 'm', build_parts(('hero', "Open up."), ('hero', "I have gold.")))
+    assert other_branch.context is None
+    assert "hero: Open up." in other_branch.prompt
+
+def test_scene_branches_do_not_share_sessions():
+    """Alternative branches of a scene never continue each other's conversation."""
+    from storyteller.core.scene_scheduler import Scene, SceneScheduler, SceneTurn
+    ollama = SessionOllama()
+    manager = DialogueManager(ollama, CHARACTERS, world_state={'time': 'night'})
+    scene = Scene([SceneTurn('open', 'hero', ('guard',), "Hero knocks"),
+                   SceneTurn('a', 'guard', ('hero',), "branch a", depends_on=('open',)),
+                   SceneTurn('b', 'guard', ('hero',), "branch b", depends_on=('open',))])
+    result = asyncio.run(SceneScheduler(manager, max_concurrency=1).run(scene))
+    branch_b = next(call for call in ollama.calls if "Situation: branch b" in call['prompt'])
+    assert branch_b['context'] is None
+    assert result.responses['a'].text not in branch_b['prompt']
+    assert "Personality:" in branch_b['prompt']
+
+def test_reset_and_opt_out():
+    parts = PromptBuilder().build(DialogueRequest('guard'), make_context())
+    store = SessionStore(max_context_tokens=100)
+    store.update(store.prepare('guard', 'm', parts), parts, Completion(text="a", model="m", context=[1]), "a")
+    store.reset('guard')
+    assert len(store) == 0
+    assert DialogueManager(SessionOllama(), CHARACTERS, use_sessions=False).sessions is None
@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+from storyteller.ai.ollama_integration import Completion
+from storyteller.ai.query_engine import (LLMPlanTranslator, QueryEngine, QueryPlanError, Vocabulary,
+                                         parse_plan_text, templatize)
+from storyteller.core.data_store import DataStore, Table
+
+RIVALS_PLAN = {
+    'table': 'relationships',
+    'join': {'table': 'characters', 'left': 'char2_id', 'right': 'character_id'},
+    'filters': [{'column': 'char1_id', 'op': '==', 'value': {'param': 0}},
+                {'column': 'relationship_type', 'op': '==', 'value': 'rival'}],
+    'select': ['characters.name'],
+    'order_by': {'column': 'characters.name', 'descending': False},
+}
+
+
+class FakeTranslator:
+    """Returns canned plans by template, counting translations."""
+
+    def __init__(self, plans):
+        self.plans = plans
+        self.calls = []
+
+    async def translate(self, template, params, store, table=None):
+        self.calls.append((template, params))
+        return self.plans[template]
+
+
+@pytest.fixture
+def store():
+    store = DataStore()
+    store.append_rows('characters', {'character_id': ['mira', 'tor', 'ash', 'bel'],
+                                     'name': ['Mira', 'Tor', 'Ash', 'Bel'],
+                                     'personality_traits': [('curious',), ('blunt',), ('curious', 'kind'), ()]})
+    store.append_rows('relationships', {
+        'char1_id': ['mira', 'mira', 'tor', 'mira'], 'char2_id': ['tor', 'bel', 'ash', 'ash'],
+        'relationship_type': ['rival', 'rival', 'rival', 'friend'],
+        'relationship_quality': [-0.5, -0.2, -0.9, 0.8]})
+    return store
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_templatize_replaces_literals(store):
+    vocabulary = Vocabulary(store)
+    template, params = templatize("Who are  Mira's rivals?", vocabulary)
+    assert template == "who are {0}'s rivals"
+    assert params == [('mira', 'characters.character_id')] # ids win over names with equal text
+    template, params = templatize('Lines with quality over 0.5 in "Harbor" for tor', vocabulary)
+    assert template == "lines with quality over {0} in {1} for {2}"
+    assert [value for value, _ in params] == [0.5, 'Harbor', 'tor']
+
+
+def test_repeated_query_shapes_reuse_one_plan(store):
+    translator = FakeTranslator({"who are {0}'s rivals": RIVALS_PLAN})
+    engine = QueryEngine(store, translator)
+    first = run(engine.query_dataframe('relationships', "Who are Mira's rivals?"))
+    second = run(engine.query_dataframe('relationships', "who are Tor's rivals"))
+    assert first.rows == [{'characters.name': 'Bel'}, {'characters.name': 'Tor'}]
+    assert second.rows == [{'characters.name': 'Ash'}]
+    assert (first.from_cache, second.from_cache) == (False, True)
+    assert len(translator.calls) == 1
+
+
+def test_aggregates_and_contains(store):
+    translator = FakeTranslator({
+        'average relationship quality by type': {
+            'table': 'relationships', 'aggregate': {'op': 'mean', 'column': 'relationship_quality',
+                                                    'group_by': 'relationship_type'}},
+        'how many characters are {0}': {
+            'table': 'characters', 'filters': [{'column': 'personality_traits', 'op': 'contains',
+                                                'value': {'param': 0}}],
+            'aggregate': {'op': 'count'}},
+    })
+    engine = QueryEngine(store, translator)
+    result = run(engine.cross_dataframe_query("Average relationship quality by type"))
+    assert result.value == pytest.approx({'rival': -1.6 / 3, 'friend': 0.8})
+    assert run(engine.cross_dataframe_query('How many characters are "curious"?')).value == 2
+
+
+def test_schema_change_invalidates_plans(store):
+    translator = FakeTranslator({"who are {0}'s rivals": RIVALS_PLAN})
+    engine = QueryEngine(store, translator)
+    run(engine.query_dataframe('relationships', "Who are Mira's rivals?"))
+    store.append_rows('relationships', {'char1_id': ['bel'], 'char2_id': ['mira'],
+                                        'relationship_type': ['rival']})
+    run(engine.query_dataframe('relationships', "Who are Bel's rivals?"))
+    assert len(translator.calls) == 1 # Appending data keeps plans
+    table = store.get_table('characters')
+    store.update_table('characters', Table({**table.schema, 'age': 'int'},
+                                           {**table.columns, 'age': [0] * len(table)}))
+    run(engine.query_dataframe('relationships', "Who are Bel's rivals?"))
+    assert len(translator.calls) == 2
+
+
+def test_limit_can_be_a_parameter(store):
+    """A limit taken from the question is bound per question, so the cached plan stays correct."""
+    translator = FakeTranslator({'list the first {0} characters': {
+        'table': 'characters', 'select': ['name'], 'limit': {'param': 0}}})
+    engine = QueryEngine(store, translator)
+    first = run(engine.query_dataframe('characters', "List the first 3 characters"))
+    second = run(engine.query_dataframe('characters', "List the first 1 characters"))
+    assert [len(first.rows), len(second.rows)] == [3, 1]
+    assert second.from_cache and len(translator.calls) == 1
+
+
+def test_plans_ignoring_a_parameter_are_not_cached(store):
+    """A plan with a hard-coded literal instead of a slot is translated again each time."""
+    translator = FakeTranslator({'list the first {0} characters': {
+        'table': 'characters', 'select': ['name'], 'limit': 3}})
+    engine = QueryEngine(store, translator)
+    run(engine.query_dataframe('characters', "List the first 3 characters"))
+    result = run(engine.query_dataframe('characters', "List the first 8 characters"))
+    assert not result.from_cache
+    assert len(translator.calls) == 2
+
+
+def test_invalid_plans_are_rejected(store):
+    engine = QueryEngine(store, FakeTranslator({
+        'bad column': {'table': 'characters', 'select': ['age']},
+        'bad table': {'table': 'items'},
+        'missing param': {'table': 'characters', 'filters': [{'column': 'name', 'value': {'param': 3}}]},
+        'bad limit': {'table': 'characters', 'limit': 'all'},
+        'negative limit {0}': {'table': 'characters', 'limit': {'param': 0}},
+    }))
+    for question in ('bad column', 'bad table', 'missing param', 'bad limit', 'negative limit -2'):
+        with pytest.raises(QueryPlanError):
+            run(engine.cross_dataframe_query(question))
+
+
+def test_llm_translator_parses_model_output(store):
+    class FakeOllama:
+        async def generate_completion(self, prompt, params=None, model=None, system=None):
+            self.prompt = prompt
+            return Completion(text='Here you go:\n```json\n{"table": "characters"}\n```', model='m')
+    ollama = FakeOllama()
+    plan = run(LLMPlanTranslator(ollama).translate("who is {0}", [('mira', 'characters.character_id')], store))
+    assert plan == {'table': 'characters'}
+    assert "{0}: characters.character_id" in ollama.prompt
+    assert "'mira'" not in ollama.prompt # Only the kind of each parameter is shown
+    with pytest.raises(QueryPlanError):
+        parse_plan_text("no plan here")
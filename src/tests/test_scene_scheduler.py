@@ -0,0 +1,118 @@
+import asyncio
+import pytest
+
+from storyteller.ai.ollama_integration import Completion
+from storyteller.core.dialogue_manager import DialogueManager, DialogueResponse
+from storyteller.core.scene_scheduler import Scene, SceneError, SceneScheduler, SceneTurn
+
+
+class SleepyManager:
+    """Records the context each turn saw and sleeps to simulate generation."""
+    world_state = {'location': 'market'}
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.seen = {}
+        self.active = 0
+        self.max_active = 0
+
+    async def generate_dialogue(self, request, on_token=None, snapshot=None, commit=True):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        self.seen[request.situation] = [h['turn_id'] for h in snapshot.history]
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        return DialogueResponse(text=f"line {request.situation}", speaker_id=request.speaker_id, model='fake')
+
+
+def bystander_scene():
+    # thief shouts, three bystanders react independently, guard answers all of them
+    return Scene([
+        SceneTurn('shout', 'thief', situation='shout'),
+        SceneTurn('r1', 'baker', situation='r1', depends_on=('shout',)),
+        SceneTurn('r2', 'smith', situation='r2', depends_on=('shout',)),
+        SceneTurn('r3', 'child', situation='r3', depends_on=('shout',)),
+        SceneTurn('guard', 'guard', situation='guard', depends_on=('r1', 'r2', 'r3')),
+    ])
+
+def test_independent_turns_run_concurrently():
+    manager = SleepyManager()
+    result = asyncio.run(SceneScheduler(manager).run(bystander_scene()))
+    assert manager.max_active == 3
+    assert set(result.responses) == {'shout', 'r1', 'r2', 'r3', 'guard'}
+    # Three levels of turns, so about three delays rather than five
+    assert result.wall_seconds < result.serial_seconds
+    assert result.speedup > 1.3
+    assert "5 turns" in result.summary()
+    assert result.serial_is_estimate
+
+def test_dependent_turns_see_their_dependencies():
+    manager = SleepyManager(delay=0.01)
+    asyncio.run(SceneScheduler(manager).run(bystander_scene()))
+    assert manager.seen['shout'] == []
+    assert manager.seen['r2'] == ['shout']
+    assert manager.seen['guard'] == ['shout', 'r1', 'r2', 'r3']
+
+def test_max_concurrency_is_respected():
+    manager = SleepyManager(delay=0.01)
+    asyncio.run(SceneScheduler(manager, max_concurrency=2).run(bystander_scene()))
+    assert manager.max_active == 2
+
+def test_invalid_scenes_are_rejected():
+    with pytest.raises(SceneError):
+        Scene([SceneTurn('a', 'x'), SceneTurn('a', 'y')])
+    with pytest.raises(SceneError, match="unknown turn"):
+        Scene([SceneTurn('a', 'x', depends_on=('missing',))]).topological_order()
+    with pytest.raises(SceneError, match="cycle"):
+        Scene([SceneTurn('a', 'x', depends_on=('b',)), SceneTurn('b', 'y', depends_on=('a',))]).topological_order()
+
+
+class NumberingOllama:
+    """Answers every prompt with the next numbered line."""
+    model = 'fake'
+
+    def __init__(self):
+        self.count = 0
+
+    async def generate_completion(self, prompt, params=None, model=None, system=None, context=None):
+        self.count += 1
+        return Completion(text=f"line{self.count}", model=model)
+
+
+def test_branches_stay_out_of_history_until_a_path_is_committed():
+    manager = DialogueManager(NumberingOllama(), {'guard': {}, 'hero': {}}, use_sessions=False)
+    scene = Scene([SceneTurn('open', 'hero', ('guard',)),
+                   SceneTurn('a', 'guard', ('hero',), 'branch a', depends_on=('open',)),
+                   SceneTurn('b', 'guard', ('hero',), 'branch b', depends_on=('open',))])
+    scheduler = SceneScheduler(manager, max_concurrency=1)
+    result = asyncio.run(scheduler.run(scene))
+    assert manager.history == []
+    assert manager.context_version == 0
+    assert scheduler.commit(scene, result, 'b') == ['open', 'b']
+    assert [entry['text'] for entry in manager.history] == [result.responses['open'].text,
+                                                            result.responses['b'].text]
+
+
+class OneAtATimeOllama:
+    """A backend that serves one request at a time and reports its own timing."""
+    model = 'fake'
+
+    def __init__(self, delay=0.03):
+        self.delay = delay
+        self.lock = asyncio.Lock()
+
+    async def generate_completion(self, prompt, params=None, model=None, system=None, context=None):
+        async with self.lock:
+            await asyncio.sleep(self.delay)
+        return Completion(text="line", model=model, eval_seconds=self.delay)
+
+
+def test_serial_baseline_excludes_queueing_on_a_busy_backend():
+    manager = DialogueManager(OneAtATimeOllama(), {}, use_sessions=False)
+    result = asyncio.run(SceneScheduler(manager).run(bystander_scene()))
+    # Turn latencies overlap and add up to well over the real work
+    assert sum(result.turn_seconds.values()) > 1.3 * result.wall_seconds
+    assert not result.serial_is_estimate
+    assert result.serial_seconds == pytest.approx(5 * 0.03)
+    assert result.speedup < 1.1
+    assert "serial baseline" in result.summary()
@@ -0,0 +1,272 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+from storyteller import server
+from storyteller.ai.ollama_integration import Completion
+from storyteller.core.dialogue_manager import DialogueManager, DialogueResponse, DialogueRequestError
+
+
+class SlowManager:
+    """Dialogue manager stand-in that takes `delay` seconds per line."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = 0
+        self.cancelled = 0
+
+    async def generate_dialogue(self, request, on_token=None, on_reset=None):
+        self.calls += 1
+        if request.speaker_id == 'nobody':
+            raise DialogueRequestError("Unknown speaker 'nobody'.")
+        try:
+            for word in ("Who", "goes", "there?"):
+                await asyncio.sleep(self.delay / 3)
+                if on_token:
+                    on_token(word + ' ')
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return DialogueResponse(text="Who goes there?", speaker_id=request.speaker_id, model='fake')
+
+
+class DraftOllama:
+    """Streams each queued reply in turn, word by word."""
+    model = 'fake'
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+
+    async def stream_completion(self, prompt, params=None, model=None, system=None, context=None):
+        text = self.replies.pop(0)
+        for word in text.split(' '):
+            yield word + ' '
+        yield Completion(text=text, model=model, eval_count=2)
+
+
+async def http(port, method, path, body=None, headers=None):
+    """Minimal HTTP/1.1 client returning (status, decoded body)."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    data = json.dumps(body).encode() if body is not None else b''
+    head = f"{method} {path} HTTP/1.1\r\nHost: test\r\nConnection: close\r\nContent-Length: {len(data)}\r\n"
+    for name, value in (headers or {}).items():
+        head += f"{name}: {value}\r\n"
+    writer.write(head.encode() + b"\r\n" + data)
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    status_line, _, rest = raw.partition(b"\r\n")
+    payload = rest.partition(b"\r\n\r\n")[2]
+    return int(status_line.split()[1]), payload.decode()
+
+
+def serve(manager, coro_fn, **kwargs):
+    """Starts a server on a free port, runs coro_fn(port) and shuts down."""
+    async def main():
+        dialogue_server = server.DialogueServer(manager, host='127.0.0.1', port=0, **kwargs)
+        await dialogue_server.start()
+        try:
+            return await coro_fn(dialogue_server.port)
+        finally:
+            await dialogue_server.close()
+    return asyncio.run(main())
+
+
+def test_server_module_does_not_import_qt():
+    """The headless entry points must not pull in PyQt6."""
+    code = "import sys, storyteller.main, storyteller.server; print('PyQt6' in sys.modules)"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                            env={**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)})
+    assert result.stdout.strip() == 'False'
+
+def test_health_and_metrics_endpoints():
+    async def run(port):
+        return await http(port, 'GET', '/health'), await http(port, 'GET', '/metrics')
+    (status, body), (metrics_status, metrics_body) = serve(SlowManager(), run)
+    assert status == 200
+    assert json.loads(body)['status'] == 'ok'
+    assert metrics_status == 200
+    assert '# TYPE storyteller_stage_duration_seconds histogram' in metrics_body
+
+def test_dialogue_endpoint_returns_response():
+    async def run(port):
+        return await http(port, 'POST', '/dialogue', {'speaker_id': 'guard', 'listener_ids': ['hero']})
+    status, body = serve(SlowManager(), run)
+    assert status == 200
+    assert json.loads(body)['text'] == "Who goes there?"
+
+def test_bad_requests():
+    async def run(port):
+        return (await http(port, 'POST', '/dialogue', {'speaker_id': 'nobody'}),
+                await http(port, 'POST', '/dialogue', {'bogus': 1}),
+                await http(port, 'GET', '/missing'))
+    (unknown, _), (invalid, _), (missing, _) = serve(SlowManager(), run)
+    assert unknown == 400
+    assert invalid == 400
+    assert missing == 404
+
+def test_malformed_fields_are_rejected():
+    """Bad deadlines, listener ids and Content-Length get 400 instead of breaking the connection."""
+    async def raw(port, data):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(data)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return int(response.split()[1])
+    async def run(port):
+        return [
+            (await http(port, 'POST', '/dialogue', {'speaker_id': 'guard', 'deadline_ms': 'soon'}))[0],
+            (await http(port, 'POST', '/dialogue', {'speaker_id': 'guard'}, {'X-Deadline-Ms': 'soon'}))[0],
+            (await http(port, 'POST', '/dialogue', {'speaker_id': 'guard', 'listener_ids': 5}))[0],
+            await raw(port, b"POST /dialogue HTTP/1.1\r\nContent-Length: lots\r\n\r\n"),
+        ]
+    assert serve(SlowManager(), run) == [400, 400, 400, 400]
+
+def test_unexpected_errors_answer_500():
+    class BrokenManager(SlowManager):
+        async def generate_dialogue(self, request, on_token=None, on_reset=None):
+            raise RuntimeError("boom")
+    async def run(port):
+        return await http(port, 'POST', '/dialogue', {'speaker_id': 'guard'})
+    status, body = serve(BrokenManager(), run)
+    assert status == 500
+    assert json.loads(body)['error'] == "Internal server error."
+
+def test_identical_requests_are_coalesced():
+    """Concurrent identical requests share a single generation."""
+    manager = SlowManager()
+    async def run(port):
+        return await asyncio.gather(*(
+            http(port, 'POST', '/dialogue', {'speaker_id': 'guard'}, {'X-Client-Id': f'c{i}'})
+            for i in range(5)))
+    results = serve(manager, run)
+    assert [status for status, _ in results] == [200] * 5
+    assert manager.calls == 1
+
+def test_list_params_are_coalesced():
+    """Params with list values (e.g. stop sequences) still make a usable cache key."""
+    manager = SlowManager()
+    body = {'speaker_id': 'guard', 'params': {'stop': ["\n"], 'temperature': 0.5}}
+    async def run(port):
+        return await asyncio.gather(*(http(port, 'POST', '/dialogue', body) for _ in range(3)))
+    results = serve(manager, run)
+    assert [status for status, _ in results] == [200] * 3
+    assert manager.calls == 1
+
+def test_requests_with_different_routing_constraints_are_not_coalesced():
+    """A stricter deadline or quality bar can route to another model, so it gets its own generation."""
+    manager = SlowManager()
+    bodies = [{'speaker_id': 'guard'}, {'speaker_id': 'guard', 'deadline_ms': 5000},
+              {'speaker_id': 'guard', 'min_quality': 0.9}]
+    async def run(port):
+        return await asyncio.gather(*(http(port, 'POST', '/dialogue', body) for body in bodies))
+    results = serve(manager, run)
+    assert [status for status, _ in results] == [200] * 3
+    assert manager.calls == 3
+
+def test_non_object_params_are_rejected():
+    async def run(port):
+        return await http(port, 'POST', '/dialogue', {'speaker_id': 'guard', 'params': ['stop']})
+    status, body = serve(SlowManager(), run)
+    assert status == 400
+    assert 'params' in json.loads(body)['error']
+
+def test_coalescer_keeps_entry_replacing_a_cancelled_task():
+    """The late done callback of a cancelled task must not drop its replacement."""
+    async def main():
+        coalescer = server.RequestCoalescer()
+        with pytest.raises(asyncio.TimeoutError):
+            await coalescer.run('key', lambda: asyncio.sleep(1), timeout=0.01)
+        second = asyncio.ensure_future(coalescer.run('key', lambda: asyncio.sleep(0.05, 'line')))
+        for _ in range(3):
+            await asyncio.sleep(0)
+        inflight = len(coalescer)
+        return inflight, await second, len(coalescer)
+    assert asyncio.run(main()) == (1, 'line', 0)
+
+def test_per_client_concurrency_limit():
+    """A client over its limit is rejected with 429."""
+    async def run(port):
+        return await asyncio.gather(*(
+            http(port, 'POST', '/dialogue', {'speaker_id': 'guard', 'situation': str(i)}, {'X-Client-Id': 'game'})
+            for i in range(3)))
+    results = serve(SlowManager(), run, max_client_concurrency=2)
+    assert sorted(status for status, _ in results) == [200, 200, 429]
+
+def test_deadline_cancels_generation():
+    """A request past its deadline gets 504 and its generation is cancelled."""
+    manager = SlowManager(delay=0.5)
+    async def run(port):
+        result = await http(port, 'POST', '/dialogue', {'speaker_id': 'guard', 'deadline_ms': 50})
+        await asyncio.sleep(0.05)
+        return result
+    status, body = serve(manager, run)
+    assert status == 504
+    assert "Deadline" in json.loads(body)['error']
+    assert manager.cancelled == 1
+
+def test_websocket_streams_tokens():
+    """WebSocket requests receive token messages followed by done."""
+    async def run(port):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b"GET /ws HTTP/1.1\r\nHost: test\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     b"Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\nSec-WebSocket-Version: 13\r\n\r\n")
+        handshake = await reader.readuntil(b"\r\n\r\n")
+        request = json.dumps({'id': 7, 'speaker_id': 'guard'}).encode()
+        writer.write(server.encode_frame(request, mask=os.urandom(4)))
+        messages = []
+        while not messages or messages[-1]['type'] not in ('done', 'error'):
+            _, payload = await server.read_frame(reader)
+            messages.append(json.loads(payload))
+        writer.write(server.encode_frame(b'', opcode=0x8, mask=os.urandom(4)))
+        writer.close()
+        return handshake, messages
+    handshake, messages = serve(SlowManager(), run)
+    assert b"101 Switching Protocols" in handshake
+    assert b"s3pPLMBiTxaQ9kYGzzhZRbK+xOo=" in handshake # RFC 6455 sample key
+    assert [m['type'] for m in messages] == ['token', 'token', 'token', 'done']
+    assert messages[-1]['id'] == 7
+    assert messages[-1]['text'] == "Who goes there?"
+
+def websocket_exchange(port, message):
+    """Sends one request over a new WebSocket and collects messages up to done/error."""
+    async def run():
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b"GET /ws HTTP/1.1\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     b"Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n\r\n")
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(server.encode_frame(json.dumps(message).encode(), mask=os.urandom(4)))
+        messages = []
+        while not messages or messages[-1]['type'] not in ('done', 'error'):
+            _, payload = await server.read_frame(reader)
+            messages.append(json.loads(payload))
+        writer.close()
+        return messages
+    return run()
+
+def test_websocket_resets_rejected_drafts():
+    """Tokens of a draft rejected by QA are followed by a reset before the next draft."""
+    manager = DialogueManager(DraftOllama(["x" * 50, "Halt there!"]), {'guard': {'name': 'Guard'}})
+    messages = serve(manager, lambda port: websocket_exchange(port, {'speaker_id': 'guard', 'max_chars': 20}))
+    types = [m['type'] for m in messages]
+    assert types == ['token', 'reset', 'token', 'token', 'done']
+    kept = ''.join(m['text'] for m in messages[types.index('reset') + 1:-1])
+    assert kept.strip() == messages[-1]['text'] == "Halt there!"
+
+def test_websocket_deadline():
+    async def run(port):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b"GET /ws HTTP/1.1\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     b"Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n\r\n")
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(server.encode_frame(json.dumps({'speaker_id': 'guard', 'deadline_ms': 20}).encode(), mask=os.urandom(4)))
+        _, payload = await server.read_frame(reader)
+        writer.close()
+        return json.loads(payload)
+    message = serve(SlowManager(delay=0.5), run)
+    assert message['type'] == 'error'
+    assert "Deadline" in message['error']
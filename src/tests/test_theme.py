@@ -0,0 +1,71 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("PyQt6")
+from PyQt6.QtCore import QDir
+
+from storyteller.gui import theme
+
+@pytest.fixture(scope='module', autouse=True)
+def qapp():
+    # Fonts can only be registered once a QGuiApplication exists
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+class FakeApp:
+    def __init__(self):
+        self.stylesheet = self.style = None
+    def setStyle(self, style):
+        self.style = style
+    def setStyleSheet(self, stylesheet):
+        self.stylesheet = stylesheet
+
+@pytest.fixture
+def fake_qt_material(monkeypatch, tmp_path):
+    """A qt_material stand-in that 'renders' icons into a temp dir and counts builds."""
+    package_dir = tmp_path / 'qt_material'
+    (package_dir / 'fonts').mkdir(parents=True)
+    (package_dir / 'fonts' / 'Roboto.ttf').write_bytes(b'font')
+    icons = tmp_path / 'rendered_icons'
+    builds = []
+
+    def build_stylesheet(theme):
+        builds.append(theme)
+        (icons / 'primary').mkdir(parents=True, exist_ok=True)
+        (icons / 'primary' / 'checkbox.svg').write_text('<svg/>')
+        QDir.setSearchPaths('icon', [str(icons)])
+        return f"QWidget {{ image: url(icon:/primary/checkbox.svg); }} /* {theme} */"
+
+    fake = SimpleNamespace(build_stylesheet=build_stylesheet, __file__=str(package_dir / '__init__.py'),
+                           __version__='9.9')
+    monkeypatch.setattr(theme, 'qt_material', fake)
+    monkeypatch.setattr(theme, 'qt_material_available', True)
+    monkeypatch.setattr(theme, 'qt_material_version', lambda: '9.9')
+    return builds
+
+def test_theme_is_compiled_once_then_loaded_from_cache(tmp_path, fake_qt_material):
+    manager = theme.ThemeManager(cache_root=tmp_path / 'cache')
+    first = FakeApp()
+    assert manager.apply(first, 'dark_blue.xml')
+    assert manager.source == 'compiled'
+    cache_dir = manager.cache_dir('dark_blue.xml')
+    assert cache_dir.name == 'dark_blue-9.9-v1'
+    assert (cache_dir / 'icons' / 'primary' / 'checkbox.svg').exists()
+    assert (cache_dir / 'fonts' / 'Roboto.ttf').exists()
+
+    second = FakeApp()
+    fresh = theme.ThemeManager(cache_root=tmp_path / 'cache')
+    assert fresh.apply(second, 'dark_blue.xml')
+    assert fresh.source == 'cache'
+    assert second.stylesheet == first.stylesheet
+    assert fake_qt_material == ['dark_blue.xml'] # Built only once
+    assert QDir.searchPaths('icon') == [str(cache_dir / 'icons')]
+    assert str(tmp_path / 'qt_material' / 'resources') in QDir.searchPaths('qt_material')
+    assert first.style == second.style == 'Fusion' # As qt_material's apply_stylesheet sets it
+
+def test_apply_without_qt_material(monkeypatch, tmp_path):
+    monkeypatch.setattr(theme, 'qt_material_available', False)
+    assert theme.ThemeManager(cache_root=tmp_path).apply(FakeApp()) is False
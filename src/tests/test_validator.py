@@ -0,0 +1,39 @@
+import pytest
+
+from storyteller.data.validator import SchemaError, check_header, coerce_column, validate_chunk
+
+def test_check_header():
+    check_header('characters', {'character_id': [], 'name': []})
+    with pytest.raises(SchemaError, match="Unknown table"):
+        check_header('missing', {})
+    with pytest.raises(SchemaError, match="Missing required"):
+        check_header('relationships', {'char1_id': []})
+    with pytest.raises(SchemaError, match="Unknown column"):
+        check_header('characters', {'character_id': [], 'age': []})
+
+def test_coerce_column_reports_bad_values():
+    values, errors = coerce_column('float', ['0.5', '', 'high'])
+    assert values == [0.5, 0.0, 0.0]
+    assert list(errors) == [2]
+    values, errors = coerce_column('json', ['{"tone": "dry"}', '', '{broken'])
+    assert values[0] == {'tone': 'dry'} and values[1] is None
+    assert list(errors) == [2]
+
+def test_validate_chunk_rejects_bad_rows_only():
+    columns = {
+        'char1_id': ['a', 'a', 'x', ''],
+        'char2_id': ['b', 'b', 'a', 'b'],
+        'relationship_quality': ['0.5', 'bad', '1', '0'],
+    }
+    coerced, valid, errors = validate_chunk('relationships', columns, character_ids={'a', 'b'})
+    assert valid == [True, False, False, False]
+    assert coerced['relationship_quality'][0] == 0.5
+    assert {(i, c) for i, c, _ in errors} == {
+        (1, 'relationship_quality'), (2, 'char1_id'), (3, 'char1_id')}
+
+def test_validate_chunk_tracks_duplicate_keys():
+    known = {'c1'}
+    _, valid, errors = validate_chunk('characters', {'character_id': ['c1', 'c2', 'c2']}, known_keys=known)
+    assert valid == [False, True, False]
+    assert known == {'c1', 'c2'}
+    assert all(message == "duplicate id" for _, _, message in errors)
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+pytest.importorskip("PyQt6")
+from PyQt6.QtWidgets import QApplication, QLabel, QMainWindow
+
+from storyteller import config
+from storyteller.gui.view_registry import PlaceholderView, ViewRegistry, ViewSpec
+
+class CountingView(QLabel):
+    created = 0
+    def __init__(self, parent=None):
+        super().__init__("counting", parent)
+        CountingView.created += 1
+
+@pytest.fixture(scope='module', autouse=True)
+def qapp():
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    return QApplication.instance() or QApplication([])
+
+@pytest.fixture(autouse=True)
+def layout_config(monkeypatch):
+    saved = {}
+    monkeypatch.setattr(config, 'set_setting', lambda section, key, value: saved.__setitem__((section, key), value))
+    monkeypatch.setattr(config, 'get_setting', lambda section, key, fallback=None: saved.get((section, key), fallback))
+    CountingView.created = 0
+    return saved
+
+def make_registry():
+    window = QMainWindow()
+    registry = ViewRegistry(window)
+    registry.register(ViewSpec('shown', "Shown", f'{__name__}:CountingView', visible=True))
+    registry.register(ViewSpec('hidden', "Hidden", f'{__name__}:CountingView', preload=0))
+    registry.register(ViewSpec('missing', "Missing", 'storyteller.gui.views.no_such_view:NoSuchView'))
+    return window, registry
+
+def test_only_visible_views_are_built(qapp):
+    window, registry = make_registry()
+    assert registry.views == {} # Nothing is built before the window shows
+    window.show()
+    qapp.processEvents()
+    assert registry.is_built('shown') and not registry.is_built('hidden')
+    assert CountingView.created == 1
+    assert isinstance(registry.show_view('missing'), PlaceholderView)
+    window.close()
+
+def test_restore_layout_skips_hidden_views(qapp):
+    window, registry = make_registry()
+    registry.docks['shown'].hide()
+    registry.save_layout()
+    window, registry = make_registry()
+    assert registry.restore_layout()
+    window.show()
+    qapp.processEvents()
+    assert registry.views == {}
+    window.close()
+
+def test_idle_preloading(qapp):
+    window, registry = make_registry()
+    registry.start_preloading()
+    for _ in range(5):
+        qapp.processEvents()
+    assert registry.is_built('hidden') and not registry.is_built('missing')
+    assert not registry.docks['hidden'].isVisible() # Preloading does not show the dock
+
+def test_duplicate_registration(qapp):
+    _, registry = make_registry()
+    with pytest.raises(ValueError):
+        registry.register(ViewSpec('shown', "Again", f'{__name__}:CountingView'))
@@ -0,0 +1,81 @@
+import os
+from array import array
+
+import pytest
+
+pytest.importorskip("PyQt6")
+from PyQt6.QtWidgets import QApplication
+
+from storyteller.core.graph_layout import ForceLayout, LayoutFrame, RelationshipGraph
+from storyteller.gui.views.visualization_view import ALL_TYPES, VisualizationView
+
+
+class InlineWorker:
+    """Lays out in-process, so tests do not start a worker process."""
+
+    running = True
+
+    def __init__(self):
+        self.layout = ForceLayout(use_numpy=False)
+        self.version = 0
+        self.stopped = False
+
+    def set_graph(self, node_ids, sources, targets, weights=None):
+        self.version += 1
+        self.layout.set_graph(node_ids, sources, targets, weights)
+        return self.version
+
+    def poll(self):
+        self.layout.run()
+        return LayoutFrame(self.version, self.layout.positions(), self.layout.iterations, True)
+
+    def stop(self):
+        self.stopped = True
+
+
+@pytest.fixture(scope='module', autouse=True)
+def qapp():
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    return QApplication.instance() or QApplication([])
+
+def make_graph():
+    return RelationshipGraph(node_ids=['a', 'b', 'c'], labels=['A', 'B', 'C'],
+                             sources=array('i', [0, 1]), targets=array('i', [1, 2]),
+                             types=['rival', 'friend'], strengths=array('d', [-0.8, 0.2]))
+
+def test_view_lays_out_filters_and_paints():
+    view = VisualizationView(worker=InlineWorker())
+    view.resize(400, 300)
+    view.set_graph(make_graph())
+    view._poll_layout()
+    assert len(view.canvas.positions) == 6
+    assert not view._layout_timer.isActive() # Stopped once converged
+    view.canvas.grab()
+    assert view.canvas.drawn == (3, 2)
+
+    view.type_filter.setCurrentText('rival')
+    assert view.canvas.edges == [0]
+    view.type_filter.setCurrentText(ALL_TYPES)
+    view.strength_filter.setValue(50)
+    assert view.canvas.edges == [0]
+    assert "1 of 2 relationships" in view.status.text()
+
+def test_graph_update_keeps_known_positions_and_filter():
+    view = VisualizationView(worker=InlineWorker())
+    view.resize(400, 300)
+    view.set_graph(make_graph())
+    view._poll_layout()
+    a = tuple(view.canvas.positions[0:2])
+    view.type_filter.setCurrentText('friend')
+    graph = make_graph()
+    graph.node_ids.append('d')
+    graph.labels.append('D')
+    graph.sources.append(3)
+    graph.targets.append(0)
+    graph.types.append('friend')
+    graph.strengths.append(0.5)
+    view.set_graph(graph)
+    assert tuple(view.canvas.positions[0:2]) == a # Shown where it was until the layout catches up
+    assert view.type_filter.currentText() == 'friend'
+    assert view.canvas.edges == [1, 2]
+    assert view.worker.version == 2